@@ -0,0 +1,214 @@
+"""
+Cold storage for old expenses and incomes.
+
+archive_before() moves every user-month older than the horizon out of the
+hot transaction store into transaction_archive: one document per user, kind
+and month holding the month's totals (count, total, per-category/source
+`by`) in the clear and the rows themselves as zlib-compressed JSON. The hot
+collections, and with them the indexes every dashboard and list query
+walks, then only hold the last ARCHIVE_AFTER_MONTHS months.
+
+ArchivedStore wraps the configured transaction store so reads (with or
+without a month), month totals and deletes also see archived rows; routes
+do not change.
+Search and autocomplete only cover the hot store.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import zlib
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from bson import Binary
+
+from transaction_store import BREAKDOWN_FIELDS, TRANSACTION_KINDS, add_totals, decode_keys, encode_key, pick_fields
+
+logger = logging.getLogger("walleta.archive")
+
+ARCHIVE_AFTER_MONTHS = max(1, int(os.environ.get("ARCHIVE_AFTER_MONTHS", "24")))
+# 0 disables the in-process job; enable it on one instance or use `migrate.py archive`
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get("ARCHIVE_INTERVAL_HOURS", "0"))
+
+
+def cutoff_month(months: int, today: Optional[datetime] = None) -> str:
+    """First month kept hot: months before this one are archived"""
+    today = today or datetime.now(timezone.utc)
+    index = today.year * 12 + today.month - 1 - months
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+
+def current_month() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m")
+
+
+def compress_items(items: List[Dict]) -> Binary:
+    return Binary(zlib.compress(json.dumps(items, separators=(",", ":")).encode(), 6))
+
+
+def decompress_items(data: bytes) -> List[Dict]:
+    return json.loads(zlib.decompress(data))
+
+
+def archive_document(user_id: str, kind: str, month: str, items: List[Dict]) -> Dict:
+    field, default = BREAKDOWN_FIELDS[kind]
+    by: Dict[str, float] = defaultdict(int)
+    counts: Dict[str, int] = defaultdict(int)
+    for item in items:
+        key = encode_key(item.get(field) or default)
+        by[key] += item["amount"]
+        counts[key] += 1
+    return {
+        "user_id": user_id,
+        "kind": kind,
+        "month": month,
+        "count": len(items),
+        "total": sum(item["amount"] for item in items),
+        "by": dict(by),
+        "counts": dict(counts),
+        # Unindexed; lets a delete find the month of an archived row
+        "item_ids": [item["id"] for item in items],
+        "data": compress_items(items),
+        "archived_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def archive_month(db, store, user_id: str, kind: str, month: str) -> int:
+    """Move one user-month into the archive; returns the rows moved.
+
+    The archive is written before the hot rows are removed and merges rows by
+    id, so an interrupted run only has to be repeated.
+    """
+    rows = await store.list(kind, user_id, month, limit=None)
+    if not rows:
+        return 0
+    existing = await db.transaction_archive.find_one({"user_id": user_id, "kind": kind, "month": month}, {"data": 1})
+    merged = {item["id"]: item for item in (decompress_items(existing["data"]) if existing else [])}
+    for row in rows:
+        merged[row["id"]] = {key: value for key, value in row.items() if key != "user_id"}
+    items = sorted(merged.values(), key=lambda item: item["date"])
+    await db.transaction_archive.update_one(
+        {"user_id": user_id, "kind": kind, "month": month},
+        {"$set": archive_document(user_id, kind, month, items)},
+        upsert=True,
+    )
+    await store.delete_items(kind, user_id, month, [row["id"] for row in rows])
+    return len(rows)
+
+
+async def user_ids(db):
+    """Every user; archival then looks at one user's rows at a time through the (user_id, date) index"""
+    async for user in db.users.find({}, {"_id": 0, "id": 1}):
+        yield user["id"]
+
+
+async def archive_before(db, store, month: str, dry_run: bool = False) -> Dict[str, int]:
+    """Archive every user-month older than month; returns rows moved per kind"""
+    moved = {kind: 0 for kind in TRANSACTION_KINDS}
+    async for user_id in user_ids(db):
+        for kind in TRANSACTION_KINDS:
+            for old_month in await store.months_before(kind, user_id, month):
+                if dry_run:
+                    moved[kind] += len(await store.list(kind, user_id, old_month, fields=["id"], limit=None))
+                else:
+                    moved[kind] += await archive_month(db, store, user_id, kind, old_month)
+    return moved
+
+
+async def run_periodically(get_db: Callable, store, interval_hours: float, months: int):
+    while True:
+        try:
+            moved = await archive_before(get_db(), store, cutoff_month(months))
+            if any(moved.values()):
+                logger.info(f"Archived {moved}")
+        except Exception as e:
+            logger.error(f"Archival failed: {e!r}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+class ArchivedStore:
+    """A transaction store whose month reads and deletes include the archive"""
+
+    def __init__(self, store, get_db: Callable):
+        self.store = store
+        self._get_db = get_db
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    @property
+    def _archive(self):
+        return self._get_db().transaction_archive
+
+    async def ensure_indexes(self):
+        await self.store.ensure_indexes()
+        await self._archive.create_index([("user_id", 1), ("kind", 1), ("month", 1)], unique=True)
+
+    async def _archived(self, kind: str, user_id: str, month_query, projection: Dict) -> List[Dict]:
+        return await self._archive.find(
+            {"user_id": user_id, "kind": kind, "month": month_query},
+            {"_id": 0, "month": 1, **projection},
+        ).to_list(None)
+
+    async def list(self, kind: str, user_id: str, month: Optional[str] = None,
+                   fields: Optional[List[str]] = None, limit: Optional[int] = 1000) -> List[Dict]:
+        if not month:
+            return await self._list_all(kind, user_id, fields, limit)
+        rows = await self.store.list(kind, user_id, month, fields, limit)
+        # The current month is never archived, so the common case skips the lookup
+        if month >= current_month():
+            return rows
+        for doc in await self._archived(kind, user_id, {"$regex": f"^{month}"}, {"data": 1}):
+            rows.extend(pick_fields({"user_id": user_id, **item}, fields) for item in decompress_items(doc["data"]))
+        rows.sort(key=lambda row: row.get("date", ""), reverse=True)
+        return rows[:limit]
+
+    async def _list_all(self, kind: str, user_id: str, fields: Optional[List[str]], limit: Optional[int]) -> List[Dict]:
+        """Newest rows across the hot store and the archive"""
+        wanted = None if fields is None else list(dict.fromkeys([*fields, "date"]))
+        rows = await self.store.list(kind, user_id, None, wanted, limit)
+        # Newest archived month first; stop once a month is older than every row kept
+        async for doc in self._archive.find(
+            {"user_id": user_id, "kind": kind}, {"_id": 0, "month": 1, "data": 1}
+        ).sort("month", -1):
+            if limit is not None and len(rows) >= limit and doc["month"] < rows[limit - 1]["date"][:7]:
+                break
+            rows.extend(pick_fields({"user_id": user_id, **item}, wanted) for item in decompress_items(doc["data"]))
+            rows.sort(key=lambda row: row["date"], reverse=True)
+            if limit is not None:
+                del rows[limit:]
+        if fields is not None and "date" not in fields:
+            rows = [{key: value for key, value in row.items() if key != "date"} for row in rows]
+        return rows
+
+    async def totals_by_month(self, kind: str, user_id: str, months: List[str]) -> Dict[str, Dict]:
+        totals = await self.store.totals_by_month(kind, user_id, months)
+        archived_months = [month for month in months if month < current_month()]
+        if not archived_months:
+            return totals
+        for doc in await self._archived(kind, user_id, {"$in": archived_months}, {"total": 1, "count": 1, "by": 1, "counts": 1}):
+            add_totals(totals[doc["month"]], doc["total"], doc["count"],
+                       decode_keys(doc["by"]), decode_keys(doc.get("counts", {})))
+        return totals
+
+    async def delete(self, kind: str, user_id: str, item_id: str) -> Optional[Dict]:
+        deleted = await self.store.delete(kind, user_id, item_id)
+        if deleted is not None:
+            return deleted
+        doc = await self._archive.find_one({"user_id": user_id, "kind": kind, "item_ids": item_id})
+        if doc is None:
+            return None
+        items = decompress_items(doc["data"])
+        item = next(item for item in items if item["id"] == item_id)
+        remaining = [other for other in items if other["id"] != item_id]
+        # Matching archived_at makes a concurrent rewrite of the month lose the race
+        query = {"_id": doc["_id"], "user_id": user_id, "archived_at": doc["archived_at"]}
+        if remaining:
+            result = await self._archive.replace_one(query, archive_document(user_id, kind, doc["month"], remaining))
+            changed = result.modified_count
+        else:
+            changed = (await self._archive.delete_one(query)).deleted_count
+        return {"user_id": user_id, **item} if changed else None
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Document vs bucket layout benchmark for expenses and incomes
+
+Seeds the same synthetic users (benchmarks.seed_data) into both transaction
+layouts of a scratch database and reports, per layout: documents, data and
+index size from collStats, month-read latency through the store, and the
+WiredTiger "bytes read into cache" while reading, a proxy for working set.
+Needs a real MongoDB; the cache figure is only meaningful when the dataset
+does not already fit in cache, so use a big --users or a small cacheSizeGB.
+
+    cd backend
+    python -m benchmarks.bucket_storage --mongo-url mongodb://localhost:27017 --users 200 --reads 2000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.load_test import percentile
+from benchmarks.seed_data import DEFAULT_PROFILE, generate_user, merge_profile
+from transaction_store import BUCKET_COLLECTIONS, TRANSACTION_KINDS, create_store
+
+LAYOUT_COLLECTIONS = {"documents": {kind: kind for kind in TRANSACTION_KINDS}, "buckets": BUCKET_COLLECTIONS}
+
+
+def generate_transactions(users: int, seed: int, years: float) -> Dict[str, List[Dict]]:
+    profile = merge_profile(DEFAULT_PROFILE, {"years": years})
+    today = datetime.now(timezone.utc).replace(microsecond=0)
+    docs = {kind: [] for kind in TRANSACTION_KINDS}
+    for index in range(users):
+        for name, doc in generate_user(index, seed, profile, "x", today):
+            if name in docs:
+                docs[name].append(doc)
+    return docs
+
+
+async def collection_stats(db, layout: str) -> Dict:
+    stats = {}
+    for kind, name in LAYOUT_COLLECTIONS[layout].items():
+        raw = await db.command("collStats", name)
+        stats[kind] = {
+            "documents": raw["count"],
+            "size_bytes": raw["size"],
+            "storage_bytes": raw["storageSize"],
+            "index_bytes": raw["totalIndexSize"],
+        }
+    return stats
+
+
+async def cache_bytes_read(db) -> int:
+    status = await db.command("serverStatus")
+    return status.get("wiredTiger", {}).get("cache", {}).get("bytes read into cache", 0)
+
+
+async def measure_reads(store, months: List[tuple], reads: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(reads):
+        user_id, month = rng.choice(months)
+        started = time.perf_counter()
+        for kind in TRANSACTION_KINDS:
+            await store.list(kind, user_id, month)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "mean": round(sum(latencies) / len(latencies), 3),
+    }
+
+
+async def run(args) -> Dict:
+    docs = generate_transactions(args.users, args.seed, args.years)
+    months = sorted({(doc["user_id"], doc["date"][:7]) for doc in docs["expenses"]})
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    report = {
+        "config": {"users": args.users, "years": args.years, "reads": args.reads, "seed": args.seed},
+        "layouts": {},
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        for layout in ("documents", "buckets"):
+            store = create_store(layout, lambda: db)
+            for name in LAYOUT_COLLECTIONS[layout].values():
+                await db.drop_collection(name)
+            await store.ensure_indexes()
+            started = time.perf_counter()
+            for kind in TRANSACTION_KINDS:
+                for start in range(0, len(docs[kind]), 5000):
+                    await store.insert(kind, [dict(doc) for doc in docs[kind][start:start + 5000]])
+            load_seconds = time.perf_counter() - started
+
+            before = await cache_bytes_read(db)
+            latency = await measure_reads(store, months, args.reads, args.seed)
+            report["layouts"][layout] = {
+                "collections": await collection_stats(db, layout),
+                "load_seconds": round(load_seconds, 2),
+                "month_read_ms": latency,
+                "cache_bytes_read": await cache_bytes_read(db) - before,
+            }
+            print(f"{layout}: p95 {latency['p95']} ms", file=sys.stderr)
+        if not args.keep:
+            for layout in LAYOUT_COLLECTIONS.values():
+                for name in layout.values():
+                    await db.drop_collection(name)
+    finally:
+        client.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the document and bucket transaction layouts")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="walleta_bucket_bench")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--reads", type=int, default=1000, help="Random user-month reads per layout")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="Leave the seeded collections in place")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+In-process harness for benchmarking the Walleta API.
+
+Boots `server.app` against a local MongoDB (or a mongomock-motor stand-in when
+no URL is given) and replaces the Nordigen and Stripe integrations with fakes,
+so benchmarks never leave the machine.
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import AsyncIterator, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+class FakeNordigen:
+    """Answers the Nordigen endpoints used by server.py from memory"""
+
+    def __init__(self, transactions_per_import: int = 50, latency_ms: float = 0):
+        self.transactions_per_import = transactions_per_import
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._counter = 0
+
+    def _booked_transactions(self) -> list:
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        booked = []
+        for i in range(self.transactions_per_import):
+            self._counter += 1
+            amount = -12.5 - (i % 40) if i % 5 else 250.0 + i
+            booked.append({
+                "transactionId": f"fake-{self._counter}",
+                "bookingDate": today,
+                "transactionAmount": {"amount": f"{amount:.2f}", "currency": "EUR"},
+                "remittanceInformationUnstructured": f"K-Market {i % 12}",
+            })
+        return booked
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        path = request.url.path
+        if path.endswith("/token/new/") or path.endswith("/token/refresh/"):
+            return httpx.Response(200, json={"access": "fake-access", "refresh": "fake-refresh"})
+        if path.endswith("/institutions/"):
+            return httpx.Response(200, json=[
+                {"id": "OP_OKOYFIHH", "name": "OP", "bic": "OKOYFIHH", "countries": ["FI"]},
+                {"id": "NORDEA_NDEAFIHH", "name": "Nordea", "bic": "NDEAFIHH", "countries": ["FI"]},
+            ])
+        if path.endswith("/agreements/enduser/"):
+            return httpx.Response(201, json={"id": str(uuid.uuid4())})
+        if path.endswith("/requisitions/") and request.method == "POST":
+            requisition_id = str(uuid.uuid4())
+            return httpx.Response(201, json={
+                "id": requisition_id,
+                "link": f"https://fake.nordigen/{requisition_id}",
+                "status": "CR",
+            })
+        if "/requisitions/" in path:
+            return httpx.Response(200, json={"status": "LN", "accounts": ["fake-account"]})
+        if path.endswith("/details/"):
+            return httpx.Response(200, json={"account": {"iban": "FI0000000000000000", "name": "Käyttötili", "currency": "EUR"}})
+        if path.endswith("/balances/"):
+            return httpx.Response(200, json={"balances": [{"balanceAmount": {"amount": "1234.56"}}]})
+        if path.endswith("/transactions/"):
+            return httpx.Response(200, json={"transactions": {"booked": self._booked_transactions()}})
+        return httpx.Response(404, json={"detail": "not faked"})
+
+
+class FakeStripeCheckout:
+    """Drop-in replacement for emergentintegrations' StripeCheckout"""
+
+    calls = 0
+
+    def __init__(self, api_key: str, webhook_url: str = ""):
+        self.api_key = api_key
+        self.webhook_url = webhook_url
+
+    async def create_checkout_session(self, checkout_request):
+        FakeStripeCheckout.calls += 1
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        return SimpleNamespace(session_id=session_id, url=f"https://checkout.stripe.test/{session_id}")
+
+    async def get_checkout_status(self, session_id: str):
+        FakeStripeCheckout.calls += 1
+        return SimpleNamespace(status="complete", payment_status="paid", amount_total=499, currency="eur", metadata={})
+
+    async def handle_webhook(self, body: bytes, signature: Optional[str]):
+        FakeStripeCheckout.calls += 1
+        return SimpleNamespace(session_id=None, event_type="", payment_status="", metadata={})
+
+
+def load_server(mongo_url: Optional[str] = None, db_name: str = "walleta_bench", nordigen: Optional[FakeNordigen] = None):
+    """Import server.py with a local database and faked integrations.
+
+    When mongo_url is None the database is an in-memory mongomock-motor client.
+    """
+    os.environ.setdefault("MONGO_URL", mongo_url or "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", db_name)
+    os.environ.setdefault("NORDIGEN_SECRET_ID", "bench")
+    os.environ.setdefault("NORDIGEN_SECRET_KEY", "bench")
+    # All benchmark traffic comes from one address; measure the work, not the throttle
+    for limit in ("LOGIN_IP_LIMIT", "LOGIN_EMAIL_LIMIT", "REGISTER_IP_LIMIT"):
+        os.environ.setdefault(limit, "1000000/1")
+    if mongo_url is None:
+        # mongomock has no ping command and no change streams
+        os.environ.setdefault("MONGO_WARMUP_CONNECTIONS", "0")
+        os.environ.setdefault("LIVE_EVENTS_SOURCE", "process")
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    import server
+
+    # Set before the lifespan runs, which then keeps this client
+    if mongo_url is None:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("mongomock-motor is required without --mongo-url (pip install mongomock-motor)")
+        server.client = AsyncMongoMockClient()
+    else:
+        server.client = server.create_mongo_client(mongo_url)
+    server.db = server.client[db_name]
+
+    nordigen = nordigen or FakeNordigen()
+    transport = httpx.MockTransport(nordigen.handler)
+
+    class NordigenClient(httpx.AsyncClient):
+        def __init__(self, *args, **kwargs):
+            kwargs.setdefault("transport", transport)
+            super().__init__(*args, **kwargs)
+
+    # Only the server's outgoing calls go through the fake; benchmark clients
+    # always pass their own ASGI transport.
+    httpx.AsyncClient = NordigenClient
+    server.stripe_integration = SimpleNamespace(StripeCheckout=FakeStripeCheckout, CheckoutSessionRequest=SimpleNamespace)
+    server.nordigen_token_manager = server.NordigenTokenManager()
+    return server
+
+
+@asynccontextmanager
+async def api_client(app) -> AsyncIterator[httpx.AsyncClient]:
+    """Client that talks to the ASGI app directly, without sockets.
+
+    ASGITransport does not send lifespan events, so the app's lifespan runs
+    around the client: indexes, pool warmup, the CPU pool, job workers and
+    the change watcher are set up as in production. It closes the database
+    client on exit.
+    """
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://bench",
+            timeout=60,
+        ) as http:
+            yield http
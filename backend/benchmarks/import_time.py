@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Import-time profile of the Walleta API
+
+Imports server.py in fresh interpreters with `-X importtime` and reports the
+total import cost, the most expensive modules, and whether the integrations
+that should load lazily (Stripe, httpx, jwt, bcrypt) stayed out of the import.
+
+    cd backend
+    python -m benchmarks.import_time --runs 5
+    python -m benchmarks.import_time --baseline import.json --max-regression 0.2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from benchmarks.harness import BACKEND_DIR
+
+# Modules server.py must not execute at import time
+LAZY_MODULES = ("emergentintegrations.payments.stripe.checkout", "httpx", "jwt", "bcrypt")
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Rows of `import time: self | cumulative | name`, times in microseconds"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header row
+        name = fields[2].rstrip()
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(fields[0]),
+            "cumulative_us": int(fields[1]),
+        })
+    return rows
+
+
+def profile_once(module: str) -> List[Dict]:
+    env = dict(os.environ)
+    # server.py only reads these; nothing connects during import
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "walleta_import_time")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def build_report(module: str, runs: int, top: int) -> Dict:
+    # Keep the fastest run; slower ones mostly measure disk cache and noise
+    best = min((profile_once(module) for _ in range(runs)), key=lambda rows: rows[-1]["cumulative_us"])
+    total = next(row for row in reversed(best) if row["module"] == module)
+    loaded = {row["module"] for row in best}
+    heaviest = sorted((row for row in best if row["depth"] == 1), key=lambda row: row["cumulative_us"], reverse=True)
+    return {
+        "config": {"module": module, "runs": runs, "python": sys.version.split()[0]},
+        "total_ms": round(total["cumulative_us"] / 1000, 1),
+        "self_ms": round(total["self_us"] / 1000, 1),
+        "modules_loaded": len(best),
+        "top_imports": [
+            {"module": row["module"], "cumulative_ms": round(row["cumulative_us"] / 1000, 1)}
+            for row in heaviest[:top]
+        ],
+        "eagerly_loaded": [name for name in LAZY_MODULES if name in loaded],
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def find_regressions(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    regressions = []
+    old_ms, new_ms = baseline.get("total_ms", 0), report["total_ms"]
+    if old_ms > 0 and new_ms > old_ms * (1 + max_regression):
+        regressions.append(f"import time {old_ms}ms -> {new_ms}ms")
+    for name in report["eagerly_loaded"]:
+        if name not in baseline.get("eagerly_loaded", []):
+            regressions.append(f"{name} is imported eagerly again")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import time of the Walleta API")
+    parser.add_argument("--module", default="server")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Heaviest direct imports to list")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative slowdown vs baseline")
+    args = parser.parse_args()
+
+    report = build_report(args.module, args.runs, args.top)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report, json.load(f), args.max_regression)
+        report["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
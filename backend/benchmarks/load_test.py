@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Walleta API load test
+
+Drives concurrent traffic through the main routes of an in-process server.app
+and reports throughput and latency percentiles as JSON.
+
+    cd backend
+    python -m benchmarks.load_test --concurrency 20 --requests 500
+    python -m benchmarks.load_test --mongo-url mongodb://localhost:27017 --output bench.json
+    python -m benchmarks.load_test --baseline bench.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from benchmarks.harness import FakeNordigen, FakeStripeCheckout, api_client, load_server
+
+PASSWORD = "BenchPass123!"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else 0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0,
+        },
+    }
+
+
+async def setup_users(http, server, users: int, expenses_per_user: int) -> List[Dict]:
+    """Register users through the API and seed their current month directly"""
+    month = datetime.now(timezone.utc).strftime("%Y-%m")
+    categories = [c["name"] for c in await server.get_expense_categories()]
+    accounts = []
+
+    for i in range(users):
+        email = f"bench-{uuid.uuid4().hex[:10]}@walleta.fi"
+        response = await http.post("/api/auth/register", json={"email": email, "password": PASSWORD, "name": f"Bench {i}"})
+        response.raise_for_status()
+        data = response.json()
+        user_id = data["user"]["id"]
+
+        now = datetime.now(timezone.utc).isoformat()
+        docs = [
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "amount": round(random.uniform(2, 120), 2),
+                "description": f"Ostos {n}",
+                "category": random.choice(categories),
+                "date": f"{month}-{random.randint(1, 28):02d}",
+                "created_at": now,
+            }
+            for n in range(expenses_per_user)
+        ]
+        if docs:
+            await server.transactions.insert("expenses", docs)
+        await server.db.budgets.insert_one({"id": str(uuid.uuid4()), "user_id": user_id, "amount": 2000.0, "month": month, "created_at": now})
+        # Imports are only accepted for accounts of the user's own connections
+        await server.db.bank_connections.insert_one({"id": str(uuid.uuid4()), "user_id": user_id, "accounts": ["fake-account"], "status": "LN", "created_at": now})
+        accounts.append({"email": email, "token": data["token"], "headers": {"Authorization": f"Bearer {data['token']}"}})
+
+    return accounts
+
+
+def build_scenarios(accounts: List[Dict]) -> Dict[str, Callable]:
+    month = datetime.now(timezone.utc).strftime("%Y-%m")
+
+    async def login(http):
+        account = random.choice(accounts)
+        return await http.post("/api/auth/login", json={"email": account["email"], "password": PASSWORD})
+
+    async def dashboard_summary(http):
+        return await http.get("/api/dashboard/summary", headers=random.choice(accounts)["headers"])
+
+    async def list_expenses(http):
+        return await http.get(f"/api/expenses?month={month}", headers=random.choice(accounts)["headers"])
+
+    async def create_expense(http):
+        return await http.post("/api/expenses", headers=random.choice(accounts)["headers"], json={
+            "amount": round(random.uniform(2, 120), 2),
+            "description": "Kuorma-ajo",
+            "category": "Ruoka",
+            "date": f"{month}-15",
+        })
+
+    async def bank_import(http):
+        # Imports run as background jobs; measure until the job has finished
+        headers = random.choice(accounts)["headers"]
+        response = await http.post("/api/banks/import-transactions/fake-account", headers=headers)
+        if response.status_code != 202:
+            return response
+        while True:
+            status = await http.get(f"/api/jobs/{response.json()['id']}", headers=headers)
+            if status.status_code != 200 or status.json()["status"] not in ("queued", "running"):
+                return status
+            await asyncio.sleep(0.01)
+
+    async def checkout(http):
+        return await http.post("/api/payments/checkout", headers=random.choice(accounts)["headers"], json={"origin_url": "http://bench"})
+
+    return {
+        "login": login,
+        "dashboard_summary": dashboard_summary,
+        "list_expenses": list_expenses,
+        "create_expense": create_expense,
+        "bank_import": bank_import,
+        "checkout": checkout,
+    }
+
+
+async def run_scenario(http, call: Callable, total_requests: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    remaining = total_requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await call(http)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def find_regressions(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Scenarios whose p95 latency or throughput got worse than allowed"""
+    regressions = []
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        old_p95, new_p95 = before["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        if old_p95 > 0 and new_p95 > old_p95 * (1 + max_regression):
+            regressions.append(f"{name}: p95 {old_p95}ms -> {new_p95}ms")
+        old_rps, new_rps = before["throughput_rps"], result["throughput_rps"]
+        if old_rps > 0 and new_rps < old_rps * (1 - max_regression):
+            regressions.append(f"{name}: throughput {old_rps} -> {new_rps} req/s")
+    return regressions
+
+
+async def main_async(args) -> Dict:
+    random.seed(args.seed)
+    nordigen = FakeNordigen(transactions_per_import=args.import_size, latency_ms=args.nordigen_latency_ms)
+    # Read when server.py is imported; the lifespan starts this many workers
+    os.environ["JOB_WORKERS"] = str(args.job_workers)
+    server = load_server(mongo_url=args.mongo_url, db_name=args.db_name, nordigen=nordigen)
+
+    async with api_client(server.app) as http:
+        accounts = await setup_users(http, server, args.users, args.expenses_per_user)
+        scenarios = build_scenarios(accounts)
+        selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+
+        results = {}
+        for name in selected:
+            if name not in scenarios:
+                raise SystemExit(f"Unknown scenario: {name}")
+            results[name] = await run_scenario(http, scenarios[name], args.requests, args.concurrency)
+            print(f"{name}: {results[name]['throughput_rps']} req/s, p95 {results[name]['latency_ms']['p95']} ms", file=sys.stderr)
+
+        # Before the lifespan closes the client
+        if args.mongo_url:
+            await server.client.drop_database(args.db_name)
+
+    return {
+        "config": {
+            "backend": "mongod" if args.mongo_url else "mongomock",
+            "users": args.users,
+            "expenses_per_user": args.expenses_per_user,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "import_size": args.import_size,
+            "nordigen_latency_ms": args.nordigen_latency_ms,
+            "job_workers": args.job_workers,
+            "seed": args.seed,
+        },
+        "scenarios": results,
+        "integration_calls": {"nordigen": nordigen.calls, "stripe": FakeStripeCheckout.calls},
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Walleta API in-process")
+    parser.add_argument("--mongo-url", help="Local mongod to use; defaults to mongomock-motor")
+    parser.add_argument("--db-name", default="walleta_bench")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--expenses-per-user", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=300, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--import-size", type=int, default=50, help="Bank transactions per import call")
+    parser.add_argument("--nordigen-latency-ms", type=float, default=0)
+    parser.add_argument("--job-workers", type=int, default=2, help="Background job workers for bank imports")
+    parser.add_argument("--scenarios", help="Comma separated subset, e.g. login,list_expenses")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative slowdown vs baseline")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report, json.load(f), args.max_regression)
+        report["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Synthetic Walleta dataset generator
+
+Fills a local MongoDB with realistic users, expenses, incomes, loans, savings
+goals, budgets and imported-transaction markers for scale testing. Output is
+deterministic for a given --seed, and users are split across worker processes
+that write with unordered bulk inserts.
+
+    cd backend
+    python -m benchmarks.seed_data --mongo-url mongodb://localhost:27017 --users 1000 --years 3
+    python -m benchmarks.seed_data --users 20000 --workers 8 --profile heavy.json --drop
+
+A --profile JSON file overrides any key of DEFAULT_PROFILE (nested dicts merge).
+"""
+
+import argparse
+import copy
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+
+import bcrypt
+from pymongo import MongoClient
+
+from search import search_tokens
+
+COLLECTIONS = [
+    "users", "expenses", "incomes", "loans", "savings_goals", "budgets",
+    "bank_connections", "imported_transactions",
+]
+
+DEFAULT_PASSWORD = "SeedPass123!"
+
+DEFAULT_PROFILE = {
+    "years": 2,
+    "expenses_per_month": {"mean": 40, "stddev": 15},
+    # Lognormal amounts: median in EUR and sigma of the underlying normal
+    "categories": {
+        "Asuminen": {"weight": 3, "median": 180, "sigma": 0.9},
+        "Ruoka": {"weight": 40, "median": 18, "sigma": 0.7},
+        "Liikenne": {"weight": 14, "median": 25, "sigma": 0.8},
+        "Viihde": {"weight": 12, "median": 20, "sigma": 0.9},
+        "Terveys": {"weight": 5, "median": 35, "sigma": 0.8},
+        "Vaatteet": {"weight": 7, "median": 45, "sigma": 0.7},
+        "Koulutus": {"weight": 3, "median": 40, "sigma": 0.9},
+        "Muut": {"weight": 16, "median": 15, "sigma": 1.0},
+    },
+    "descriptions": {
+        "Asuminen": ["Vuokra", "Sähkölasku", "Vesimaksu", "Kotivakuutus", "Laajakaista"],
+        "Ruoka": ["K-Market", "S-Market", "Lidl", "Prisma", "Alepa", "Hesburger", "Wolt"],
+        "Liikenne": ["HSL", "VR", "Neste", "St1", "Taksi", "Parkkipaikka"],
+        "Viihde": ["Finnkino", "Spotify", "Netflix", "Steam", "Konsertti"],
+        "Terveys": ["Apteekki", "Terveystalo", "Mehiläinen", "Hammaslääkäri"],
+        "Vaatteet": ["H&M", "Zalando", "Stockmann", "Kookenkä"],
+        "Koulutus": ["Suomalainen Kirjakauppa", "Kurssimaksu", "Adlibris"],
+        "Muut": ["Verkkokauppa.com", "Tokmanni", "Clas Ohlson", "Lahja"],
+    },
+    "income_sources": {
+        "salary": {"probability": 0.85, "per_month": 1, "median": 2900, "sigma": 0.3, "recurring": True},
+        "freelance": {"probability": 0.25, "per_month": 2, "median": 350, "sigma": 0.8, "recurring": False},
+        "investment": {"probability": 0.3, "per_month": 0.3, "median": 120, "sigma": 1.0, "recurring": False},
+        "other": {"probability": 0.4, "per_month": 0.5, "median": 60, "sigma": 1.0, "recurring": False},
+    },
+    "loans": {
+        "max_per_user": 3,
+        "probability": 0.55,
+        "types": {
+            "asuntolaina": {"weight": 3, "median": 150000, "sigma": 0.5, "rate": [1.5, 5.0]},
+            "autolaina": {"weight": 3, "median": 15000, "sigma": 0.5, "rate": [3.0, 8.0]},
+            "kulutusluotto": {"weight": 2, "median": 3000, "sigma": 0.7, "rate": [6.0, 18.0]},
+            "opintolaina": {"weight": 2, "median": 12000, "sigma": 0.4, "rate": [1.0, 4.0]},
+        },
+    },
+    "savings_goals": {"max_per_user": 4, "median_target": 3000, "sigma": 0.9},
+    "budget_month_probability": 0.7,
+    "bank_connected_fraction": 0.5,
+    "imported_fraction": 0.6,
+    "subscription_active_fraction": 0.6,
+}
+
+
+def merge_profile(base: Dict, overrides: Dict) -> Dict:
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_profile(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def months_back(years: int, today: datetime) -> List[Tuple[int, int]]:
+    months = []
+    year, month = today.year, today.month
+    for _ in range(max(1, int(years * 12))):
+        months.append((year, month))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(months))
+
+
+def days_in_month(year: int, month: int) -> int:
+    if month == 12:
+        return 31
+    return (datetime(year, month + 1, 1) - datetime(year, month, 1)).days
+
+
+def lognormal(rng: random.Random, median: float, sigma: float) -> float:
+    return round(rng.lognormvariate(math.log(median), sigma), 2)
+
+
+def poisson(rng: random.Random, lam: float) -> int:
+    # Knuth for small means, normal approximation for large ones
+    if lam <= 0:
+        return 0
+    if lam > 30:
+        return max(0, int(round(rng.gauss(lam, math.sqrt(lam)))))
+    limit, k, p = math.exp(-lam), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+def rng_uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def generate_user(index: int, seed: int, profile: Dict, password_hash: str, today: datetime) -> Iterator[Tuple[str, Dict]]:
+    """Yield (collection, document) pairs for one user.
+
+    Every user gets its own Random, so the output does not depend on how
+    users are split across workers.
+    """
+    rng = random.Random(f"{seed}:{index}")
+    user_id = rng_uuid(rng)
+    months = months_back(profile["years"], today)
+    first_year, first_month = months[0]
+    created_at = datetime(first_year, first_month, 1, tzinfo=timezone.utc).isoformat()
+    now = today.isoformat()
+
+    subscribed = rng.random() < profile["subscription_active_fraction"]
+    yield "users", {
+        "id": user_id,
+        "email": f"seed{index}@walleta.test",
+        "name": f"Testikäyttäjä {index}",
+        "password_hash": password_hash,
+        "subscription_active": subscribed,
+        "subscription_end": (today.replace(day=28).isoformat() if subscribed else None),
+        "created_at": created_at,
+    }
+
+    bank_account = None
+    if rng.random() < profile["bank_connected_fraction"]:
+        bank_account = f"seed-account-{index}"
+        yield "bank_connections", {
+            "id": rng_uuid(rng),
+            "user_id": user_id,
+            "institution_id": rng.choice(["OP_OKOYFIHH", "NORDEA_NDEAFIHH", "SPANKKI_SBANFIHH"]),
+            "agreement_id": rng_uuid(rng),
+            "reference": f"walleta_{user_id}_{index:08x}",
+            "status": "LN",
+            "accounts": [bank_account],
+            "created_at": created_at,
+        }
+
+    income_sources = [s for s, spec in profile["income_sources"].items() if rng.random() < spec["probability"]]
+    categories = list(profile["categories"])
+    weights = [profile["categories"][c]["weight"] for c in categories]
+    transaction_counter = 0
+
+    def imported_fields(doc: Dict) -> Iterator[Tuple[str, Dict]]:
+        nonlocal transaction_counter
+        if bank_account and rng.random() < profile["imported_fraction"]:
+            transaction_counter += 1
+            doc["imported"] = True
+            yield "imported_transactions", {
+                "user_id": user_id,
+                "transaction_id": f"{bank_account}-{transaction_counter}",
+                "account_id": bank_account,
+                "imported_at": doc["created_at"],
+            }
+
+    for year, month in months:
+        month_str = f"{year}-{month:02d}"
+        last_day = days_in_month(year, month)
+        if (year, month) == (today.year, today.month):
+            last_day = today.day
+
+        if rng.random() < profile["budget_month_probability"]:
+            yield "budgets", {
+                "id": rng_uuid(rng),
+                "user_id": user_id,
+                "amount": float(rng.choice([800, 1000, 1200, 1500, 2000, 2500, 3000])),
+                "month": month_str,
+                "created_at": f"{month_str}-01T08:00:00+00:00",
+            }
+
+        spec = profile["expenses_per_month"]
+        expense_count = max(0, int(round(rng.gauss(spec["mean"], spec["stddev"]))))
+        for category in rng.choices(categories, weights=weights, k=expense_count):
+            cat = profile["categories"][category]
+            date = f"{month_str}-{rng.randint(1, last_day):02d}"
+            description = rng.choice(profile["descriptions"].get(category, [category]))
+            doc = {
+                "id": rng_uuid(rng),
+                "user_id": user_id,
+                "amount": lognormal(rng, cat["median"], cat["sigma"]),
+                "description": description,
+                "category": category,
+                "date": date,
+                "created_at": f"{date}T12:00:00+00:00",
+                "search_tokens": search_tokens(description),
+            }
+            yield from imported_fields(doc)
+            yield "expenses", doc
+
+        for source in income_sources:
+            spec = profile["income_sources"][source]
+            count = int(spec["per_month"]) if spec["recurring"] else poisson(rng, spec["per_month"])
+            for _ in range(count):
+                date = f"{month_str}-{min(last_day, 15 if source == 'salary' else rng.randint(1, last_day)):02d}"
+                description = {"salary": "Palkka", "freelance": "Laskutus", "investment": "Osinko"}.get(source, "Tulo")
+                doc = {
+                    "id": rng_uuid(rng),
+                    "user_id": user_id,
+                    "amount": lognormal(rng, spec["median"], spec["sigma"]),
+                    "description": description,
+                    "source": source,
+                    "date": date,
+                    "recurring": spec["recurring"],
+                    "created_at": f"{date}T12:00:00+00:00",
+                    "search_tokens": search_tokens(description),
+                }
+                yield from imported_fields(doc)
+                yield "incomes", doc
+
+    loans = profile["loans"]
+    if rng.random() < loans["probability"]:
+        loan_types = list(loans["types"])
+        for loan_type in rng.choices(loan_types, weights=[loans["types"][t]["weight"] for t in loan_types], k=rng.randint(1, loans["max_per_user"])):
+            spec = loans["types"][loan_type]
+            original = lognormal(rng, spec["median"], spec["sigma"])
+            remaining = round(original * rng.uniform(0.1, 1.0), 2)
+            years = rng.randint(2, 25)
+            yield "loans", {
+                "id": rng_uuid(rng),
+                "user_id": user_id,
+                "name": loan_type.capitalize(),
+                "loan_type": loan_type,
+                "original_amount": original,
+                "remaining_amount": remaining,
+                "interest_rate": round(rng.uniform(*spec["rate"]), 2),
+                "monthly_payment": round(original / (years * 12), 2),
+                "start_date": f"{first_year}-{first_month:02d}-01",
+                "end_date": f"{first_year + years}-{first_month:02d}-01",
+                "created_at": created_at,
+            }
+
+    goals = profile["savings_goals"]
+    for n in range(rng.randint(0, goals["max_per_user"])):
+        target = lognormal(rng, goals["median_target"], goals["sigma"])
+        yield "savings_goals", {
+            "id": rng_uuid(rng),
+            "user_id": user_id,
+            "name": rng.choice(["Puskurirahasto", "Lomamatka", "Auto", "Asunnon käsiraha", "Uusi puhelin"]),
+            "target_amount": target,
+            "current_amount": round(target * rng.uniform(0, 1), 2),
+            "target_date": f"{today.year + rng.randint(0, 3)}-12-31",
+            "icon": rng.choice(["piggy-bank", "plane", "car", "home", "smartphone"]),
+            "created_at": now,
+        }
+
+
+def seed_users(mongo_url: str, db_name: str, user_indices: range, seed: int, profile: Dict,
+               password_hash: str, batch_size: int) -> Dict[str, int]:
+    """Generate and bulk insert a range of users; returns docs written per collection"""
+    client = MongoClient(mongo_url, w=1)
+    db = client[db_name]
+    today = datetime.now(timezone.utc).replace(microsecond=0)
+    buffers: Dict[str, List[Dict]] = {name: [] for name in COLLECTIONS}
+    written = {name: 0 for name in COLLECTIONS}
+
+    def flush(name: str):
+        if buffers[name]:
+            db[name].insert_many(buffers[name], ordered=False, bypass_document_validation=True)
+            written[name] += len(buffers[name])
+            buffers[name] = []
+
+    try:
+        for index in user_indices:
+            for name, doc in generate_user(index, seed, profile, password_hash, today):
+                buffers[name].append(doc)
+                if len(buffers[name]) >= batch_size:
+                    flush(name)
+        for name in COLLECTIONS:
+            flush(name)
+    finally:
+        client.close()
+    return written
+
+
+def _worker(job):
+    return seed_users(*job)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Walleta dataset")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="walleta_scale")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--years", type=float, help="Overrides profile 'years'")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--start-index", type=int, default=0, help="First user index, for appending more users")
+    parser.add_argument("--profile", help="JSON file overriding DEFAULT_PROFILE")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="Password shared by all generated users")
+    parser.add_argument("--drop", action="store_true", help="Drop the generated collections first")
+    parser.add_argument("--print-profile", action="store_true", help="Print the effective profile and exit")
+    args = parser.parse_args()
+
+    profile = DEFAULT_PROFILE
+    if args.profile:
+        with open(args.profile) as f:
+            profile = merge_profile(profile, json.load(f))
+    if args.years is not None:
+        profile = merge_profile(profile, {"years": args.years})
+    if args.print_profile:
+        print(json.dumps(profile, indent=2, ensure_ascii=False))
+        return 0
+
+    if args.drop:
+        client = MongoClient(args.mongo_url)
+        for name in COLLECTIONS:
+            client[args.db_name][name].drop()
+        client.close()
+
+    # One bcrypt hash for everyone; hashing per user would dominate the run
+    password_hash = bcrypt.hashpw(args.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+    workers = max(1, min(args.workers, args.users))
+    step = math.ceil(args.users / workers)
+    end = args.start_index + args.users
+    jobs = [
+        (args.mongo_url, args.db_name, range(start, min(start + step, end)), args.seed, profile, password_hash, args.batch_size)
+        for start in range(args.start_index, end, step)
+    ]
+
+    started = time.perf_counter()
+    if workers == 1:
+        results = [_worker(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_worker, jobs)
+    elapsed = time.perf_counter() - started
+
+    totals = {name: sum(r[name] for r in results) for name in COLLECTIONS}
+    total_docs = sum(totals.values())
+    print(json.dumps({
+        "db": args.db_name,
+        "users": args.users,
+        "seed": args.seed,
+        "workers": workers,
+        "documents": totals,
+        "total_documents": total_docs,
+        "elapsed_seconds": round(elapsed, 2),
+        "documents_per_second": round(total_docs / elapsed) if elapsed > 0 else 0,
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for the fast JSON response path
+
+Measures process CPU time per request for the expense, income and dashboard
+endpoints with FAST_JSON_RESPONSES off and on, plus the cost of serializing
+a 1000-item expense list alone (response_model validation + stdlib json vs
+orjson on the raw Mongo dicts).
+
+    cd backend
+    python -m benchmarks.serialization --items 1000 --iterations 200
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from benchmarks.harness import api_client, load_server
+
+
+def make_expenses(user_id: str, month: str, count: int) -> List[Dict]:
+    now = datetime.now(timezone.utc).isoformat()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "amount": round(random.uniform(2, 200), 2),
+            "description": f"K-Market {n % 40}",
+            "category": random.choice(["Ruoka", "Liikenne", "Viihde", "Muut"]),
+            "date": f"{month}-{random.randint(1, 28):02d}",
+            "created_at": now,
+        }
+        for n in range(count)
+    ]
+
+
+def make_incomes(user_id: str, month: str, count: int) -> List[Dict]:
+    now = datetime.now(timezone.utc).isoformat()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "amount": round(random.uniform(20, 3000), 2),
+            "description": "Palkka" if n % 10 == 0 else "Laskutus",
+            "source": random.choice(["salary", "freelance", "investment", "other"]),
+            "date": f"{month}-{random.randint(1, 28):02d}",
+            "recurring": n % 10 == 0,
+            "created_at": now,
+        }
+        for n in range(count)
+    ]
+
+
+def encoder_only(server, docs: List[Dict], iterations: int) -> Dict:
+    """CPU per call of FastAPI's default path vs the trusted orjson path"""
+    from pydantic import TypeAdapter
+
+    adapter = TypeAdapter(List[server.Expense])
+
+    def default_path():
+        # What serialize_response + JSONResponse do for response_model=List[Expense]
+        validated = adapter.validate_python(docs)
+        content = adapter.dump_python(validated, mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    def fast_path():
+        return server.TrustedJSONResponse(docs).body
+
+    results = {}
+    for name, fn in (("default", default_path), ("fast", fast_path)):
+        fn()
+        started = time.process_time()
+        for _ in range(iterations):
+            fn()
+        results[name] = round((time.process_time() - started) / iterations * 1000, 3)
+    return {"cpu_ms_per_call": results, "speedup": round(results["default"] / results["fast"], 2) if results["fast"] else None}
+
+
+async def endpoint_cpu(http, server, headers: Dict, path: str, iterations: int, rounds: int) -> Dict:
+    """Best-of-rounds CPU per request, alternating the two paths to even out noise"""
+    best = {"default": float("inf"), "fast": float("inf")}
+    for _ in range(rounds):
+        for name, enabled in (("default", False), ("fast", True)):
+            server.FAST_JSON_RESPONSES = enabled
+            (await http.get(path, headers=headers)).raise_for_status()
+            started = time.process_time()
+            for _ in range(iterations):
+                await http.get(path, headers=headers)
+            best[name] = min(best[name], (time.process_time() - started) / iterations * 1000)
+    server.FAST_JSON_RESPONSES = False
+    results = {name: round(value, 3) for name, value in best.items()}
+    return {
+        "cpu_ms_per_request": results,
+        "saved_ms_per_request": round(results["default"] - results["fast"], 3),
+    }
+
+
+async def main_async(args) -> Dict:
+    random.seed(args.seed)
+    server = load_server(mongo_url=args.mongo_url, db_name=args.db_name)
+    month = datetime.now(timezone.utc).strftime("%Y-%m")
+
+    async with api_client(server.app) as http:
+        response = await http.post("/api/auth/register", json={
+            "email": f"serial-{uuid.uuid4().hex[:8]}@walleta.fi", "password": "BenchPass123!", "name": "Serialization",
+        })
+        response.raise_for_status()
+        data = response.json()
+        headers = {"Authorization": f"Bearer {data['token']}"}
+        user_id = data["user"]["id"]
+
+        expenses = make_expenses(user_id, month, args.items)
+        await server.transactions.insert("expenses", [dict(doc) for doc in expenses])
+        await server.transactions.insert("incomes", make_incomes(user_id, month, args.items))
+
+        report = {
+            "config": {"items": args.items, "iterations": args.iterations, "rounds": args.rounds, "orjson": server.orjson is not None},
+            "encoder": encoder_only(server, expenses, args.iterations),
+            "endpoints": {},
+        }
+        for name, path in (
+            ("expenses", f"/api/expenses?month={month}"),
+            ("incomes", f"/api/incomes?month={month}"),
+            ("dashboard_summary", "/api/dashboard/summary"),
+        ):
+            report["endpoints"][name] = await endpoint_cpu(http, server, headers, path, args.iterations, args.rounds)
+
+        # Before the lifespan closes the client
+        if args.mongo_url:
+            await server.client.drop_database(args.db_name)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fast JSON response path")
+    parser.add_argument("--mongo-url", help="Local mongod to use; defaults to mongomock-motor")
+    parser.add_argument("--db-name", default="walleta_bench_serialization")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
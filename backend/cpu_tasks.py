@@ -0,0 +1,108 @@
+"""
+CPU-bound work that can run in a process pool.
+
+Functions here are pickled by name into pool processes, so this module must
+stay light: no server import, no database client. The pool is started in the
+app lifespan when CPU_POOL_WORKERS > 0; otherwise work falls back to the
+threadpool.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from lazy_imports import lazy_import
+from search import search_tokens
+
+bcrypt = lazy_import("bcrypt")
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def start_pool(workers: int):
+    global _executor
+    if workers > 0 and _executor is None:
+        # spawn: never fork a process that already runs an event loop and Motor threads
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def shutdown_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def pool_workers_from_env() -> int:
+    return int(os.environ.get("CPU_POOL_WORKERS", "0"))
+
+
+async def run_cpu(fn, *args):
+    """Run fn in the process pool if one is running, else in the threadpool"""
+    if _executor is None:
+        return await run_in_threadpool(fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+# ============== TASKS ==============
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def categorize_bank_transactions(booked: List[Dict], user_id: str, account_id: str, today: str, now: str) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """Turn Nordigen booked transactions into expense, income and marker docs"""
+    expenses, incomes, markers = [], [], []
+    for trans in booked:
+        amount = float(trans.get("transactionAmount", {}).get("amount", 0))
+        description = trans.get("remittanceInformationUnstructured", "") or trans.get("creditorName", "") or trans.get("debtorName", "Pankkitapahtuma")
+        date = trans.get("bookingDate", today)
+        transaction_id = trans.get("transactionId", "")
+        counterparty = trans.get("creditorName", "") or trans.get("debtorName", "")
+        tokens = search_tokens(description, counterparty)
+
+        if amount < 0:
+            expenses.append({
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "amount": abs(amount),
+                "description": description,
+                "category": "Muut",
+                "date": date,
+                "created_at": now,
+                "imported": True,
+                "counterparty": counterparty,
+                "search_tokens": tokens
+            })
+        else:
+            incomes.append({
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "amount": amount,
+                "description": description,
+                "source": "other",
+                "date": date,
+                "recurring": False,
+                "created_at": now,
+                "imported": True,
+                "counterparty": counterparty,
+                "search_tokens": tokens
+            })
+
+        markers.append({
+            "user_id": user_id,
+            "transaction_id": transaction_id,
+            "account_id": account_id,
+            "kind": "expenses" if amount < 0 else "incomes",
+            "imported_at": now
+        })
+    return expenses, incomes, markers
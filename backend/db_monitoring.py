@@ -0,0 +1,246 @@
+"""
+MongoDB command monitoring for the Walleta API.
+
+A pymongo CommandListener times every command, logs slow ones with the shape
+of their filter, and charges each command to the HTTP request that issued it.
+The request is tracked with a contextvar; Motor copies the context into its
+executor threads, so the listener sees the request's stats object.
+
+PoolMonitor follows the connection pool so readiness checks and /metrics can
+tell a cold or exhausted pool from a healthy one.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+from metrics import Counter, Gauge, Histogram, registry
+
+logger = logging.getLogger("walleta.db")
+
+SLOW_QUERY_MS = float(os.environ.get("MONGO_SLOW_QUERY_MS", "100"))
+REQUEST_DB_CALLS_WARN = int(os.environ.get("MONGO_REQUEST_CALLS_WARN", "25"))
+
+request_db_calls = registry.register(Histogram(
+    "walleta_request_db_calls", "MongoDB commands issued per HTTP request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)))
+request_db_seconds = registry.register(Histogram(
+    "walleta_request_db_seconds", "Time spent in MongoDB per HTTP request", ("route",)))
+pool_connections = registry.register(Gauge(
+    "walleta_mongo_pool_connections", "MongoDB pool connections by state", ("state",)))
+pool_waiting = registry.register(Gauge(
+    "walleta_mongo_pool_waiting", "Operations waiting for a pooled MongoDB connection"))
+pool_checkout_failures = registry.register(Counter(
+    "walleta_mongo_pool_checkout_failures_total", "Failed connection checkouts by reason", ("reason",)))
+
+
+class RequestDBStats:
+    """Database usage of a single HTTP request"""
+
+    def __init__(self, scope: Dict):
+        self._scope = scope
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.duration_micros = 0
+
+    @property
+    def route(self) -> str:
+        route = self._scope.get("route")
+        path = getattr(route, "path", None) or self._scope.get("path", "")
+        return f"{self._scope.get('method', '')} {path}"
+
+    def add(self, duration_micros: int):
+        with self._lock:
+            self.calls += 1
+            self.duration_micros += duration_micros
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration_micros / 1000
+
+
+current_request_db: ContextVar[Optional[RequestDBStats]] = ContextVar("current_request_db", default=None)
+
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+
+
+def query_shape(value: Any) -> Any:
+    """Replace literal values with '?' but keep field names and operators"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(item) for item in value[:3]]
+    return "?"
+
+
+def command_shape(command_name: str, command: Dict) -> Any:
+    if command_name in _FILTER_FIELDS:
+        return query_shape(command.get(_FILTER_FIELDS[command_name], {}))
+    if command_name == "aggregate":
+        return query_shape(command.get("pipeline", []))
+    if command_name == "update":
+        return [query_shape(u.get("q", {})) for u in command.get("updates", [])[:3]]
+    if command_name == "delete":
+        return [query_shape(d.get("q", {})) for d in command.get("deletes", [])[:3]]
+    return None
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Charges commands to the current request and logs slow ones"""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_micros = slow_query_ms * 1000
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Dict]] = {}
+
+    def started(self, event):
+        # Keep a reference only; the shape is computed for slow commands
+        command = event.command
+        collection = command.get(event.command_name) if isinstance(command.get(event.command_name), str) else ""
+        self._pending[(event.connection_id, event.request_id)] = (collection, command)
+
+    def _finished(self, event, failed: bool):
+        collection, command = self._pending.pop((event.connection_id, event.request_id), ("", {}))
+        stats = current_request_db.get()
+        if stats is not None:
+            stats.add(event.duration_micros)
+
+        if event.duration_micros >= self.slow_micros:
+            logger.warning(
+                "Slow Mongo command %s on %s took %.1f ms%s route=%s shape=%s",
+                event.command_name,
+                collection or "-",
+                event.duration_micros / 1000,
+                " (failed)" if failed else "",
+                stats.route if stats else "-",
+                command_shape(event.command_name, command),
+            )
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+
+class DBAccountingMiddleware:
+    """ASGI middleware reporting DB calls and DB time per request.
+
+    Adds X-DB-Calls and X-DB-Time-Ms response headers and logs requests that
+    issue an unusual number of commands.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDBStats(scope)
+        token = current_request_db.set(stats)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-calls", str(stats.calls).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.duration_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_db.reset(token)
+            route = stats.route
+            request_db_calls.observe(stats.calls, route=route)
+            request_db_seconds.observe(stats.duration_micros / 1e6, route=route)
+            log = logger.warning if stats.calls >= REQUEST_DB_CALLS_WARN else logger.debug
+            log(
+                "%s db_calls=%d db_time_ms=%.1f total_ms=%.1f",
+                route, stats.calls, stats.duration_ms, (time.perf_counter() - started) * 1000,
+            )
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks open, checked-out and waiting connections across all pools"""
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+
+    def _update(self, open=0, checked_out=0, waiting=0):
+        with self._lock:
+            self.open += open
+            self.checked_out += checked_out
+            self.waiting += waiting
+            pool_connections.set(self.open - self.checked_out, state="idle")
+            pool_connections.set(self.checked_out, state="in_use")
+            pool_waiting.set(self.waiting)
+
+    @property
+    def saturation(self) -> float:
+        """Share of max_pool_size currently checked out"""
+        return self.checked_out / self.max_pool_size if self.max_pool_size else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_pool_size": self.max_pool_size,
+                "open": self.open,
+                "in_use": self.checked_out,
+                "waiting": self.waiting,
+                "checkout_failures": self.checkout_failures,
+                "saturation": round(self.saturation, 3),
+            }
+
+    def connection_created(self, event):
+        self._update(open=1)
+
+    def connection_closed(self, event):
+        self._update(open=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(waiting=1)
+
+    def connection_checked_out(self, event):
+        self._update(checked_out=1, waiting=-1)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+        pool_checkout_failures.inc(reason=str(event.reason))
+        self._update(waiting=-1)
+
+    def connection_checked_in(self, event):
+        self._update(checked_out=-1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
@@ -0,0 +1,100 @@
+"""
+Duplicate detection between hand-entered and bank-imported transactions.
+
+find_duplicates() pairs each imported row with at most one manual row of the
+same kind. Rows are hashed on their amount in cents; within a bucket the
+manual rows are sorted by day, so each imported row only looks at the
+slice within DUPLICATE_WINDOW_DAYS (two binary searches) instead of every
+other row. Pairs are scored on date distance and shared description words,
+and the best-scoring pairs win. Module-level and free of I/O, so large
+batches can run in the CPU pool.
+"""
+
+import os
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from search import normalize
+
+DUPLICATE_WINDOW_DAYS = int(os.environ.get("DUPLICATE_WINDOW_DAYS", "3"))
+DUPLICATE_MIN_SCORE = float(os.environ.get("DUPLICATE_MIN_SCORE", "0.5"))
+
+# Score weights: a same-day match alone clears the default threshold
+DATE_WEIGHT = 0.6
+DESCRIPTION_WEIGHT = 0.4
+
+_WORD = re.compile(r"[^\W\d_]{2,}", re.UNICODE)
+
+
+def description_words(text: str) -> frozenset:
+    """Letters-only words; drops card numbers, dates and reference codes"""
+    return frozenset(_WORD.findall(normalize(text or "")))
+
+
+def _prepare(row: Dict) -> Optional[Tuple[int, int, frozenset, Dict]]:
+    """None for a row whose date is not YYYY-MM-DD; hand-entered dates are free text"""
+    try:
+        day = date.fromisoformat(row["date"][:10]).toordinal()
+    except (TypeError, ValueError):
+        return None
+    return (
+        round(row["amount"] * 100),
+        day,
+        description_words(row.get("description", "")),
+        row,
+    )
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def find_duplicates(imported: List[Dict], existing: List[Dict],
+                    window_days: int = DUPLICATE_WINDOW_DAYS,
+                    min_score: float = DUPLICATE_MIN_SCORE) -> List[Dict]:
+    """Likely (imported, existing) duplicate pairs, best first.
+
+    Rows need id, amount, date and description; compare one kind at a time.
+    Each row appears in at most one pair; rows with an unreadable date never do.
+    """
+    manual: Dict[int, List[Tuple]] = defaultdict(list)
+    for row in existing:
+        prepared = _prepare(row)
+        if prepared is not None:
+            manual[prepared[0]].append(prepared)
+    for rows in manual.values():
+        rows.sort(key=lambda prepared: prepared[1])
+    days = {cents: [prepared[1] for prepared in rows] for cents, rows in manual.items()}
+
+    pairs = []
+    for new_row in imported:
+        prepared = _prepare(new_row)
+        if prepared is None:
+            continue
+        cents, day, words, row = prepared
+        candidates = manual.get(cents)
+        if not candidates:
+            continue
+        low = bisect_left(days[cents], day - window_days)
+        high = bisect_right(days[cents], day + window_days)
+        for _, other_day, other_words, other in candidates[low:high]:
+            closeness = 1 - abs(day - other_day) / (window_days + 1)
+            score = DATE_WEIGHT * closeness + DESCRIPTION_WEIGHT * _similarity(words, other_words)
+            if score >= min_score:
+                pairs.append((score, row, other))
+
+    # Greedy one-to-one matching, strongest evidence first
+    pairs.sort(key=lambda pair: pair[0], reverse=True)
+    used_imported, used_existing, matches = set(), set(), []
+    for score, row, other in pairs:
+        if row["id"] in used_imported or other["id"] in used_existing:
+            continue
+        used_imported.add(row["id"])
+        used_existing.add(other["id"])
+        matches.append({"imported": row, "existing": other, "score": round(score, 3)})
+    return matches
@@ -0,0 +1,264 @@
+"""
+Idempotency-Key support for create and payment routes.
+
+A client that retries a POST sends the same Idempotency-Key header each
+time. The first request runs and its response is stored in the
+idempotency_keys collection for IDEMPOTENCY_TTL_HOURS (TTL index); retries
+get that response back with an Idempotent-Replayed header instead of
+creating another row or Stripe session. Keys are per user, and a key reused
+for a different request (method, path, query or body) is rejected with 422.
+
+While the first request runs its key is pending: a concurrent retry gets
+409 with Retry-After. A pending key whose lock is older than
+IDEMPOTENCY_LOCK_SECONDS (its process died) is taken over. 5xx responses
+and crashes release the key, so the retry runs again. Completed responses
+are also kept in a small per-process LRU, so a retry storm against one
+instance does not reach MongoDB.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from metrics import Counter, registry
+
+IDEMPOTENCY_TTL_HOURS = float(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24"))
+# A pending key older than this is assumed abandoned
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "1000"))
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+# Response headers worth replaying; the rest are per-response
+STORED_HEADERS = {b"content-type"}
+
+idempotency_requests = registry.register(Counter(
+    "walleta_idempotency_requests_total", "Requests carrying an Idempotency-Key by outcome", ("outcome",)))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def request_fingerprint(scope: Dict, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body):
+        digest.update(part)
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Completed responses by (user_id, key), newest max_entries"""
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_CACHE_SIZE, ttl_seconds: float = IDEMPOTENCY_TTL_HOURS * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str, Dict]]" = OrderedDict()
+
+    def get(self, user_id: str, key: str) -> Optional[Tuple[str, Dict]]:
+        entry = self._entries.get((user_id, key))
+        if entry is None:
+            return None
+        expires, fingerprint, response = entry
+        if expires < time.monotonic():
+            del self._entries[(user_id, key)]
+            return None
+        self._entries.move_to_end((user_id, key))
+        return fingerprint, response
+
+    def put(self, user_id: str, key: str, fingerprint: str, response: Dict):
+        if self.max_entries <= 0:
+            return
+        self._entries[(user_id, key)] = (time.monotonic() + self.ttl, fingerprint, response)
+        self._entries.move_to_end((user_id, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class IdempotencyStore:
+    """First responses per (user_id, key) in the idempotency_keys collection"""
+
+    def __init__(self, get_db: Callable):
+        self._get_db = get_db
+
+    @property
+    def collection(self):
+        return self._get_db().idempotency_keys
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("user_id", 1), ("key", 1)], unique=True)
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def begin(self, user_id: str, key: str, fingerprint: str) -> Tuple[str, Optional[Dict]]:
+        """("new", None) when the caller should run the request, else
+        ("done", response), ("pending", None) or ("mismatch", None)"""
+        now = _now()
+        locked_until = (now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)).isoformat()
+        # Twice: the key may expire between the failed insert and the read
+        for _ in range(2):
+            try:
+                await self.collection.insert_one({
+                    "user_id": user_id,
+                    "key": key,
+                    "fingerprint": fingerprint,
+                    "status": "pending",
+                    "locked_until": locked_until,
+                    "created_at": now.isoformat(),
+                    "expires_at": now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+                })
+                return "new", None
+            except DuplicateKeyError:
+                pass
+            record = await self.collection.find_one({"user_id": user_id, "key": key}, {"_id": 0})
+            if record is None:
+                continue
+            if record["fingerprint"] != fingerprint:
+                return "mismatch", None
+            if record["status"] == "done":
+                return "done", record["response"]
+            taken = await self.collection.find_one_and_update(
+                {"user_id": user_id, "key": key, "status": "pending", "locked_until": {"$lt": now.isoformat()}},
+                {"$set": {"locked_until": locked_until}},
+                projection={"_id": 0, "key": 1},
+            )
+            return ("new", None) if taken is not None else ("pending", None)
+        return "pending", None
+
+    async def complete(self, user_id: str, key: str, response: Dict):
+        now = _now()
+        await self.collection.update_one(
+            {"user_id": user_id, "key": key, "status": "pending"},
+            {"$set": {
+                "status": "done",
+                "response": response,
+                "completed_at": now.isoformat(),
+                "expires_at": now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+            }, "$unset": {"locked_until": ""}},
+        )
+
+    async def release(self, user_id: str, key: str):
+        await self.collection.delete_one({"user_id": user_id, "key": key, "status": "pending"})
+
+
+async def _send_response(send, response: Dict):
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in response["headers"]]
+    headers += [(b"content-length", str(len(response["body"])).encode()), (REPLAYED_HEADER, b"true")]
+    await send({"type": "http.response.start", "status": response["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": response["body"]})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware honouring Idempotency-Key on POSTs to `paths`.
+
+    resolve_user(scope) returns the caller's user id, or None to let the
+    route answer an unauthenticated request itself.
+    """
+
+    def __init__(self, app, store: IdempotencyStore, resolve_user: Callable[[Dict], Awaitable[Optional[str]]],
+                 paths: Iterable[str], cache: Optional[ResponseCache] = None):
+        self.app = app
+        self.store = store
+        self.resolve_user = resolve_user
+        self.paths = frozenset(paths)
+        self.cache = cache if cache is not None else ResponseCache()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get(IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key.strip() or len(key) > MAX_KEY_LENGTH:
+            await JSONResponse({"detail": "Virheellinen Idempotency-Key"}, status_code=400)(scope, receive, send)
+            return
+        user_id = await self.resolve_user(scope)
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        fingerprint = request_fingerprint(scope, body)
+
+        cached = self.cache.get(user_id, key)
+        if cached is None:
+            outcome, response = await self.store.begin(user_id, key, fingerprint)
+            idempotency_requests.inc(outcome=outcome)
+        else:
+            outcome, response = ("done", cached[1]) if cached[0] == fingerprint else ("mismatch", None)
+            idempotency_requests.inc(outcome="cached" if outcome == "done" else outcome)
+
+        if outcome == "done":
+            if cached is None:
+                self.cache.put(user_id, key, fingerprint, response)
+            await _send_response(send, response)
+            return
+        if outcome == "mismatch":
+            await JSONResponse({"detail": "Idempotency-Key on jo käytetty toiseen pyyntöön"}, status_code=422)(scope, receive, send)
+            return
+        if outcome == "pending":
+            await JSONResponse({"detail": "Sama pyyntö on vielä käsittelyssä"}, status_code=409,
+                               headers={"Retry-After": "1"})(scope, receive, send)
+            return
+
+        await self._run(scope, receive, send, body, user_id, key, fingerprint)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _run(self, scope, receive, send, body: bytes, user_id: str, key: str, fingerprint: str):
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = None
+        headers = []
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [
+                    (name.decode("latin-1"), value.decode("latin-1"))
+                    for name, value in message.get("headers", []) if name.lower() in STORED_HEADERS
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, send_wrapper)
+        except BaseException:
+            await self.store.release(user_id, key)
+            raise
+        if status is None or status >= 500:
+            await self.store.release(user_id, key)
+            return
+        response = {"status": status, "headers": headers, "body": b"".join(chunks)}
+        await self.store.complete(user_id, key, response)
+        self.cache.put(user_id, key, fingerprint, response)
@@ -0,0 +1,236 @@
+"""
+Background jobs for work that outlives an HTTP request.
+
+Routes enqueue a job document in the `jobs` collection and answer 202 with
+its id; worker tasks running inside every API process claim queued jobs
+with find_one_and_update, so there is no broker and any number of
+instances can share the queue. A running job keeps a heartbeat; when its
+process dies the heartbeat goes stale and another worker picks the job up
+again (up to JOB_MAX_ATTEMPTS). Handlers report progress through
+JobContext.progress(), which is also where a requested cancellation is
+noticed. Finished jobs are removed by a TTL index after
+JOB_RETENTION_HOURS.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger("walleta.jobs")
+
+# 0 disables the workers in this process; jobs then wait for another instance
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "2"))
+# A running job whose heartbeat is older than this is picked up again
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_HOURS = int(os.environ.get("JOB_RETENTION_HOURS", "24"))
+
+# Internal fields left out of API responses
+_PRIVATE_FIELDS = {"_id": 0, "user_id": 0, "worker": 0, "heartbeat_at": 0, "expires_at": 0}
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when the job was cancelled or taken over"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobContext:
+    """What a handler sees of its job"""
+
+    def __init__(self, queue: "JobQueue", job: Dict, worker: str):
+        self.id = job["id"]
+        self.user_id = job["user_id"]
+        self.params = job.get("params", {})
+        self._queue = queue
+        self._worker = worker
+
+    async def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None):
+        """Record progress; raises JobCancelled if the job should stop"""
+        update = {"progress.done": done, "heartbeat_at": _now().isoformat()}
+        if total is not None:
+            update["progress.total"] = total
+        if message is not None:
+            update["progress.message"] = message
+        job = await self._queue.collection.find_one_and_update(
+            {"id": self.id, "worker": self._worker, "status": "running"},
+            {"$set": update},
+            projection={"_id": 0, "cancel_requested": 1},
+        )
+        if job is None or job.get("cancel_requested"):
+            raise JobCancelled()
+
+
+Handler = Callable[[JobContext], Awaitable[Optional[Dict]]]
+
+
+class JobQueue:
+    def __init__(self, get_db: Callable):
+        self._get_db = get_db
+        self.handlers: Dict[str, Handler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._workers: List[str] = []
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def collection(self):
+        return self._get_db().jobs
+
+    def handler(self, job_type: str):
+        """Register the coroutine that runs jobs of job_type"""
+        def register(fn: Handler) -> Handler:
+            self.handlers[job_type] = fn
+            return fn
+        return register
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index([("status", 1), ("created_at", 1)])
+        await self.collection.create_index([("user_id", 1), ("created_at", -1)])
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def enqueue(self, user_id: str, job_type: str, params: Optional[Dict] = None) -> Dict:
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "type": job_type,
+            "params": params or {},
+            "status": "queued",
+            "progress": {"done": 0, "total": None},
+            "attempts": 0,
+            "cancel_requested": False,
+            "created_at": _now().isoformat(),
+        }
+        await self.collection.insert_one(job)
+        if self._wake is not None:
+            self._wake.set()
+        return await self.get(user_id, job["id"])
+
+    async def get(self, user_id: str, job_id: str) -> Optional[Dict]:
+        return await self.collection.find_one({"id": job_id, "user_id": user_id}, _PRIVATE_FIELDS)
+
+    async def list(self, user_id: str, limit: int = 20) -> List[Dict]:
+        return await self.collection.find({"user_id": user_id}, _PRIVATE_FIELDS).sort("created_at", -1).to_list(limit)
+
+    async def cancel(self, user_id: str, job_id: str) -> Optional[Dict]:
+        """Cancel a queued job at once; ask a running one to stop at its next progress report"""
+        now = _now()
+        await self.collection.update_one(
+            {"id": job_id, "user_id": user_id, "status": "queued"},
+            {"$set": {"status": "cancelled", "cancel_requested": True, "finished_at": now.isoformat(),
+                      "expires_at": now + timedelta(hours=JOB_RETENTION_HOURS)}},
+        )
+        await self.collection.update_one(
+            {"id": job_id, "user_id": user_id, "status": "running"},
+            {"$set": {"cancel_requested": True}},
+        )
+        return await self.get(user_id, job_id)
+
+    # ---- workers ----
+
+    def start(self, workers: int = JOB_WORKERS):
+        if self._tasks or workers <= 0:
+            return
+        self._wake = asyncio.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._workers = [f"{prefix}:{n}" for n in range(workers)]
+        self._tasks = [asyncio.create_task(self._work(worker)) for worker in self._workers]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._workers:
+            # Hand interrupted jobs straight back to the queue instead of waiting for them to go stale
+            await self.collection.update_many(
+                {"worker": {"$in": self._workers}, "status": "running"},
+                {"$set": {"status": "queued"}, "$unset": {"worker": ""}},
+            )
+        self._tasks, self._workers, self._wake = [], [], None
+
+    async def _claim(self, worker: str) -> Optional[Dict]:
+        now = _now()
+        stale = (now - timedelta(seconds=JOB_STALE_SECONDS)).isoformat()
+        job = await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "running", "heartbeat_at": {"$lt": stale}},
+            ]},
+            {"$set": {"status": "running", "worker": worker, "heartbeat_at": now.isoformat()},
+             "$inc": {"attempts": 1}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None and "started_at" not in job:
+            await self.collection.update_one({"id": job["id"]}, {"$set": {"started_at": now.isoformat()}})
+        return job
+
+    async def _finish(self, job: Dict, worker: str, status: str, **fields):
+        now = _now()
+        await self.collection.update_one(
+            {"id": job["id"], "worker": worker, "status": "running"},
+            {"$set": {"status": status, "finished_at": now.isoformat(),
+                      "expires_at": now + timedelta(hours=JOB_RETENTION_HOURS), **fields}},
+        )
+
+    async def _heartbeat(self, job: Dict, worker: str):
+        while True:
+            await asyncio.sleep(JOB_STALE_SECONDS / 3)
+            await self.collection.update_one(
+                {"id": job["id"], "worker": worker, "status": "running"},
+                {"$set": {"heartbeat_at": _now().isoformat()}},
+            )
+
+    async def _run(self, job: Dict, worker: str):
+        if job["attempts"] > JOB_MAX_ATTEMPTS:
+            await self._finish(job, worker, "failed", error="Liian monta yritystä")
+            return
+        if job.get("cancel_requested"):
+            await self._finish(job, worker, "cancelled")
+            return
+        handler = self.handlers.get(job["type"])
+        if handler is None:
+            await self._finish(job, worker, "failed", error=f"Tuntematon työ: {job['type']}")
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job, worker))
+        try:
+            result = await handler(JobContext(self, job, worker))
+        except JobCancelled:
+            await self._finish(job, worker, "cancelled")
+        except Exception as e:
+            logger.exception(f"Job {job['id']} ({job['type']}) failed")
+            await self._finish(job, worker, "failed", error=str(e) or type(e).__name__)
+        else:
+            await self._finish(job, worker, "succeeded", result=result or {})
+        finally:
+            heartbeat.cancel()
+
+    async def _work(self, worker: str):
+        while True:
+            # Cleared before claiming, so an enqueue during the claim is not missed
+            self._wake.clear()
+            try:
+                job = await self._claim(worker)
+                if job is not None:
+                    await self._run(job, worker)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {worker} error: {e!r}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
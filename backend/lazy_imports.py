@@ -0,0 +1,27 @@
+"""
+Deferred imports for modules that are only needed on some requests.
+
+`lazy_import("httpx")` returns a module object straight away but runs the
+module's code on first attribute access, so workers that never talk to a bank
+or to Stripe never pay for those imports.
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return `name` as a module that is executed on first attribute access"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,200 @@
+"""
+Live updates for open browser tabs over Server-Sent Events.
+
+EventBroker fans events out to the streams a user has open in this process.
+Events come from a MongoDB change stream when the deployment supports one
+(replica set or Atlas), which also carries writes made by other workers and
+instances. On a standalone server the routes publish their own writes
+instead, and only streams served by the same process see them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional, Set
+
+from fastapi import HTTPException
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger("walleta.live")
+
+WATCHED_COLLECTIONS = ("expenses", "incomes", "budgets", "loans", "savings_goals")
+
+LIVE_EVENTS_SOURCE = os.environ.get("LIVE_EVENTS_SOURCE", "auto").lower()
+MAX_STREAMS_PER_USER = int(os.environ.get("LIVE_MAX_STREAMS_PER_USER", "10"))
+STREAM_QUEUE_SIZE = int(os.environ.get("LIVE_STREAM_QUEUE_SIZE", "100"))
+
+RESYNC = {"type": "resync"}
+
+# OperationFailure code when the resume token has fallen off the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+def change_event(collection: str, op: str, doc: Dict) -> Dict:
+    """Compact delta: the whole document for inserts/updates, the id for deletes"""
+    if op == "delete":
+        return {"type": "change", "collection": collection, "op": op, "id": doc.get("id")}
+    return {
+        "type": "change",
+        "collection": collection,
+        "op": op,
+        "doc": {key: value for key, value in doc.items() if key != "_id"},
+    }
+
+
+def format_sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Optional[Dict]]" = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+
+    def push(self, event: Optional[Dict]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow client missed events; tell it to refetch instead of queueing more
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC if event is not None else None)
+
+
+class EventBroker:
+    """Per-user fan-out to the event streams open in this process"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, user_id: str) -> Subscription:
+        streams = self._subscribers.setdefault(user_id, set())
+        if len(streams) >= MAX_STREAMS_PER_USER:
+            raise HTTPException(status_code=429, detail="Liian monta avointa yhteyttä")
+        subscription = Subscription(user_id)
+        streams.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        streams = self._subscribers.get(subscription.user_id)
+        if streams is not None:
+            streams.discard(subscription)
+            if not streams:
+                del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, event: Dict):
+        for subscription in list(self._subscribers.get(user_id, ())):
+            subscription.push(event)
+
+    def broadcast(self, event: Optional[Dict]):
+        for streams in list(self._subscribers.values()):
+            for subscription in list(streams):
+                subscription.push(event)
+
+    @property
+    def stream_count(self) -> int:
+        return sum(len(streams) for streams in self._subscribers.values())
+
+
+class ChangeStreamWatcher:
+    """Feeds the broker from one database-wide change stream per process.
+
+    Deletes are routed by the pre-image, so the watched collections need
+    changeStreamPreAndPostImages (MongoDB 6.0+); enable_pre_images() turns it
+    on where permitted. Without a pre-image, a delete on a collection sharded
+    on user_id still names the user in its documentKey, and that user's tabs
+    are told to resync; elsewhere such deletes are dropped.
+    """
+
+    def __init__(self, broker: EventBroker, collections=WATCHED_COLLECTIONS):
+        self.broker = broker
+        self.collections = list(collections)
+        self.active = False
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+
+    def _open(self, db):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": self.collections},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        return db.watch(
+            pipeline,
+            full_document="updateLookup",
+            full_document_before_change="whenAvailable",
+            resume_after=self._resume_token,
+        )
+
+    def covers(self, collection: str) -> bool:
+        """Whether writes to collection reach the broker through the stream"""
+        return self.active and collection in self.collections
+
+    async def enable_pre_images(self, db):
+        for name in self.collections:
+            try:
+                await db.command("collMod", name, changeStreamPreAndPostImages={"enabled": True})
+            except PyMongoError as e:
+                logger.info(f"Pre-images not enabled on {name}: {e}")
+
+    async def start(self, db) -> bool:
+        """Open the stream; False when the deployment has no change streams"""
+        try:
+            stream = self._open(db)
+            # The server only rejects the stream (e.g. standalone mongod) on the first fetch
+            change = await stream.try_next()
+        except PyMongoError as e:
+            logger.info(f"Change streams unavailable, publishing writes in-process: {e}")
+            return False
+        self.active = True
+        if change is not None:
+            self._dispatch(change)
+        self._task = asyncio.create_task(self._run(db, stream))
+        return True
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.active = False
+
+    async def _run(self, db, stream):
+        delay = 1
+        while True:
+            try:
+                async with stream:
+                    async for change in stream:
+                        self._dispatch(change)
+                        delay = 1
+            except PyMongoError as e:
+                logger.warning(f"Change stream interrupted, reopening in {delay}s: {e}")
+                if getattr(e, "code", None) == CHANGE_STREAM_HISTORY_LOST:
+                    self._resume_token = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            # Events may have been missed while the stream was down
+            stream = self._open(db)
+            self.broker.broadcast(RESYNC)
+
+    def _dispatch(self, change: Dict):
+        self._resume_token = change.get("_id")
+        doc = change.get("fullDocument") or change.get("fullDocumentBeforeChange")
+        if not doc:
+            user_id = change.get("documentKey", {}).get("user_id")
+            if user_id is not None:
+                self.broker.publish(user_id, RESYNC)
+            return
+        if "user_id" not in doc:
+            return
+        op = change["operationType"]
+        op = "update" if op == "replace" else op
+        self.broker.publish(doc["user_id"], change_event(change["ns"]["coll"], op, doc))
+
+
+def watcher_enabled() -> bool:
+    return LIVE_EVENTS_SOURCE in ("auto", "changestream")
+
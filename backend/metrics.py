@@ -0,0 +1,265 @@
+"""
+Minimal Prometheus instrumentation for the Walleta API.
+
+Counters, gauges and histograms are kept in-process and rendered in the
+Prometheus text exposition format (0.0.4), so no client library is needed.
+Every instance is scraped separately.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+PROCESS_START_TIME = time.time()
+
+http_requests_total = registry.register(Counter(
+    "walleta_http_requests_total", "HTTP requests by route, method and status", ("method", "route", "status")))
+http_request_duration_seconds = registry.register(Histogram(
+    "walleta_http_request_duration_seconds", "HTTP request latency by route", ("method", "route")))
+http_requests_in_progress = registry.register(Gauge(
+    "walleta_http_requests_in_progress", "HTTP requests currently being served", ("method",)))
+mongo_commands_total = registry.register(Counter(
+    "walleta_mongo_commands_total", "MongoDB commands by name and outcome", ("command", "outcome")))
+mongo_command_duration_seconds = registry.register(Histogram(
+    "walleta_mongo_command_duration_seconds", "MongoDB command latency", ("command",)))
+external_calls_total = registry.register(Counter(
+    "walleta_external_calls_total", "Calls to Nordigen and Stripe", ("service", "operation", "outcome")))
+external_call_duration_seconds = registry.register(Histogram(
+    "walleta_external_call_duration_seconds", "Latency of Nordigen and Stripe calls", ("service", "operation")))
+registry.register(Gauge(
+    "process_cpu_seconds_total", "Total user and system CPU time spent in seconds", function=time.process_time))
+registry.register(Gauge(
+    "process_start_time_seconds", "Start time of the process since unix epoch in seconds", function=lambda: PROCESS_START_TIME))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests.
+
+    Routes are labelled with their path template (e.g. /api/expenses/{expense_id})
+    so ids never end up as label values.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_progress.dec(method=method)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            http_requests_total.inc(method=method, route=route_path, status=status["code"])
+            http_request_duration_seconds.observe(elapsed, method=method, route=route_path)
+
+
+class MongoMetricsListener(monitoring.CommandListener):
+    """Counts and times every command sent through the Motor client"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_commands_total.inc(command=event.command_name, outcome="ok")
+        mongo_command_duration_seconds.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        mongo_commands_total.inc(command=event.command_name, outcome="error")
+        mongo_command_duration_seconds.observe(event.duration_micros / 1e6, command=event.command_name)
+
+
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[A-Za-z0-9_\-]{6,}$")
+
+
+def normalize_path(path: str) -> str:
+    """Collapse id-like path segments so external call labels stay bounded"""
+    return "/".join(":id" if _ID_SEGMENT.match(part) else part for part in path.split("/"))
+
+
+@contextmanager
+def track_external(service: str, operation: str):
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        external_calls_total.inc(service=service, operation=operation, outcome=outcome)
+        external_call_duration_seconds.observe(time.perf_counter() - started, service=service, operation=operation)
+
+
+def httpx_event_hooks(service: str) -> Dict[str, list]:
+    """httpx event hooks that record every request made by a client"""
+
+    async def on_request(request):
+        request.extensions["walleta_started"] = time.perf_counter()
+
+    async def on_response(response):
+        request = response.request
+        operation = f"{request.method} {normalize_path(request.url.path)}"
+        started = request.extensions.get("walleta_started", time.perf_counter())
+        external_calls_total.inc(service=service, operation=operation, outcome=str(response.status_code))
+        external_call_duration_seconds.observe(time.perf_counter() - started, service=service, operation=operation)
+
+    return {"request": [on_request], "response": [on_response]}
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Data migrations for the Walleta database
+
+Each subcommand is idempotent and works in batches, so it can run against a
+live database and be restarted after an interruption.
+
+    cd backend
+    python migrate.py search-tokens
+    python migrate.py search-tokens --batch-size 2000 --dry-run
+    python migrate.py buckets --delete-source
+    python migrate.py archive --months 24
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, UpdateOne
+
+from archive import ARCHIVE_AFTER_MONTHS, archive_before, cutoff_month
+from search import search_tokens
+from transaction_store import BUCKET_COLLECTIONS, TRANSACTION_KINDS, BucketStore, create_store
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+def scan(collection, query: dict, projection=None, batch_size: int = 1000):
+    """Batches of every matching document across all users, in _id order"""
+    last_id = None
+    while True:
+        batch_query = dict(query, **({"_id": {"$gt": last_id}} if last_id is not None else {}))
+        docs = list(collection.find(batch_query, projection).sort("_id", 1).limit(batch_size))
+        if not docs:
+            return
+        yield docs
+        last_id = docs[-1]["_id"]
+
+
+def count_all(collection, query: dict) -> int:
+    """Matching documents across all users, for --dry-run"""
+    return collection.count_documents(query)
+
+
+def by_user(docs: list) -> dict:
+    grouped = {}
+    for doc in docs:
+        grouped.setdefault(doc["user_id"], []).append(doc)
+    return grouped
+
+
+def backfill_search_tokens(db, batch_size: int, dry_run: bool) -> dict:
+    """Add search_tokens to expenses and incomes written before search existed"""
+    updated = {}
+    for name in ("expenses", "incomes"):
+        collection = db[name]
+        query = {"search_tokens": {"$exists": False}}
+        if dry_run:
+            updated[name] = count_all(collection, query)
+            continue
+        count = 0
+        for docs in scan(collection, query, {"user_id": 1, "description": 1, "counterparty": 1}, batch_size):
+            collection.bulk_write([
+                UpdateOne({"_id": doc["_id"], "user_id": doc["user_id"]}, {"$set": {
+                    "search_tokens": search_tokens(doc.get("description", ""), doc.get("counterparty", ""))
+                }})
+                for doc in docs
+            ], ordered=False)
+            count += len(docs)
+        updated[name] = count
+    return updated
+
+
+def copy_to_buckets(db, batch_size: int, dry_run: bool, delete_source: bool) -> dict:
+    """Copy expenses and incomes into per-month buckets for TRANSACTION_STORAGE=buckets.
+
+    Rows already present in a bucket are skipped, so an interrupted run can
+    simply be repeated. With delete_source the copied documents are removed
+    from the original collection batch by batch.
+    """
+    copied = {}
+    for kind in TRANSACTION_KINDS:
+        source, buckets = db[kind], db[BUCKET_COLLECTIONS[kind]]
+        if dry_run:
+            copied[kind] = count_all(source, {})
+            continue
+        count = 0
+        for docs in scan(source, {}, batch_size=batch_size):
+            # Grouped by user: the bucket index and shard key lead with user_id
+            present = {
+                item["id"]
+                for user_id, user_docs in by_user(docs).items()
+                for bucket in buckets.find(
+                    {"user_id": user_id, "items.id": {"$in": [doc["id"] for doc in user_docs]}},
+                    {"_id": 0, "items.id": 1},
+                )
+                for item in bucket["items"]
+            }
+            pending = [doc for doc in docs if doc["id"] not in present]
+            if pending:
+                # Ordered: later chunks for a month must see the bucket the earlier one filled
+                buckets.bulk_write([
+                    UpdateOne(query, update, upsert=True)
+                    for query, update in BucketStore.bucket_updates(kind, pending)
+                ])
+            if delete_source:
+                source.delete_many({
+                    "user_id": {"$in": list(by_user(docs))},
+                    "_id": {"$in": [doc["_id"] for doc in docs]},
+                })
+            count += len(pending)
+        copied[kind] = count
+    return copied
+
+
+async def archive_old_months(mongo_url: str, db_name: str, storage: str, months: int, dry_run: bool) -> dict:
+    """Move user-months older than the horizon to transaction_archive"""
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        db = client[db_name]
+        store = create_store(storage, lambda: db)
+        return await archive_before(db, store, cutoff_month(months), dry_run)
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Walleta data migrations")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME", "walleta"))
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    tokens = subcommands.add_parser("search-tokens", help="Backfill search_tokens on expenses and incomes")
+    tokens.add_argument("--batch-size", type=int, default=1000)
+    tokens.add_argument("--dry-run", action="store_true", help="Only count documents that need it")
+
+    buckets = subcommands.add_parser("buckets", help="Copy expenses and incomes into monthly buckets")
+    buckets.add_argument("--batch-size", type=int, default=1000)
+    buckets.add_argument("--dry-run", action="store_true", help="Only count documents to copy")
+    buckets.add_argument("--delete-source", action="store_true", help="Remove documents once copied")
+
+    archive = subcommands.add_parser("archive", help="Move old expenses and incomes to compressed monthly archives")
+    archive.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="Months to keep in the hot store")
+    archive.add_argument("--storage", default=os.environ.get("TRANSACTION_STORAGE", "documents"))
+    archive.add_argument("--dry-run", action="store_true", help="Only count rows to archive")
+
+    args = parser.parse_args()
+    client = MongoClient(args.mongo_url)
+    db = client[args.db_name]
+    started = time.perf_counter()
+    try:
+        if args.command == "search-tokens":
+            result = backfill_search_tokens(db, args.batch_size, args.dry_run)
+        elif args.command == "buckets":
+            result = copy_to_buckets(db, args.batch_size, args.dry_run, args.delete_source)
+        elif args.command == "archive":
+            result = asyncio.run(archive_old_months(args.mongo_url, args.db_name, args.storage, args.months, args.dry_run))
+    finally:
+        client.close()
+    verb = "would update" if getattr(args, "dry_run", False) else "updated"
+    for name, count in result.items():
+        print(f"{name}: {verb} {count} documents")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+Opt-in, sampled profiling of HTTP requests.
+
+ProfilingMiddleware profiles a PROFILE_SAMPLE_RATE fraction of requests
+(optionally only under PROFILE_ROUTES), plus any request carrying an
+X-Profile header signed with PROFILE_SECRET. Two profilers are available:
+
+- cprofile: deterministic; writes a pstats `.prof` file (snakeviz,
+  flameprof, `python -m pstats`)
+- sampler: a thread samples the event loop's stack every
+  PROFILE_INTERVAL_MS; writes folded stacks (`.folded`) for flamegraph.pl
+  or speedscope
+
+Files go to PROFILE_DIR/<route>/, newest PROFILE_KEEP per route. A short
+summary per route (latency, hottest functions) is kept in memory for the
+/debug/profiles endpoint. Both profilers see the whole event-loop thread,
+so under concurrency a profile also holds other requests' work; one
+request is profiled at a time per process.
+
+Sign a header for ad-hoc profiling of a single request:
+
+    python profiling.py sign --minutes 10
+"""
+
+import argparse
+import cProfile
+import hashlib
+import hmac
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger("walleta.profiling")
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# Comma separated path prefixes sampling is limited to; empty means all routes
+PROFILE_ROUTES = [p.strip() for p in os.environ.get("PROFILE_ROUTES", "").split(",") if p.strip()]
+PROFILE_SECRET = os.environ.get("PROFILE_SECRET", "")
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "cprofile").lower()
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "walleta-profiles")))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+
+PROFILE_HEADER = "x-profile"
+# Never profiled: the summary endpoint itself and scrapes
+EXCLUDED_PATHS = ("/debug/", "/metrics")
+TOP_FUNCTIONS = 15
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def sign_token(secret: str, ttl_seconds: int = 600) -> str:
+    """`<expiry>.<hmac>` value for the X-Profile header"""
+    expires = int(time.time()) + ttl_seconds
+    return f"{expires}.{hmac.new(secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()}"
+
+
+def verify_token(token: Optional[str], secret: str = PROFILE_SECRET) -> bool:
+    if not secret or not token or "." not in token:
+        return False
+    expires, signature = token.split(".", 1)
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def route_slug(route: str) -> str:
+    return _UNSAFE.sub("_", route).strip("_") or "unknown"
+
+
+def _label(code) -> str:
+    # ';' separates frames in the folded format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class StackSampler:
+    """Statistical profiler: samples one thread's stack from a helper thread"""
+
+    extension = "folded"
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks: Counter = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="walleta-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: Path):
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in self.stacks.items()))
+
+    def top(self) -> List[Dict]:
+        """Leaf frames by samples, as milliseconds of self time"""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [
+            {"function": function, "self_ms": round(count * self.interval * 1000, 1)}
+            for function, count in leaves.most_common(TOP_FUNCTIONS)
+        ]
+
+
+class CProfiler:
+    extension = "prof"
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path: Path):
+        self.profile.dump_stats(str(path))
+
+    def top(self) -> List[Dict]:
+        stats = pstats.Stats(self.profile).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+        return [
+            {
+                "function": f"{name} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "self_ms": round(self_time * 1000, 2),
+                "cumulative_ms": round(cumulative * 1000, 2),
+            }
+            for (filename, line, name), (_, calls, self_time, cumulative, _) in rows
+        ]
+
+
+PROFILERS = {"cprofile": CProfiler, "sampler": StackSampler}
+
+
+class ProfileLog:
+    """The newest PROFILE_KEEP profiles per route; evicted files are deleted"""
+
+    def __init__(self, directory: Path = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._routes: Dict[str, Deque[Dict]] = defaultdict(lambda: deque(maxlen=self.keep))
+        self._lock = threading.Lock()
+
+    def save(self, route: str, profile_id: str, profiler, duration_ms: float) -> str:
+        """Write the profile to disk and remember it; runs in a worker thread"""
+        folder = self.directory / route_slug(route)
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"{profile_id}.{profiler.extension}"
+        profiler.write(path)
+        entry = {"file": str(path), "duration_ms": round(duration_ms, 1), "at": time.time(), "top": profiler.top()}
+        with self._lock:
+            entries = self._routes[route]
+            if len(entries) == entries.maxlen:
+                Path(entries[0]["file"]).unlink(missing_ok=True)
+            entries.append(entry)
+        return str(path)
+
+    def summary(self) -> List[Dict]:
+        with self._lock:
+            routes = {route: list(entries) for route, entries in self._routes.items()}
+        summary = []
+        for route, entries in routes.items():
+            durations = sorted(entry["duration_ms"] for entry in entries)
+            functions: Dict[str, float] = defaultdict(float)
+            for entry in entries:
+                for row in entry["top"]:
+                    functions[row["function"]] += row["self_ms"]
+            summary.append({
+                "route": route,
+                "profiles": len(entries),
+                "mean_ms": round(sum(durations) / len(durations), 1),
+                "max_ms": durations[-1],
+                "latest": entries[-1]["file"],
+                "top": [
+                    {"function": function, "self_ms": round(total, 1)}
+                    for function, total in sorted(functions.items(), key=lambda item: item[1], reverse=True)[:TOP_FUNCTIONS]
+                ],
+            })
+        summary.sort(key=lambda route: route["mean_ms"] * route["profiles"], reverse=True)
+        return summary
+
+
+profile_log = ProfileLog()
+
+
+def profiling_enabled() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_SECRET)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling sampled or explicitly requested requests.
+
+    Profiled responses carry an X-Profile-Id header naming the written file.
+    """
+
+    def __init__(self, app, log: ProfileLog = profile_log):
+        self.app = app
+        self.log = log
+        self._busy = False
+
+    def _wanted(self, scope) -> bool:
+        if scope["path"].startswith(EXCLUDED_PATHS):
+            return False
+        headers = dict(scope.get("headers") or [])
+        if verify_token(headers.get(PROFILE_HEADER.encode(), b"").decode("latin-1")):
+            return True
+        if PROFILE_ROUTES and not any(scope["path"].startswith(prefix) for prefix in PROFILE_ROUTES):
+            return False
+        return random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._busy or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = PROFILERS.get(PROFILE_MODE, CProfiler)()
+        try:
+            profiler.start()
+        except ValueError:
+            # Another profiler (a debugger, coverage) owns the interpreter hook
+            await self.app(scope, receive, send)
+            return
+        self._busy = True
+        # Sortable by time, so the newest file of a route lists last
+        profile_id = time.strftime("%Y%m%dT%H%M%S") + f"-{time.time_ns() % 10**9:09d}"
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            self._busy = False
+            duration_ms = (time.perf_counter() - started) * 1000
+            route = scope.get("route")
+            name = f"{scope.get('method', '')} {getattr(route, 'path', None) or scope.get('path', '')}"
+            try:
+                path = await run_in_threadpool(self.log.save, name, profile_id, profiler, duration_ms)
+                logger.info("Profiled %s in %.1f ms: %s", name, duration_ms, path)
+            except OSError as e:
+                logger.error(f"Could not write profile for {name}: {e!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walleta request profiling")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sign = commands.add_parser("sign", help="Print an X-Profile header value signed with PROFILE_SECRET")
+    sign.add_argument("--minutes", type=int, default=10)
+    args = parser.parse_args()
+
+    if not PROFILE_SECRET:
+        raise SystemExit("PROFILE_SECRET is not set")
+    print(f"X-Profile: {sign_token(PROFILE_SECRET, args.minutes * 60)}")
+
+
+if __name__ == "__main__":
+    main()
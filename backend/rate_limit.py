@@ -0,0 +1,184 @@
+"""
+Admission control for the authentication routes.
+
+Token buckets keyed by client IP and by email reject brute-force and
+credential-stuffing traffic before any database or bcrypt work, and a global
+limiter caps how many password hashes run at once. Buckets live in process by
+default; MongoRateLimitBackend shares them between instances.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Tuple
+
+from fastapi import HTTPException, Request
+from pymongo import ReturnDocument
+
+from cpu_tasks import run_cpu
+
+
+class Limit:
+    """Bucket of `capacity` tokens that refills completely in `period` seconds"""
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        # "10/60" = ten attempts, refilled over sixty seconds
+        capacity, period = value.split("/")
+        return cls(int(capacity), float(period))
+
+
+class InMemoryRateLimitBackend:
+    """Token buckets for a single process, bounded to `max_keys` entries"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, limit: Limit, cost: float = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / limit.rate
+
+
+class MongoRateLimitBackend:
+    """Token buckets shared by all instances, updated atomically in MongoDB.
+
+    Each take() is a single findAndModify with a pipeline update, so
+    concurrent instances never double-spend a token. Idle buckets expire via
+    a TTL index on expires_at.
+    """
+
+    def __init__(self, get_collection: Callable):
+        self._get_collection = get_collection
+
+    async def take(self, key: str, limit: Limit, cost: float = 1) -> Tuple[bool, float]:
+        now = time.time()
+        refilled = {"$min": [
+            limit.capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", limit.capacity]},
+                {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, limit.rate]},
+            ]},
+        ]}
+        doc = await self._get_collection().find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=limit.period),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        allowed = doc["allowed"]
+        return allowed, 0.0 if allowed else (cost - doc["tokens"]) / limit.rate
+
+
+class HashingLimiter:
+    """Caps concurrent bcrypt work and sheds load once too many are waiting"""
+
+    def __init__(self, max_concurrency: int, max_waiting: int):
+        self.max_waiting = max_waiting
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._waiting >= self.max_waiting:
+            raise HTTPException(
+                status_code=503,
+                detail="Palvelu on ruuhkautunut, yritä hetken päästä uudelleen",
+                headers={"Retry-After": "1"},
+            )
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+class AuthThrottle:
+    """Per-IP and per-email limits for login and registration"""
+
+    def __init__(self, backend, login_ip: Limit, login_email: Limit, register_ip: Limit, proxy_hops: int = 1):
+        self.backend = backend
+        self.login_ip = login_ip
+        self.login_email = login_email
+        self.register_ip = register_ip
+        self.proxy_hops = proxy_hops
+
+    def client_ip(self, request: Request) -> str:
+        # The rightmost X-Forwarded-For entries are added by our own proxies;
+        # anything further left is client supplied and can be spoofed
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded and self.proxy_hops > 0:
+            hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+            if hops:
+                return hops[-min(self.proxy_hops, len(hops))]
+        return request.client.host if request.client else "unknown"
+
+    async def _take(self, key: str, limit: Limit):
+        allowed, retry_after = await self.backend.take(key, limit)
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Liian monta yritystä, yritä myöhemmin uudelleen",
+                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+            )
+
+    async def check_login(self, request: Request, email: str):
+        await self._take(f"login:ip:{self.client_ip(request)}", self.login_ip)
+        await self._take(f"login:email:{email.strip().lower()}", self.login_email)
+
+    async def check_register(self, request: Request):
+        await self._take(f"register:ip:{self.client_ip(request)}", self.register_ip)
+
+
+def throttle_from_env(get_collection: Callable) -> AuthThrottle:
+    if os.environ.get("RATE_LIMIT_BACKEND", "memory").lower() == "mongo":
+        backend = MongoRateLimitBackend(get_collection)
+    else:
+        backend = InMemoryRateLimitBackend()
+    return AuthThrottle(
+        backend,
+        login_ip=Limit.parse(os.environ.get("LOGIN_IP_LIMIT", "30/60")),
+        login_email=Limit.parse(os.environ.get("LOGIN_EMAIL_LIMIT", "10/600")),
+        register_ip=Limit.parse(os.environ.get("REGISTER_IP_LIMIT", "10/3600")),
+        proxy_hops=int(os.environ.get("RATE_LIMIT_PROXY_HOPS", "1")),
+    )
+
+
+def hashing_limiter_from_env() -> HashingLimiter:
+    return HashingLimiter(
+        max_concurrency=int(os.environ.get("BCRYPT_MAX_CONCURRENCY", str(os.cpu_count() or 2))),
+        max_waiting=int(os.environ.get("BCRYPT_MAX_WAITING", "64")),
+    )
+
+
+async def run_limited(limiter: HashingLimiter, fn, *args):
+    """Run blocking hashing work off the event loop, inside a limiter slot"""
+    async with limiter.slot():
+        return await run_cpu(fn, *args)
@@ -0,0 +1,171 @@
+"""
+Per-user monthly totals kept up to date incrementally.
+
+A monthly_rollups document holds expense and income totals, counts and
+per-category / per-source breakdowns for one user and month. A month is
+rebuilt from the transaction store's month totals when it has no complete
+rollup; rollups expire ROLLUP_TTL_HOURS after they were rebuilt, so drift
+from writes that bypass the API heals on its own.
+
+Inserts run inside rollup_insert: before the rows are written the month's
+`pending` and `version` counters go up, afterwards the rows' delta is
+applied with $inc and `pending` goes back down. Deletes do not know the
+month in advance, so they mark it incomplete instead. A rebuild only stores
+its snapshot if no write was in flight when it started (`pending` 0) and
+none began while it read the totals (`version` unchanged); otherwise the
+totals are returned for that read alone and the next read rebuilds again.
+A snapshot therefore never misses a row whose delta will not follow, nor
+contains one whose delta still will, as long as the rollup is not removed
+while a write is in flight: rollup_insert pushes `expires_at` at least
+ROLLUP_PENDING_GRACE_MINUTES ahead, so the TTL monitor cannot delete a
+month between a write's two steps. A process dying between them leaves
+`pending` raised until the rollup expires; until then that month is
+rebuilt on every read rather than cached.
+"""
+
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+
+from pymongo import UpdateOne
+
+from transaction_store import BREAKDOWN_FIELDS, decode_key, encode_key
+
+ROLLUP_TTL_HOURS = float(os.environ.get("ROLLUP_TTL_HOURS", "24"))
+# Longest an insert may take between raising and lowering `pending`
+ROLLUP_PENDING_GRACE_MINUTES = float(os.environ.get("ROLLUP_PENDING_GRACE_MINUTES", "10"))
+
+
+def _deltas(kind: str, docs: Iterable[Dict]) -> Dict[str, Dict[str, float]]:
+    """$inc documents per month for the given expense or income docs"""
+    field, default = BREAKDOWN_FIELDS[kind]
+    by_month: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+    for doc in docs:
+        inc = by_month[doc["date"][:7]]
+        inc[f"{kind}.total"] += doc["amount"]
+        inc[f"{kind}.count"] += 1
+        key = encode_key(doc.get(field) or default)
+        inc[f"{kind}.by.{key}"] += doc["amount"]
+        inc[f"{kind}.counts.{key}"] += 1
+    return by_month
+
+
+def _expires_at() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(hours=ROLLUP_TTL_HOURS)
+
+
+def _months(docs: Iterable[Dict]) -> List[str]:
+    return sorted({doc["date"][:7] for doc in docs})
+
+
+@asynccontextmanager
+async def rollup_insert(db, user_id: str, kind: str, docs: List[Dict]):
+    """Wrap the insert of expense or income docs so their months stay exact:
+
+        async with rollup_insert(db, user_id, "expenses", docs):
+            await transactions.insert("expenses", docs)
+    """
+    if not docs:
+        yield
+        return
+    deltas = _deltas(kind, docs)
+    await db.monthly_rollups.bulk_write([
+        UpdateOne({"user_id": user_id, "month": month},
+                  {"$inc": {"pending": 1, "version": 1},
+                   # Not expirable before the delta lands; only ever moves expires_at later
+                   "$max": {"expires_at": datetime.now(timezone.utc) + timedelta(minutes=ROLLUP_PENDING_GRACE_MINUTES)}},
+                  upsert=True)
+        for month in deltas
+    ], ordered=False)
+    try:
+        yield
+    except BaseException:
+        # Some rows may have been written; have the months rebuilt
+        await db.monthly_rollups.bulk_write([
+            UpdateOne({"user_id": user_id, "month": month},
+                      {"$inc": {"pending": -1, "version": 1}, "$set": {"complete": False}})
+            for month in deltas
+        ], ordered=False)
+        raise
+    now = datetime.now(timezone.utc).isoformat()
+    await db.monthly_rollups.bulk_write([
+        UpdateOne({"user_id": user_id, "month": month},
+                  {"$inc": {**inc, "pending": -1}, "$set": {"updated_at": now}})
+        for month, inc in deltas.items()
+    ], ordered=False)
+
+
+async def invalidate_rollups(db, user_id: str, docs: List[Dict]):
+    """Have the months of deleted docs rebuilt on their next read"""
+    if not docs:
+        return
+    await db.monthly_rollups.bulk_write([
+        UpdateOne({"user_id": user_id, "month": month}, {"$set": {"complete": False}, "$inc": {"version": 1}})
+        for month in _months(docs)
+    ], ordered=False)
+
+
+def _encoded(totals: Dict) -> Dict:
+    return {
+        **totals,
+        "by": {encode_key(key): amount for key, amount in totals["by"].items()},
+        "counts": {encode_key(key): number for key, number in totals["counts"].items()},
+    }
+
+
+def _decoded(rollup: Dict) -> Dict:
+    for kind in BREAKDOWN_FIELDS:
+        # Keys of deleted rows stay behind at zero
+        counts = rollup[kind].get("counts", {})
+        rollup[kind]["by"] = {decode_key(key): amount for key, amount in rollup[kind].get("by", {}).items()
+                              if amount or counts.get(key)}
+        rollup[kind]["counts"] = {decode_key(key): number for key, number in counts.items() if number}
+    return rollup
+
+
+async def get_rollups(db, store, user_id: str, months: List[str]) -> Dict[str, Dict]:
+    """Rollups for several months in one query; missing ones are rebuilt in one pass"""
+    found = {
+        rollup["month"]: rollup
+        async for rollup in db.monthly_rollups.find({"user_id": user_id, "month": {"$in": months}}, {"_id": 0})
+    }
+    rollups = {month: rollup for month, rollup in found.items() if rollup.get("complete")}
+    missing = [month for month in months if month not in rollups]
+    if missing:
+        absent = [month for month in missing if month not in found]
+        if absent:
+            # Placeholders give the version check below a document to match
+            await db.monthly_rollups.bulk_write([
+                UpdateOne({"user_id": user_id, "month": month},
+                          {"$setOnInsert": {"version": 0, "pending": 0, "expires_at": _expires_at()}},
+                          upsert=True)
+                for month in absent
+            ], ordered=False)
+        versions = {month: found.get(month, {"version": 0}).get("version") for month in missing}
+        idle = [month for month in missing if not found.get(month, {}).get("pending")]
+        now = datetime.now(timezone.utc)
+        totals = {kind: await store.totals_by_month(kind, user_id, missing) for kind in BREAKDOWN_FIELDS}
+        fresh = {
+            month: {
+                **{kind: _encoded(totals[kind][month]) for kind in BREAKDOWN_FIELDS},
+                "complete": True,
+                "updated_at": now.isoformat(),
+                "expires_at": now + timedelta(hours=ROLLUP_TTL_HOURS),
+            }
+            for month in missing
+        }
+        # Left incomplete if a write started before or during the rebuild
+        if idle:
+            await db.monthly_rollups.bulk_write([
+                UpdateOne({"user_id": user_id, "month": month, "version": versions[month]}, {"$set": fresh[month]})
+                for month in idle
+            ], ordered=False)
+        rollups.update({month: {"user_id": user_id, "month": month, **doc} for month, doc in fresh.items()})
+    return {month: _decoded(rollup) for month, rollup in rollups.items()}
+
+
+async def get_rollup(db, store, user_id: str, month: str) -> Dict:
+    """Rollup for one month, rebuilt from the transaction store when missing"""
+    return (await get_rollups(db, store, user_id, [month]))[month]
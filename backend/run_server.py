@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the Walleta API.
+
+Runs uvicorn with WEB_CONCURRENCY worker processes so request handling uses
+every core. Each worker runs the app lifespan on its own (indexes, CPU pool,
+Mongo client). With more than one worker the auth rate limits move to MongoDB
+so every worker sees the same buckets, and the CPU pool is sized so workers
+don't oversubscribe the machine.
+
+    cd backend
+    WEB_CONCURRENCY=4 python run_server.py
+"""
+
+import os
+
+import uvicorn
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    workers = int(os.environ.get("WEB_CONCURRENCY", str(cpus)))
+    if workers > 1:
+        os.environ.setdefault("RATE_LIMIT_BACKEND", "mongo")
+    os.environ.setdefault("CPU_POOL_WORKERS", str(max(1, cpus // workers)))
+
+    uvicorn.run(
+        "server:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8001")),
+        workers=workers,
+        proxy_headers=True,
+        forwarded_allow_ips=os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        lifespan="on",
+        log_level=os.environ.get("LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
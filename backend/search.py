@@ -0,0 +1,78 @@
+"""
+Search helpers for expense and income descriptions.
+
+Full-text search uses a per-user compound text index on description and
+counterparty. Merchant autocomplete uses `search_tokens`, a short list of
+normalized words stored on each document, where an anchored prefix regex
+walks the (user_id, search_tokens) index instead of scanning the ledger.
+
+text_score() scores a single row the way the text index would, for stores
+where the index only finds the containing document (BucketStore).
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+import snowballstemmer
+
+MAX_TOKENS = 24
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Must match the weights and language of the text indexes
+TEXT_WEIGHTS = {"description": 2, "counterparty": 1}
+_STEMMER = snowballstemmer.stemmer("finnish")
+
+
+def normalize(text: str) -> str:
+    # Keep å/ä/ö but fold case and compatibility forms (e.g. full-width letters)
+    return unicodedata.normalize("NFKC", text).casefold().strip()
+
+
+def search_tokens(*texts: str) -> List[str]:
+    """Words of the given texts plus each whole text, for prefix matching"""
+    tokens = []
+    for text in texts:
+        if not text:
+            continue
+        normalized = normalize(text)
+        tokens.append(" ".join(normalized.split()))
+        tokens.extend(word for word in _WORD.findall(normalized) if len(word) > 1)
+    return list(dict.fromkeys(tokens))[:MAX_TOKENS]
+
+
+def prefix_pattern(prefix: str) -> str:
+    """Anchored, case-sensitive regex so MongoDB can use index bounds"""
+    return "^" + re.escape(" ".join(normalize(prefix).split()))
+
+
+def _stems(text: str) -> List[str]:
+    return _STEMMER.stemWords(_WORD.findall(normalize(text)))
+
+
+def text_terms(q: str) -> List[str]:
+    """Stemmed terms of a $text query, without negated words"""
+    return list(dict.fromkeys(
+        stem for part in q.split() if not part.startswith("-") for stem in _stems(part.strip('"'))
+    ))
+
+
+def text_score(terms: Iterable[str], doc: Dict) -> float:
+    """MongoDB's textScore of doc for the query terms; 0 when none match.
+
+    Per field, each term scores weight * freq * (0.5 * count / words + 0.5),
+    where repeated words add 1, 1/2, 1/4, ... to freq. Stop words, which the
+    index drops, are still counted among the words here.
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for field, weight in TEXT_WEIGHTS.items():
+        stems = _stems(doc.get(field) or "")
+        counts: Dict[str, int] = defaultdict(int)
+        freqs: Dict[str, float] = defaultdict(float)
+        for stem in stems:
+            freqs[stem] += 1 / 2 ** counts[stem]
+            counts[stem] += 1
+        for stem, count in counts.items():
+            scores[stem] += weight * freqs[stem] * (0.5 * count / len(stems) + 0.5)
+    return sum(scores.get(term, 0) for term in terms)
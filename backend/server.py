@@ -1,32 +1,129 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.datastructures import Headers
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from bson import Decimal128, ObjectId
+from pymongo import ReturnDocument
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from gridfs.errors import NoFile
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional, Dict
+import io
+import csv
 import uuid
+import codecs
+import hashlib
+import secrets
 from datetime import datetime, timezone, timedelta
-import bcrypt
-import jwt
-import httpx
 import time
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+from contextlib import asynccontextmanager
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+from metrics import MetricsMiddleware, MongoMetricsListener, httpx_event_hooks, registry, track_external
+from db_monitoring import CommandMonitor, DBAccountingMiddleware, PoolMonitor
+from profiling import PROFILE_HEADER, PROFILE_MODE, PROFILE_SAMPLE_RATE, ProfilingMiddleware, profile_log, profiling_enabled, verify_token
+from rate_limit import hashing_limiter_from_env, run_limited, throttle_from_env
+from cpu_tasks import categorize_bank_transactions, hash_password, pool_workers_from_env, run_cpu, shutdown_pool, start_pool, verify_password
+from lazy_imports import lazy_import
+from rollups import get_rollup, get_rollups, invalidate_rollups, rollup_insert
+from search import prefix_pattern, search_tokens
+from duplicates import DUPLICATE_WINDOW_DAYS, find_duplicates
+from bank_csv import StatementError, StatementParser, detect_encoding
+from jobs import JOB_RETENTION_HOURS, JOB_WORKERS, JobContext, JobQueue
+from idempotency import IdempotencyMiddleware, IdempotencyStore
+from transaction_store import create_store
+from user_scope import UserScope
+from archive import ARCHIVE_AFTER_MONTHS, ARCHIVE_INTERVAL_HOURS, ArchivedStore, run_periodically
+from live_events import RESYNC, WATCHED_COLLECTIONS, ChangeStreamWatcher, EventBroker, change_event, format_sse, watcher_enabled
+
+# Loaded on first use, so cold starts skip them
+jwt = lazy_import("jwt")
+httpx = lazy_import("httpx")
+stripe_integration = lazy_import("emergentintegrations.payments.stripe.checkout")
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, opened in the lifespan rather than at import
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+# Fail a request after this long waiting for a connection instead of queueing forever
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_WARMUP_CONNECTIONS = int(os.environ.get('MONGO_WARMUP_CONNECTIONS', str(MONGO_MIN_POOL_SIZE)))
+# /api/health/ready fails once this share of the pool is checked out
+MONGO_READY_MAX_SATURATION = float(os.environ.get('MONGO_READY_MAX_SATURATION', '0.9'))
+
+pool_monitor = PoolMonitor(MONGO_MAX_POOL_SIZE)
+
+# Read-only analytics (dashboard, reports, budget history, export) may be
+# served by secondaries at most ANALYTICS_MAX_STALENESS_SECONDS behind
+# (MongoDB's minimum is 90; -1 means no bound). Everything that reads its
+# own writes keeps using `db`, which reads from the primary.
+ANALYTICS_READ_PREFERENCE = os.environ.get('ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+ANALYTICS_MAX_STALENESS_SECONDS = int(os.environ.get('ANALYTICS_MAX_STALENESS_SECONDS', '90'))
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def analytics_read_preference():
+    mode = READ_PREFERENCES.get(ANALYTICS_READ_PREFERENCE)
+    if mode is None:
+        raise RuntimeError(f"Unknown ANALYTICS_READ_PREFERENCE: {ANALYTICS_READ_PREFERENCE}")
+    if mode is Primary:
+        return Primary()
+    if 0 <= ANALYTICS_MAX_STALENESS_SECONDS < 90:
+        raise RuntimeError("ANALYTICS_MAX_STALENESS_SECONDS must be -1 or at least 90")
+    return mode(max_staleness=ANALYTICS_MAX_STALENESS_SECONDS)
+
+_analytics_db = (None, None)
+
+def analytics_db():
+    """`db` with the analytics read preference; writes through it still go to the primary"""
+    global _analytics_db
+    if _analytics_db[0] is not db:
+        _analytics_db = (db, db.client.get_database(db.name, read_preference=analytics_read_preference()))
+    return _analytics_db[1]
+
+def user_data(user_id: str, database=None) -> UserScope:
+    """The user's collections, user_id in every filter; see user_scope.py"""
+    return UserScope(database if database is not None else db, user_id)
+
+def create_mongo_client(mongo_url: str) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[MongoMetricsListener(), CommandMonitor(), pool_monitor]
+    )
+
+async def warm_mongo_pool(connections: int):
+    """Open connections before serving traffic; concurrent pings each need their own"""
+    if connections > 0:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(connections)))
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'walleta-secret-key-change-in-production')
 JWT_ALGORITHM = "HS256"
-JWT_EXPIRATION_HOURS = 24
+ACCESS_TOKEN_MINUTES = int(os.environ.get('ACCESS_TOKEN_MINUTES', '10'))
+REFRESH_TOKEN_DAYS = int(os.environ.get('REFRESH_TOKEN_DAYS', '30'))
 
 # Stripe Configuration
 STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY', 'sk_test_emergent')
@@ -37,8 +134,59 @@ NORDIGEN_SECRET_ID = os.environ.get('NORDIGEN_SECRET_ID', '')
 NORDIGEN_SECRET_KEY = os.environ.get('NORDIGEN_SECRET_KEY', '')
 NORDIGEN_API_URL = "https://bankaccountdata.gocardless.com/api/v2"
 
+# Serve large list responses straight from Mongo output with orjson
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'false').lower() == 'true'
+
+# Storage layout for expenses and incomes: "documents" or "buckets"
+TRANSACTION_STORAGE = os.environ.get('TRANSACTION_STORAGE', 'documents').lower()
+# Months older than ARCHIVE_AFTER_MONTHS are read from transaction_archive
+transactions = ArchivedStore(create_store(TRANSACTION_STORAGE, lambda: db), lambda: db)
+# The same store reading through analytics_db()
+analytics_transactions = ArchivedStore(create_store(TRANSACTION_STORAGE, analytics_db), analytics_db)
+# Bank imports, resyncs and exports run here instead of inside the request
+jobs = JobQueue(lambda: db)
+# First responses of POSTs retried with the same Idempotency-Key
+idempotency_store = IdempotencyStore(lambda: db)
+
+# Imports with more rows than this are categorized in the CPU pool
+CPU_OFFLOAD_MIN_ROWS = int(os.environ.get('CPU_OFFLOAD_MIN_ROWS', '500'))
+# Bank rows (CSV or Nordigen) are stored this many at a time
+IMPORT_BATCH_ROWS = int(os.environ.get('IMPORT_BATCH_ROWS', '5000'))
+CSV_READ_BYTES = 256 * 1024
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker process
+    global client, db
+    if client is None:
+        client = create_mongo_client(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+    analytics_db()  # fail fast on a bad read preference setting
+    await warm_mongo_pool(MONGO_WARMUP_CONNECTIONS)
+    await ensure_indexes()
+    start_pool(pool_workers_from_env())
+    jobs.start(JOB_WORKERS)
+    if watcher_enabled():
+        await change_watcher.enable_pre_images(db)
+        await change_watcher.start(db)
+    archive_task = None
+    if ARCHIVE_INTERVAL_HOURS > 0:
+        archive_task = asyncio.create_task(
+            run_periodically(lambda: db, transactions.store, ARCHIVE_INTERVAL_HOURS, ARCHIVE_AFTER_MONTHS)
+        )
+    yield
+    # Ends open event streams so shutdown doesn't wait on them
+    event_broker.broadcast(None)
+    await change_watcher.stop()
+    if archive_task is not None:
+        archive_task.cancel()
+    await jobs.stop()
+    shutdown_pool()
+    client.close()
+    client = db = None
+
 # Create the main app
-app = FastAPI(title="Walleta API", description="Personal Finance Management")
+app = FastAPI(title="Walleta API", description="Personal Finance Management", lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -77,8 +225,13 @@ class UserResponse(BaseModel):
 
 class TokenResponse(BaseModel):
     token: str
+    refresh_token: Optional[str] = None
+    expires_in: int = ACCESS_TOKEN_MINUTES * 60
     user: UserResponse
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class BudgetBase(BaseModel):
     amount: float
     month: str  # YYYY-MM format
@@ -92,6 +245,13 @@ class Budget(BudgetBase):
     user_id: str
     created_at: str
 
+class BudgetUsage(BaseModel):
+    month: str
+    amount: float
+    spent: float
+    percentage: float
+    remaining: float
+
 class ExpenseCategory(BaseModel):
     name: str
     icon: str = "receipt"
@@ -163,6 +323,9 @@ class SavingsGoal(SavingsGoalBase):
     user_id: str
     created_at: str
 
+class DuplicateResolve(BaseModel):
+    action: str  # keep_both, delete_imported or delete_existing
+
 class CheckoutRequest(BaseModel):
     origin_url: str
 
@@ -180,22 +343,129 @@ class PaymentTransaction(BaseModel):
     updated_at: str
 
 
+def model_projection(model) -> dict:
+    """Mongo projection returning exactly the fields of a response model"""
+    projection = {name: 1 for name in model.model_fields}
+    projection["_id"] = 0
+    return projection
+
+
+# ============== FAST JSON RESPONSES ==============
+
+def float_fields(model) -> List[str]:
+    """Fields response_model validation would turn into floats"""
+    return [name for name, field in model.model_fields.items() if field.annotation in (float, Optional[float])]
+
+def as_float(value) -> float:
+    return float(value.to_decimal()) if isinstance(value, Decimal128) else float(value)
+
+def coerce_floats(rows: List[dict], model) -> List[dict]:
+    """Give rows served without validation the number types the model's would have.
+    
+    Amounts written by imports or other tools may be stored as int or Decimal128.
+    """
+    fields = float_fields(model)
+    for row in rows:
+        for name in fields:
+            value = row.get(name)
+            if value is not None and type(value) is not float:
+                row[name] = as_float(value)
+    return rows
+
+def _json_default(value):
+    # Sums computed by Mongo over Decimal128 amounts stay Decimal128
+    if isinstance(value, Decimal128):
+        return as_float(value)
+    raise TypeError
+
+class TrustedJSONResponse(JSONResponse):
+    """JSON response for documents read from our own collections.
+
+    Returning a Response skips FastAPI's response_model validation, so this is
+    only used for data that is already in the model's shape; coerce_floats()
+    brings stored numbers to it.
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def trusted_response(content):
+    if FAST_JSON_RESPONSES:
+        return TrustedJSONResponse(content)
+    return content
+
+
 # ============== AUTH HELPERS ==============
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# bcrypt runs in the CPU pool (or threadpool), with a global cap on concurrent hashes
+auth_throttle = throttle_from_env(lambda: db.rate_limits)
+hashing_limiter = hashing_limiter_from_env()
+
+async def hash_password_async(password: str) -> str:
+    return await run_limited(hashing_limiter, hash_password, password)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await run_limited(hashing_limiter, verify_password, password, hashed)
 
-def create_token(user_id: str, email: str) -> str:
+def create_access_token(user: dict) -> str:
+    """Short-lived token carrying everything hot endpoints need to authorize"""
+    now = datetime.now(timezone.utc)
     payload = {
-        "user_id": user_id,
-        "email": email,
-        "exp": datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
+        "typ": "access",
+        "user_id": user["id"],
+        "email": user["email"],
+        "sub_active": user.get("subscription_active", False),
+        "sub_end": user.get("subscription_end"),
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_MINUTES)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens and stream tickets are long random values, so a fast hash is enough
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+async def create_refresh_token(user_id: str, family_id: Optional[str] = None) -> str:
+    token = secrets.token_urlsafe(48)
+    now = datetime.now(timezone.utc)
+    await db.refresh_tokens.insert_one({
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "token_hash": hash_refresh_token(token),
+        "family_id": family_id or str(uuid.uuid4()),
+        "revoked": False,
+        "replaced_by": None,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_DAYS),
+        "created_at": now.isoformat()
+    })
+    return token
+
+async def revoke_refresh_family(user_id: str, family_id: str):
+    await db.refresh_tokens.update_many(
+        {"user_id": user_id, "family_id": family_id, "revoked": False},
+        {"$set": {"revoked": True, "revoked_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
+def to_user_response(user: dict) -> UserResponse:
+    return UserResponse(
+        id=user["id"],
+        email=user["email"],
+        name=user["name"],
+        subscription_active=user.get("subscription_active", False),
+        subscription_end=user.get("subscription_end"),
+        created_at=user["created_at"]
+    )
+
+async def issue_tokens(user: dict, family_id: Optional[str] = None) -> TokenResponse:
+    return TokenResponse(
+        token=create_access_token(user),
+        refresh_token=await create_refresh_token(user["id"], family_id),
+        user=to_user_response(user)
+    )
+
 def decode_token(token: str) -> dict:
     try:
         return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -209,10 +479,22 @@ async def get_current_user(request: Request) -> dict:
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Kirjautuminen vaaditaan")
     
-    token = auth_header.split(" ")[1]
+    return await user_from_token(auth_header.split(" ")[1])
+
+async def user_from_token(token: str) -> dict:
     payload = decode_token(token)
     
-    user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+    # Access tokens carry the claims we need, so no database read
+    if payload.get("typ") == "access":
+        return {
+            "id": payload["user_id"],
+            "email": payload["email"],
+            "subscription_active": payload.get("sub_active", False),
+            "subscription_end": payload.get("sub_end")
+        }
+    
+    # Tokens issued before access/refresh tokens existed
+    user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0, "password_hash": 0})
     if not user:
         raise HTTPException(status_code=401, detail="Käyttäjää ei löydy")
     
@@ -222,7 +504,9 @@ async def get_current_user(request: Request) -> dict:
 # ============== AUTH ROUTES ==============
 
 @api_router.post("/auth/register", response_model=TokenResponse)
-async def register(user_data: UserCreate):
+async def register(request: Request, user_data: UserCreate):
+    await auth_throttle.check_register(request)
+    
     # Check if user exists
     existing = await db.users.find_one({"email": user_data.email})
     if existing:
@@ -236,7 +520,7 @@ async def register(user_data: UserCreate):
         "id": user_id,
         "email": user_data.email,
         "name": user_data.name,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await hash_password_async(user_data.password),
         "subscription_active": False,
         "subscription_end": None,
         "created_at": now
@@ -244,56 +528,84 @@ async def register(user_data: UserCreate):
     
     await db.users.insert_one(user_doc)
     
-    # Create token
-    token = create_token(user_id, user_data.email)
-    
-    user_response = UserResponse(
-        id=user_id,
-        email=user_data.email,
-        name=user_data.name,
-        subscription_active=False,
-        subscription_end=None,
-        created_at=now
-    )
-    
-    return TokenResponse(token=token, user=user_response)
+    return await issue_tokens(user_doc)
 
 @api_router.post("/auth/login", response_model=TokenResponse)
-async def login(credentials: UserLogin):
+async def login(request: Request, credentials: UserLogin):
+    # Rejected before any database or bcrypt work
+    await auth_throttle.check_login(request, credentials.email)
+    
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
     if not user:
         raise HTTPException(status_code=401, detail="Virheellinen sähköposti tai salasana")
     
-    if not verify_password(credentials.password, user["password_hash"]):
+    if not await verify_password_async(credentials.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Virheellinen sähköposti tai salasana")
     
-    token = create_token(user["id"], user["email"])
+    return await issue_tokens(user)
+
+@api_router.post("/auth/refresh", response_model=TokenResponse)
+async def refresh_tokens(data: RefreshRequest):
+    """Rotate a refresh token and issue a fresh access token"""
+    stored = await db.refresh_tokens.find_one({"token_hash": hash_refresh_token(data.refresh_token)}, {"_id": 0})
+    if not stored:
+        raise HTTPException(status_code=401, detail="Istunto vanhentunut")
     
-    user_response = UserResponse(
-        id=user["id"],
-        email=user["email"],
-        name=user["name"],
-        subscription_active=user.get("subscription_active", False),
-        subscription_end=user.get("subscription_end"),
-        created_at=user["created_at"]
+    if stored["revoked"]:
+        if stored.get("replaced_by"):
+            # A rotated token was presented again: assume it leaked and end the session
+            await revoke_refresh_family(stored["user_id"], stored["family_id"])
+            logger.warning(f"Refresh token reuse detected for user {stored['user_id']}")
+        raise HTTPException(status_code=401, detail="Istunto vanhentunut")
+    
+    expires_at = stored["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at < datetime.now(timezone.utc):
+        raise HTTPException(status_code=401, detail="Istunto vanhentunut")
+    
+    user = await db.users.find_one({"id": stored["user_id"]}, {"_id": 0, "password_hash": 0})
+    if not user:
+        raise HTTPException(status_code=401, detail="Käyttäjää ei löydy")
+    
+    # Only one request may rotate a given token
+    result = await db.refresh_tokens.update_one(
+        {"user_id": stored["user_id"], "id": stored["id"], "revoked": False},
+        {"$set": {"revoked": True, "revoked_at": datetime.now(timezone.utc).isoformat()}}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=401, detail="Istunto vanhentunut")
     
-    return TokenResponse(token=token, user=user_response)
+    tokens = await issue_tokens(user, family_id=stored["family_id"])
+    await db.refresh_tokens.update_one(
+        {"user_id": stored["user_id"], "id": stored["id"]},
+        {"$set": {"replaced_by": hash_refresh_token(tokens.refresh_token)}}
+    )
+    return tokens
+
+@api_router.post("/auth/logout")
+async def logout(data: RefreshRequest):
+    stored = await db.refresh_tokens.find_one({"token_hash": hash_refresh_token(data.refresh_token)}, {"_id": 0})
+    if stored:
+        await revoke_refresh_family(stored["user_id"], stored["family_id"])
+    return {"message": "Uloskirjautuminen onnistui"}
 
 @api_router.get("/auth/me", response_model=UserResponse)
 async def get_me(user: dict = Depends(get_current_user)):
-    return UserResponse(
-        id=user["id"],
-        email=user["email"],
-        name=user["name"],
-        subscription_active=user.get("subscription_active", False),
-        subscription_end=user.get("subscription_end"),
-        created_at=user["created_at"]
-    )
+    if "name" not in user:
+        user = await db.users.find_one({"id": user["id"]}, {"_id": 0, "password_hash": 0})
+        if not user:
+            raise HTTPException(status_code=401, detail="Käyttäjää ei löydy")
+    return to_user_response(user)
 
 
 # ============== STRIPE PAYMENT ROUTES ==============
 
+def stripe_client(request: Request):
+    """StripeCheckout posting webhooks back to this deployment"""
+    webhook_url = f"{str(request.base_url)}api/webhook/stripe"
+    return stripe_integration.StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+
 @api_router.post("/payments/checkout")
 async def create_checkout_session(request: Request, checkout_data: CheckoutRequest, user: dict = Depends(get_current_user)):
     try:
@@ -302,11 +614,10 @@ async def create_checkout_session(request: Request, checkout_data: CheckoutReque
         cancel_url = f"{checkout_data.origin_url}/payment/cancel"
         
         # Initialize Stripe
-        webhook_url = f"{str(request.base_url)}api/webhook/stripe"
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+        stripe_checkout = stripe_client(request)
         
         # Create checkout session
-        checkout_request = CheckoutSessionRequest(
+        checkout_request = stripe_integration.CheckoutSessionRequest(
             amount=SUBSCRIPTION_PRICE,
             currency="eur",
             success_url=success_url,
@@ -318,7 +629,8 @@ async def create_checkout_session(request: Request, checkout_data: CheckoutReque
             }
         )
         
-        session = await stripe_checkout.create_checkout_session(checkout_request)
+        with track_external("stripe", "create_checkout_session"):
+            session = await stripe_checkout.create_checkout_session(checkout_request)
         
         # Create payment transaction record
         now = datetime.now(timezone.utc).isoformat()
@@ -339,7 +651,7 @@ async def create_checkout_session(request: Request, checkout_data: CheckoutReque
             "updated_at": now
         }
         
-        await db.payment_transactions.insert_one(transaction_doc)
+        await user_data(user["id"]).payment_transactions.insert_one(transaction_doc)
         
         return {"url": session.url, "session_id": session.session_id}
         
@@ -351,20 +663,18 @@ async def create_checkout_session(request: Request, checkout_data: CheckoutReque
 async def get_payment_status(request: Request, session_id: str, user: dict = Depends(get_current_user)):
     try:
         # Initialize Stripe
-        webhook_url = f"{str(request.base_url)}api/webhook/stripe"
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+        stripe_checkout = stripe_client(request)
         
         # Get status
-        status = await stripe_checkout.get_checkout_status(session_id)
+        with track_external("stripe", "get_checkout_status"):
+            status = await stripe_checkout.get_checkout_status(session_id)
         
         # Update transaction
         now = datetime.now(timezone.utc).isoformat()
         
         # Check if already processed
-        transaction = await db.payment_transactions.find_one(
-            {"session_id": session_id, "user_id": user["id"]},
-            {"_id": 0}
-        )
+        payments = user_data(user["id"]).payment_transactions
+        transaction = await payments.find_one({"session_id": session_id}, {"_id": 0})
         
         if transaction and transaction.get("payment_status") == "paid":
             return {
@@ -374,7 +684,7 @@ async def get_payment_status(request: Request, session_id: str, user: dict = Dep
             }
         
         # Update transaction status
-        await db.payment_transactions.update_one(
+        await payments.update_one(
             {"session_id": session_id},
             {"$set": {
                 "status": status.status,
@@ -411,15 +721,18 @@ async def stripe_webhook(request: Request):
         body = await request.body()
         signature = request.headers.get("Stripe-Signature")
         
-        webhook_url = f"{str(request.base_url)}api/webhook/stripe"
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+        stripe_checkout = stripe_client(request)
         
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
+        with track_external("stripe", "handle_webhook"):
+            webhook_response = await stripe_checkout.handle_webhook(body, signature)
         
-        # Update transaction based on webhook
-        if webhook_response.session_id:
+        # Update transaction based on webhook; checkout puts the user id in the metadata
+        user_id = (webhook_response.metadata or {}).get("user_id")
+        if webhook_response.session_id and not user_id:
+            logger.warning(f"Webhook for session {webhook_response.session_id} has no user_id")
+        elif webhook_response.session_id:
             now = datetime.now(timezone.utc).isoformat()
-            await db.payment_transactions.update_one(
+            await user_data(user_id).payment_transactions.update_one(
                 {"session_id": webhook_response.session_id},
                 {"$set": {
                     "status": webhook_response.event_type,
@@ -430,16 +743,14 @@ async def stripe_webhook(request: Request):
             
             # Activate subscription if paid
             if webhook_response.payment_status == "paid":
-                user_id = webhook_response.metadata.get("user_id")
-                if user_id:
-                    subscription_end = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
-                    await db.users.update_one(
-                        {"id": user_id},
-                        {"$set": {
-                            "subscription_active": True,
-                            "subscription_end": subscription_end
-                        }}
-                    )
+                subscription_end = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
+                await db.users.update_one(
+                    {"id": user_id},
+                    {"$set": {
+                        "subscription_active": True,
+                        "subscription_end": subscription_end
+                    }}
+                )
         
         return {"status": "ok"}
         
@@ -448,6 +759,105 @@ async def stripe_webhook(request: Request):
         return {"status": "error", "message": str(e)}
 
 
+# ============== LIVE EVENTS ==============
+
+event_broker = EventBroker()
+# Bucketed expenses/incomes have no per-row change events; those are published in-process
+change_watcher = ChangeStreamWatcher(event_broker, [
+    name for name in WATCHED_COLLECTIONS
+    if transactions.streams_changes or name not in ("expenses", "incomes")
+])
+
+# Heartbeat comments keep proxies from closing idle streams
+LIVE_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_HEARTBEAT_SECONDS', '15'))
+# Changes arriving within this window share one summary recomputation
+LIVE_SUMMARY_DEBOUNCE_SECONDS = float(os.environ.get('LIVE_SUMMARY_DEBOUNCE_SECONDS', '0.5'))
+# How long a stream ticket may wait before it is used
+STREAM_TICKET_SECONDS = int(os.environ.get('STREAM_TICKET_SECONDS', '30'))
+
+def notify_change(user_id: str, collection: str, op: str, doc: dict):
+    """Push a write to the user's open streams, unless the change stream already does"""
+    if not change_watcher.covers(collection):
+        event_broker.publish(user_id, change_event(collection, op, doc))
+
+@api_router.post("/events/ticket")
+async def create_stream_ticket(request: Request, user: dict = Depends(get_current_user)):
+    """A single-use ticket for opening /events/stream.
+    
+    EventSource cannot send headers, and an access token in the URL would end
+    up in proxy and access logs; the ticket is worthless once used or after
+    STREAM_TICKET_SECONDS. Streams opened with it end when the access token
+    that requested it expires.
+    """
+    ticket = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    await db.stream_tickets.insert_one({
+        "ticket_hash": hash_refresh_token(ticket),
+        "user": user,
+        "token_expires_at": decode_token(request.headers["Authorization"].split(" ")[1]).get("exp"),
+        "valid_until": (now + timedelta(seconds=STREAM_TICKET_SECONDS)).isoformat(),
+        "expires_at": now + timedelta(seconds=STREAM_TICKET_SECONDS)
+    })
+    return {"ticket": ticket, "expires_in": STREAM_TICKET_SECONDS}
+
+@api_router.get("/events/stream")
+async def event_stream(request: Request, ticket: Optional[str] = None):
+    """Server-Sent Events with data deltas and fresh summary figures.
+    
+    Browsers pass a ticket from POST /events/ticket as ?ticket=; other clients
+    may send the access token as a Bearer header instead. The stream ends when
+    the access token expires; the client reconnects with a new ticket.
+    """
+    auth_header = request.headers.get("Authorization")
+    if ticket:
+        # Expired tickets linger until the TTL monitor's next pass
+        stored = await db.stream_tickets.find_one_and_delete({
+            "ticket_hash": hash_refresh_token(ticket),
+            "valid_until": {"$gt": datetime.now(timezone.utc).isoformat()}
+        })
+        if stored is None:
+            raise HTTPException(status_code=401, detail="Virheellinen tai käytetty lippu")
+        user, expires_at = stored["user"], stored["token_expires_at"]
+    elif auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+        user = await user_from_token(token)
+        expires_at = decode_token(token).get("exp")
+    else:
+        raise HTTPException(status_code=401, detail="Kirjautuminen vaaditaan")
+    
+    subscription = event_broker.subscribe(user["id"])
+    
+    async def events():
+        loop = asyncio.get_running_loop()
+        summary_due = None
+        try:
+            yield "retry: 3000\n\n"
+            while expires_at is None or time.time() < expires_at:
+                wait = LIVE_HEARTBEAT_SECONDS if summary_due is None else max(0, summary_due - loop.time())
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), wait)
+                except asyncio.TimeoutError:
+                    if summary_due is None:
+                        yield ": keepalive\n\n"
+                    else:
+                        summary_due = None
+                        yield format_sse("summary", await build_dashboard_summary(user))
+                    continue
+                if event is None:
+                    break
+                yield format_sse(event["type"], event)
+                if summary_due is None:
+                    summary_due = loop.time() + LIVE_SUMMARY_DEBOUNCE_SECONDS
+        finally:
+            event_broker.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ============== BUDGET ROUTES ==============
 
 @api_router.post("/budgets", response_model=Budget)
@@ -455,25 +865,26 @@ async def create_budget(budget_data: BudgetCreate, user: dict = Depends(get_curr
     budget_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
+    budgets = user_data(user["id"]).budgets
+    
     # Check if budget exists for month
-    existing = await db.budgets.find_one({
-        "user_id": user["id"],
-        "month": budget_data.month
-    })
+    existing = await budgets.find_one({"month": budget_data.month})
     
     if existing:
         # Update existing
-        await db.budgets.update_one(
+        await budgets.update_one(
             {"id": existing["id"]},
             {"$set": {"amount": budget_data.amount, "updated_at": now}}
         )
-        return Budget(
+        budget = Budget(
             id=existing["id"],
             user_id=user["id"],
             amount=budget_data.amount,
             month=budget_data.month,
             created_at=existing.get("created_at", now)
         )
+        notify_change(user["id"], "budgets", "update", budget.model_dump())
+        return budget
     
     budget_doc = {
         "id": budget_id,
@@ -483,32 +894,147 @@ async def create_budget(budget_data: BudgetCreate, user: dict = Depends(get_curr
         "created_at": now
     }
     
-    await db.budgets.insert_one(budget_doc)
+    await budgets.insert_one(budget_doc)
+    notify_change(user["id"], "budgets", "insert", budget_doc)
     
     return Budget(**{k: v for k, v in budget_doc.items() if k != "_id"})
 
 @api_router.get("/budgets", response_model=List[Budget])
 async def get_budgets(user: dict = Depends(get_current_user)):
-    budgets = await db.budgets.find(
-        {"user_id": user["id"]},
-        {"_id": 0}
+    budgets = await user_data(user["id"]).budgets.find(
+        {},
+        model_projection(Budget)
     ).sort("month", -1).to_list(100)
     return budgets
 
 @api_router.get("/budgets/current", response_model=Optional[Budget])
 async def get_current_budget(user: dict = Depends(get_current_user)):
     current_month = datetime.now(timezone.utc).strftime("%Y-%m")
-    budget = await db.budgets.find_one(
-        {"user_id": user["id"], "month": current_month},
-        {"_id": 0}
+    budget = await user_data(user["id"]).budgets.find_one(
+        {"month": current_month},
+        model_projection(Budget)
     )
     return budget
 
+BUDGET_HISTORY_MAX_MONTHS = 36
+
+def month_index(month: str) -> int:
+    return int(month[:4]) * 12 + int(month[5:7]) - 1
+
+def shift_month(month: str, delta: int) -> str:
+    index = month_index(month) + delta
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+def month_range(first: str, last: str) -> List[str]:
+    """Months from first to last inclusive as YYYY-MM"""
+    return [shift_month(first, n) for n in range(month_index(last) - month_index(first) + 1)]
+
+def recent_months(count: int) -> List[str]:
+    """The last count months as YYYY-MM, oldest first, ending with the current one"""
+    current = datetime.now(timezone.utc).strftime("%Y-%m")
+    return month_range(shift_month(current, 1 - count), current)
+
+def budget_usage(amount: float, spent: float) -> dict:
+    percentage = (spent / amount * 100) if amount > 0 else 0
+    return {
+        "amount": amount,
+        "spent": spent,
+        "percentage": round(percentage, 1),
+        "remaining": round(amount - spent, 2)
+    }
+
+@api_router.get("/budgets/history", response_model=List[BudgetUsage])
+async def get_budget_history(months: int = 12, user: dict = Depends(get_current_user)):
+    """Budget vs. spending per month from the monthly rollups, oldest month first"""
+    month_list = recent_months(max(1, min(months, BUDGET_HISTORY_MAX_MONTHS)))
+    budgets = {
+        budget["month"]: budget["amount"]
+        async for budget in user_data(user["id"], analytics_db()).budgets.find(
+            {"month": {"$in": month_list}},
+            {"_id": 0, "month": 1, "amount": 1}
+        )
+    }
+    # Missing rollups are rebuilt from the primary, so a lagging secondary
+    # can't persist an incomplete month
+    rollups = await get_rollups(analytics_db(), transactions, user["id"], month_list)
+    return [
+        {"month": month, **budget_usage(budgets.get(month, 0), round(rollups[month]["expenses"]["total"], 2))}
+        for month in month_list
+    ]
+
+
+# ============== MONTH SUMMARY ==============
+
+INCOME_SOURCE_LABELS = {
+    "salary": "Palkka",
+    "freelance": "Freelance-työt",
+    "investment": "Sijoitukset",
+    "other": "Muut tulot"
+}
+
+MUTATION_INCLUDES = ["summary"]
+
+def parse_includes(include: Optional[str]) -> List[str]:
+    requested = [v.strip() for v in (include or "").split(",") if v.strip()]
+    unknown = [v for v in requested if v not in MUTATION_INCLUDES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Tuntematon lisätieto: {', '.join(unknown)}")
+    return requested
+
+async def build_month_summary(user_id: str, month: str) -> dict:
+    """Month totals, category totals and budget usage from the monthly rollup"""
+    rollup = await get_rollup(db, transactions, user_id, month)
+    budget = await user_data(user_id).budgets.find_one({"month": month}, {"_id": 0, "amount": 1})
+    
+    total_expenses = round(rollup["expenses"]["total"], 2)
+    total_income = round(rollup["incomes"]["total"], 2)
+    
+    expense_categories = [
+        {"name": name, "amount": round(amount, 2), "percentage": round((amount / total_expenses * 100) if total_expenses > 0 else 0, 1)}
+        for name, amount in sorted(rollup["expenses"]["by"].items(), key=lambda x: x[1], reverse=True)
+    ]
+    
+    source_totals = {}
+    for source, amount in rollup["incomes"]["by"].items():
+        label = INCOME_SOURCE_LABELS.get(source, source)
+        source_totals[label] = source_totals.get(label, 0) + amount
+    income_sources = [
+        {"name": name, "amount": round(amount, 2)}
+        for name, amount in sorted(source_totals.items(), key=lambda x: x[1], reverse=True)
+    ]
+    
+    return {
+        "month": month,
+        "budget": budget_usage(budget["amount"] if budget else 0, total_expenses),
+        "expenses": {
+            "total": total_expenses,
+            "count": rollup["expenses"]["count"],
+            "categories": expense_categories
+        },
+        "income": {
+            "total": total_income,
+            "count": rollup["incomes"]["count"],
+            "sources": income_sources
+        },
+        "balance": round(total_income - total_expenses, 2)
+    }
+
+async def with_includes(body: dict, user_id: str, month: str, includes: List[str]):
+    """Attach the requested aggregates to a write response"""
+    if "summary" not in includes:
+        return body
+    return JSONResponse({**body, "summary": await build_month_summary(user_id, month)})
+
 
 # ============== EXPENSE ROUTES ==============
 
 @api_router.post("/expenses", response_model=Expense)
-async def create_expense(expense_data: ExpenseCreate, user: dict = Depends(get_current_user)):
+async def create_expense(
+    expense_data: ExpenseCreate,
+    include: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    includes = parse_includes(include)
     expense_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
@@ -519,38 +1045,52 @@ async def create_expense(expense_data: ExpenseCreate, user: dict = Depends(get_c
         "description": expense_data.description,
         "category": expense_data.category,
         "date": expense_data.date,
-        "created_at": now
+        "created_at": now,
+        "search_tokens": search_tokens(expense_data.description)
     }
     
-    await db.expenses.insert_one(expense_doc)
+    async with rollup_insert(db, user["id"], "expenses", [expense_doc]):
+        await transactions.insert("expenses", [expense_doc])
+    notify_change(user["id"], "expenses", "insert", expense_doc)
     
-    return Expense(**{k: v for k, v in expense_doc.items() if k != "_id"})
+    expense = Expense(**{k: v for k, v in expense_doc.items() if k != "_id"})
+    return await with_includes(expense.model_dump(), user["id"], expense.date[:7], includes)
+
+async def list_expenses(user_id: str, month: Optional[str] = None) -> List[dict]:
+    return coerce_floats(await transactions.list("expenses", user_id, month, fields=list(Expense.model_fields)), Expense)
 
 @api_router.get("/expenses", response_model=List[Expense])
 async def get_expenses(
     month: Optional[str] = None,
     user: dict = Depends(get_current_user)
 ):
-    query = {"user_id": user["id"]}
-    
-    if month:
-        query["date"] = {"$regex": f"^{month}"}
-    
-    expenses = await db.expenses.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
-    return expenses
+    return trusted_response(await list_expenses(user["id"], month))
 
 @api_router.delete("/expenses/{expense_id}")
-async def delete_expense(expense_id: str, user: dict = Depends(get_current_user)):
-    result = await db.expenses.delete_one({"id": expense_id, "user_id": user["id"]})
-    if result.deleted_count == 0:
+async def delete_expense(
+    expense_id: str,
+    include: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    includes = parse_includes(include)
+    # The deleted document's date tells which rollup to invalidate
+    deleted = await transactions.delete("expenses", user["id"], expense_id)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Kulua ei löydy")
-    return {"message": "Kulu poistettu"}
+    await invalidate_rollups(db, user["id"], [deleted])
+    notify_change(user["id"], "expenses", "delete", {"id": expense_id})
+    return await with_includes({"message": "Kulu poistettu"}, user["id"], deleted["date"][:7], includes)
 
 
 # ============== INCOME ROUTES ==============
 
 @api_router.post("/incomes", response_model=Income)
-async def create_income(income_data: IncomeCreate, user: dict = Depends(get_current_user)):
+async def create_income(
+    income_data: IncomeCreate,
+    include: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    includes = parse_includes(include)
     income_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
@@ -562,32 +1102,195 @@ async def create_income(income_data: IncomeCreate, user: dict = Depends(get_curr
         "source": income_data.source,
         "date": income_data.date,
         "recurring": income_data.recurring,
-        "created_at": now
+        "created_at": now,
+        "search_tokens": search_tokens(income_data.description)
     }
     
-    await db.incomes.insert_one(income_doc)
+    async with rollup_insert(db, user["id"], "incomes", [income_doc]):
+        await transactions.insert("incomes", [income_doc])
+    notify_change(user["id"], "incomes", "insert", income_doc)
     
-    return Income(**{k: v for k, v in income_doc.items() if k != "_id"})
+    income = Income(**{k: v for k, v in income_doc.items() if k != "_id"})
+    return await with_includes(income.model_dump(), user["id"], income.date[:7], includes)
+
+async def list_incomes(user_id: str, month: Optional[str] = None) -> List[dict]:
+    return coerce_floats(await transactions.list("incomes", user_id, month, fields=list(Income.model_fields)), Income)
 
 @api_router.get("/incomes", response_model=List[Income])
 async def get_incomes(
     month: Optional[str] = None,
     user: dict = Depends(get_current_user)
 ):
-    query = {"user_id": user["id"]}
-    
-    if month:
-        query["date"] = {"$regex": f"^{month}"}
-    
-    incomes = await db.incomes.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
-    return incomes
+    return trusted_response(await list_incomes(user["id"], month))
 
 @api_router.delete("/incomes/{income_id}")
-async def delete_income(income_id: str, user: dict = Depends(get_current_user)):
-    result = await db.incomes.delete_one({"id": income_id, "user_id": user["id"]})
-    if result.deleted_count == 0:
+async def delete_income(
+    income_id: str,
+    include: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    includes = parse_includes(include)
+    deleted = await transactions.delete("incomes", user["id"], income_id)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Tuloa ei löydy")
-    return {"message": "Tulo poistettu"}
+    await invalidate_rollups(db, user["id"], [deleted])
+    notify_change(user["id"], "incomes", "delete", {"id": income_id})
+    return await with_includes({"message": "Tulo poistettu"}, user["id"], deleted["date"][:7], includes)
+
+
+# ============== TRANSACTION SEARCH ==============
+
+SEARCH_COLLECTIONS = {"expense": ("expenses", Expense), "income": ("incomes", Income)}
+
+def search_types(type: str) -> List[str]:
+    if type == "all":
+        return list(SEARCH_COLLECTIONS)
+    if type not in SEARCH_COLLECTIONS:
+        raise HTTPException(status_code=400, detail="Tuntematon tapahtumatyyppi")
+    return [type]
+
+@api_router.get("/transactions/search")
+async def search_transactions(
+    q: str,
+    type: str = "all",
+    limit: int = 20,
+    offset: int = 0,
+    user: dict = Depends(get_current_user)
+):
+    """Full-text search over expense and income descriptions, best matches first"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Hakusana puuttuu")
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+    
+    # Each collection returns its best offset+limit; the merged page is cut from those
+    results = []
+    for kind in search_types(type):
+        name, model = SEARCH_COLLECTIONS[kind]
+        docs = await transactions.search(name, user["id"], q, list(model.model_fields), offset + limit + 1)
+        results.extend({**doc, "type": kind} for doc in coerce_floats(docs, model))
+    
+    results.sort(key=lambda doc: (doc["score"], doc.get("date", "")), reverse=True)
+    page = results[offset:offset + limit]
+    return trusted_response({
+        "results": page,
+        "offset": offset,
+        "limit": limit,
+        "has_more": len(results) > offset + limit
+    })
+
+@api_router.get("/transactions/autocomplete")
+async def autocomplete_transactions(
+    prefix: str,
+    type: str = "all",
+    limit: int = 10,
+    user: dict = Depends(get_current_user)
+):
+    """Descriptions starting with (a word starting with) prefix, most used first"""
+    if not prefix.strip():
+        return []
+    limit = max(1, min(limit, 25))
+    pattern = prefix_pattern(prefix)
+    suggestions: Dict[str, dict] = {}
+    for kind in search_types(type):
+        for group in await transactions.autocomplete(SEARCH_COLLECTIONS[kind][0], user["id"], pattern, limit):
+            current = suggestions.setdefault(group["_id"], {"description": group["_id"], "count": 0, "last_date": ""})
+            current["count"] += group["count"]
+            current["last_date"] = max(current["last_date"], group["last_date"] or "")
+    
+    ranked = sorted(suggestions.values(), key=lambda s: (s["count"], s["last_date"]), reverse=True)
+    return ranked[:limit]
+
+
+# ============== DUPLICATE REVIEW ==============
+
+DUPLICATE_ACTIONS = ["keep_both", "delete_imported", "delete_existing"]
+# Copied into each candidate so the review list needs no row lookups
+DUPLICATE_SNAPSHOT_FIELDS = ["id", "amount", "date", "description"]
+
+async def manual_rows(user_id: str, kind: str, first_date: str, last_date: str) -> List[dict]:
+    """Hand-entered rows dated first_date..last_date"""
+    fields = DUPLICATE_SNAPSHOT_FIELDS + ["imported"]
+    batches = await asyncio.gather(*(
+        transactions.list(kind, user_id, month, fields=fields, limit=None)
+        for month in month_range(first_date[:7], last_date[:7])
+    ))
+    return [
+        {field: row.get(field) for field in DUPLICATE_SNAPSHOT_FIELDS}
+        for batch in batches for row in batch
+        if not row.get("imported") and first_date <= row["date"][:10] <= last_date
+    ]
+
+async def flag_duplicates(user_id: str, kind: str, imported: List[dict]) -> int:
+    """Record likely manual twins of freshly imported rows for review"""
+    if not imported:
+        return 0
+    dates = [row["date"][:10] for row in imported]
+    window = timedelta(days=DUPLICATE_WINDOW_DAYS)
+    first_date = (datetime.strptime(min(dates), "%Y-%m-%d") - window).strftime("%Y-%m-%d")
+    last_date = (datetime.strptime(max(dates), "%Y-%m-%d") + window).strftime("%Y-%m-%d")
+    existing = await manual_rows(user_id, kind, first_date, last_date)
+    if not existing:
+        return 0
+    
+    new_rows = [{field: row.get(field) for field in DUPLICATE_SNAPSHOT_FIELDS} for row in imported]
+    if len(new_rows) + len(existing) >= CPU_OFFLOAD_MIN_ROWS:
+        matches = await run_cpu(find_duplicates, new_rows, existing)
+    else:
+        matches = find_duplicates(new_rows, existing)
+    
+    now = datetime.now(timezone.utc).isoformat()
+    if matches:
+        await user_data(user_id).duplicate_candidates.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "kind": kind,
+                "status": "pending",
+                "score": match["score"],
+                "imported": match["imported"],
+                "existing": match["existing"],
+                "created_at": now
+            }
+            for match in matches
+        ])
+    return len(matches)
+
+@api_router.get("/duplicates")
+async def get_duplicates(user: dict = Depends(get_current_user)):
+    """Pending duplicate candidates, most likely first"""
+    return await user_data(user["id"]).duplicate_candidates.find(
+        {"status": "pending"},
+        {"_id": 0, "user_id": 0}
+    ).sort([("score", -1), ("created_at", -1)]).to_list(200)
+
+@api_router.post("/duplicates/{candidate_id}/resolve")
+async def resolve_duplicate(candidate_id: str, body: DuplicateResolve, user: dict = Depends(get_current_user)):
+    if body.action not in DUPLICATE_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Tuntematon toiminto: {body.action}")
+    
+    candidate = await user_data(user["id"]).duplicate_candidates.find_one_and_update(
+        {"id": candidate_id, "status": "pending"},
+        {"$set": {
+            "status": "resolved",
+            "action": body.action,
+            "resolved_at": datetime.now(timezone.utc).isoformat()
+        }},
+        projection={"_id": 0}
+    )
+    if candidate is None:
+        raise HTTPException(status_code=404, detail="Duplikaattiehdotusta ei löydy")
+    
+    if body.action != "keep_both":
+        side = "imported" if body.action == "delete_imported" else "existing"
+        kind = candidate["kind"]
+        # Already gone if the user deleted it by hand in the meantime
+        deleted = await transactions.delete(kind, user["id"], candidate[side]["id"])
+        if deleted is not None:
+            await invalidate_rollups(db, user["id"], [deleted])
+            notify_change(user["id"], kind, "delete", deleted)
+    
+    return {"message": "Duplikaatti käsitelty", "id": candidate_id, "action": body.action}
 
 
 # ============== LOAN ROUTES ==============
@@ -611,13 +1314,14 @@ async def create_loan(loan_data: LoanCreate, user: dict = Depends(get_current_us
         "created_at": now
     }
     
-    await db.loans.insert_one(loan_doc)
+    await user_data(user["id"]).loans.insert_one(loan_doc)
+    notify_change(user["id"], "loans", "insert", loan_doc)
     
     return Loan(**{k: v for k, v in loan_doc.items() if k != "_id"})
 
 @api_router.get("/loans", response_model=List[Loan])
 async def get_loans(user: dict = Depends(get_current_user)):
-    loans = await db.loans.find({"user_id": user["id"]}, {"_id": 0}).to_list(100)
+    loans = await user_data(user["id"]).loans.find({}, model_projection(Loan)).to_list(100)
     return loans
 
 @api_router.put("/loans/{loan_id}", response_model=Loan)
@@ -627,22 +1331,26 @@ async def update_loan(loan_id: str, loan_data: LoanCreate, user: dict = Depends(
     update_data = loan_data.model_dump()
     update_data["updated_at"] = now
     
-    result = await db.loans.update_one(
-        {"id": loan_id, "user_id": user["id"]},
-        {"$set": update_data}
+    # One primary round trip that returns the updated document
+    loan = await user_data(user["id"]).loans.find_one_and_update(
+        {"id": loan_id},
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.matched_count == 0:
+    if loan is None:
         raise HTTPException(status_code=404, detail="Lainaa ei löydy")
     
-    loan = await db.loans.find_one({"id": loan_id}, {"_id": 0})
+    notify_change(user["id"], "loans", "update", loan)
     return Loan(**loan)
 
 @api_router.delete("/loans/{loan_id}")
 async def delete_loan(loan_id: str, user: dict = Depends(get_current_user)):
-    result = await db.loans.delete_one({"id": loan_id, "user_id": user["id"]})
+    result = await user_data(user["id"]).loans.delete_one({"id": loan_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Lainaa ei löydy")
+    notify_change(user["id"], "loans", "delete", {"id": loan_id})
     return {"message": "Laina poistettu"}
 
 
@@ -664,13 +1372,14 @@ async def create_savings_goal(goal_data: SavingsGoalCreate, user: dict = Depends
         "created_at": now
     }
     
-    await db.savings_goals.insert_one(goal_doc)
+    await user_data(user["id"]).savings_goals.insert_one(goal_doc)
+    notify_change(user["id"], "savings_goals", "insert", goal_doc)
     
     return SavingsGoal(**{k: v for k, v in goal_doc.items() if k != "_id"})
 
 @api_router.get("/savings", response_model=List[SavingsGoal])
 async def get_savings_goals(user: dict = Depends(get_current_user)):
-    goals = await db.savings_goals.find({"user_id": user["id"]}, {"_id": 0}).to_list(100)
+    goals = await user_data(user["id"]).savings_goals.find({}, model_projection(SavingsGoal)).to_list(100)
     return goals
 
 @api_router.put("/savings/{goal_id}", response_model=SavingsGoal)
@@ -680,22 +1389,25 @@ async def update_savings_goal(goal_id: str, goal_data: SavingsGoalCreate, user:
     update_data = goal_data.model_dump()
     update_data["updated_at"] = now
     
-    result = await db.savings_goals.update_one(
-        {"id": goal_id, "user_id": user["id"]},
-        {"$set": update_data}
+    goal = await user_data(user["id"]).savings_goals.find_one_and_update(
+        {"id": goal_id},
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.matched_count == 0:
+    if goal is None:
         raise HTTPException(status_code=404, detail="Säästötavoitetta ei löydy")
     
-    goal = await db.savings_goals.find_one({"id": goal_id}, {"_id": 0})
+    notify_change(user["id"], "savings_goals", "update", goal)
     return SavingsGoal(**goal)
 
 @api_router.delete("/savings/{goal_id}")
 async def delete_savings_goal(goal_id: str, user: dict = Depends(get_current_user)):
-    result = await db.savings_goals.delete_one({"id": goal_id, "user_id": user["id"]})
+    result = await user_data(user["id"]).savings_goals.delete_one({"id": goal_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Säästötavoitetta ei löydy")
+    notify_change(user["id"], "savings_goals", "delete", {"id": goal_id})
     return {"message": "Säästötavoite poistettu"}
 
 
@@ -703,19 +1415,23 @@ async def delete_savings_goal(goal_id: str, user: dict = Depends(get_current_use
 
 @api_router.get("/dashboard/summary")
 async def get_dashboard_summary(user: dict = Depends(get_current_user)):
+    return trusted_response(await build_dashboard_summary(user, analytics_db(), analytics_transactions))
+
+async def build_dashboard_summary(user: dict, database=None, store: ArchivedStore = transactions) -> dict:
+    """Dashboard figures. Only the plain dashboard read goes to analytics_db();
+    the live stream and bootstrap push them right after a write, so they read the primary."""
     current_month = datetime.now(timezone.utc).strftime("%Y-%m")
     
+    reader = user_data(user["id"], database)
+    
     # Get current budget
-    budget = await db.budgets.find_one(
-        {"user_id": user["id"], "month": current_month},
+    budget = await reader.budgets.find_one(
+        {"month": current_month},
         {"_id": 0}
     )
     
     # Get monthly expenses
-    expenses = await db.expenses.find(
-        {"user_id": user["id"], "date": {"$regex": f"^{current_month}"}},
-        {"_id": 0}
-    ).to_list(1000)
+    expenses = await store.list("expenses", user["id"], current_month)
     
     total_expenses = sum(e["amount"] for e in expenses)
     
@@ -731,24 +1447,15 @@ async def get_dashboard_summary(user: dict = Depends(get_current_user)):
     ]
     
     # Get monthly incomes
-    incomes = await db.incomes.find(
-        {"user_id": user["id"], "date": {"$regex": f"^{current_month}"}},
-        {"_id": 0}
-    ).to_list(1000)
+    incomes = await store.list("incomes", user["id"], current_month)
     
     total_income = sum(i["amount"] for i in incomes)
     
     # Group incomes by source
     source_totals = {}
-    source_labels = {
-        "salary": "Palkka",
-        "freelance": "Freelance-työt",
-        "investment": "Sijoitukset",
-        "other": "Muut tulot"
-    }
     for income in incomes:
         source = income.get("source", "other")
-        label = source_labels.get(source, source)
+        label = INCOME_SOURCE_LABELS.get(source, source)
         source_totals[label] = source_totals.get(label, 0) + income["amount"]
     
     income_sources = [
@@ -757,12 +1464,12 @@ async def get_dashboard_summary(user: dict = Depends(get_current_user)):
     ]
     
     # Get loans summary
-    loans = await db.loans.find({"user_id": user["id"]}, {"_id": 0}).to_list(100)
+    loans = await reader.loans.find({}, {"_id": 0}).to_list(100)
     total_loans = sum(l["remaining_amount"] for l in loans)
     total_monthly_loan_payments = sum(l["monthly_payment"] for l in loans)
     
     # Get savings summary
-    savings = await db.savings_goals.find({"user_id": user["id"]}, {"_id": 0}).to_list(100)
+    savings = await reader.savings_goals.find({}, {"_id": 0}).to_list(100)
     total_saved = sum(s["current_amount"] for s in savings)
     total_savings_target = sum(s["target_amount"] for s in savings)
     
@@ -825,6 +1532,129 @@ async def get_expense_categories():
     ]
 
 
+# ============== ANALYTICS ==============
+
+ANALYTICS_MAX_MONTHS = 120
+
+# Pivot row dimension -> the rollup breakdown it reads
+PIVOT_ROWS = {"category": "expenses", "source": "incomes"}
+PIVOT_PERIODS = {
+    "month": lambda month: month,
+    "quarter": lambda month: f"{month[:4]}-Q{(int(month[5:7]) - 1) // 3 + 1}",
+    "year": lambda month: month[:4],
+}
+
+def parse_month(value: str) -> str:
+    try:
+        datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Virheellinen kuukausi: {value}")
+    return value
+
+def parse_month_range(first: Optional[str], last: Optional[str], default_months: int) -> List[str]:
+    """Validated ?from=&to= months; defaults end at the current month"""
+    last = parse_month(last) if last else datetime.now(timezone.utc).strftime("%Y-%m")
+    first = parse_month(first) if first else shift_month(last, 1 - default_months)
+    months = month_range(first, last)
+    if not months:
+        raise HTTPException(status_code=400, detail="Alkukuukausi on loppukuukauden jälkeen")
+    if len(months) > ANALYTICS_MAX_MONTHS:
+        raise HTTPException(status_code=400, detail=f"Aikaväli on liian pitkä (enintään {ANALYTICS_MAX_MONTHS} kuukautta)")
+    return months
+
+@api_router.get("/analytics/pivot")
+async def get_analytics_pivot(
+    rows: str = "category",
+    cols: str = "month",
+    first: Optional[str] = Query(None, alias="from"),
+    last: Optional[str] = Query(None, alias="to"),
+    user: dict = Depends(get_current_user)
+):
+    """Category (and/or income source) x period matrix of sums and counts.
+
+    Built from the monthly rollups, which are kept current on every write, so
+    years of data cost one rollup query once the months have been rolled up.
+    """
+    dimensions = list(dict.fromkeys(v.strip() for v in rows.split(",") if v.strip()))
+    unknown = [v for v in dimensions if v not in PIVOT_ROWS]
+    if unknown or not dimensions:
+        raise HTTPException(status_code=400, detail=f"Tuntematon rivi: {', '.join(unknown) or rows}")
+    if cols not in PIVOT_PERIODS:
+        raise HTTPException(status_code=400, detail=f"Tuntematon jakso: {cols}")
+    
+    months = parse_month_range(first, last, 12)
+    first, last = months[0], months[-1]
+    
+    rollups = await get_rollups(analytics_db(), transactions, user["id"], months)
+    to_period = PIVOT_PERIODS[cols]
+    periods = list(dict.fromkeys(to_period(month) for month in months))
+    column = {period: i for i, period in enumerate(periods)}
+    
+    cells: Dict[tuple, dict] = {}
+    for month in months:
+        i = column[to_period(month)]
+        for dimension in dimensions:
+            breakdown = rollups[month][PIVOT_ROWS[dimension]]
+            for key, amount in breakdown["by"].items():
+                cell = cells.setdefault((dimension, key), {"sums": [0] * len(periods), "counts": [0] * len(periods)})
+                cell["sums"][i] += amount
+                cell["counts"][i] += breakdown["counts"].get(key, 0)
+    
+    matrix = [
+        {
+            "row": dimension,
+            "key": key,
+            "label": INCOME_SOURCE_LABELS.get(key, key) if dimension == "source" else key,
+            "sums": [round(amount, 2) for amount in cell["sums"]],
+            "counts": cell["counts"],
+            "total": round(sum(cell["sums"]), 2),
+            "count": sum(cell["counts"])
+        }
+        for (dimension, key), cell in cells.items()
+    ]
+    matrix.sort(key=lambda entry: (dimensions.index(entry["row"]), -entry["total"]))
+    
+    return {
+        "rows": dimensions,
+        "cols": cols,
+        "from": first,
+        "to": last,
+        "periods": periods,
+        "matrix": matrix
+    }
+
+
+# ============== PAGE BOOTSTRAP ==============
+
+BOOTSTRAP_VIEWS = ["summary", "budget", "budgets", "budget_history", "expenses", "incomes", "loans", "savings", "categories"]
+
+@api_router.get("/bootstrap")
+async def get_bootstrap(
+    views: str,
+    month: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Everything a page needs in one request, with a single auth lookup"""
+    requested = list(dict.fromkeys(v.strip() for v in views.split(",") if v.strip()))
+    unknown = [v for v in requested if v not in BOOTSTRAP_VIEWS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Tuntematon näkymä: {', '.join(unknown)}")
+    
+    loaders = {
+        "summary": lambda: build_dashboard_summary(user),
+        "budget": lambda: get_current_budget(user=user),
+        "budgets": lambda: get_budgets(user=user),
+        "budget_history": lambda: get_budget_history(user=user),
+        "expenses": lambda: list_expenses(user["id"], month),
+        "incomes": lambda: list_incomes(user["id"], month),
+        "loans": lambda: get_loans(user=user),
+        "savings": lambda: get_savings_goals(user=user),
+        "categories": get_expense_categories,
+    }
+    results = await asyncio.gather(*(loaders[view]() for view in requested))
+    return trusted_response(dict(zip(requested, results)))
+
+
 # ============== HEALTH CHECK ==============
 
 @api_router.get("/")
@@ -835,32 +1665,88 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "walleta-api"}
 
+@api_router.get("/health/ready")
+async def readiness_check():
+    """Readiness for the load balancer: Mongo answers and the pool has headroom"""
+    pool = pool_monitor.snapshot()
+    checks = {"mongo": "ok", "pool": "ok"}
+    try:
+        started = time.perf_counter()
+        await asyncio.wait_for(client.admin.command("ping"), timeout=MONGO_SERVER_SELECTION_TIMEOUT_MS / 1000)
+        pool["ping_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    except Exception as e:
+        logger.warning(f"Readiness ping failed: {e!r}")
+        checks["mongo"] = "unreachable"
+    if pool_monitor.saturation >= MONGO_READY_MAX_SATURATION:
+        checks["pool"] = "saturated"
+    
+    ready = all(value == "ok" for value in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks, "pool": pool}
+    )
+
 
 # ============== NORDIGEN BANK CONNECTION ==============
 
+def nordigen_client() -> "httpx.AsyncClient":
+    """HTTP client for Nordigen calls, instrumented for /metrics"""
+    return httpx.AsyncClient(event_hooks=httpx_event_hooks("nordigen"))
+
+
 class NordigenTokenManager:
-    """Manages Nordigen API tokens"""
+    """Manages Nordigen API tokens.
+    
+    Tokens are cached in-process and shared between workers through the
+    service_tokens collection, so N workers don't hold N token pairs.
+    """
     def __init__(self):
         self.access_token: Optional[str] = None
         self.refresh_token: Optional[str] = None
         self.token_expiry: float = 0
+        self.refresh_expiry: float = 0
+        self._lock = asyncio.Lock()
     
     async def get_access_token(self) -> str:
-        current_time = time.time()
-        
-        if self.access_token and current_time < self.token_expiry:
+        if self.access_token and time.time() < self.token_expiry:
             return self.access_token
         
-        if self.refresh_token and current_time > self.token_expiry:
-            return await self._refresh_access_token()
-        
-        return await self._generate_new_token_pair()
+        async with self._lock:
+            current_time = time.time()
+            if self.access_token and current_time < self.token_expiry:
+                return self.access_token
+            
+            shared = await db.service_tokens.find_one({"_id": "nordigen"})
+            if shared:
+                self.refresh_token = shared.get("refresh")
+                self.refresh_expiry = shared.get("refresh_expiry", 0)
+                if current_time < shared.get("access_expiry", 0):
+                    self.access_token = shared["access"]
+                    self.token_expiry = shared["access_expiry"]
+                    return self.access_token
+            
+            if self.refresh_token and current_time < self.refresh_expiry:
+                token = await self._refresh_access_token()
+            else:
+                token = await self._generate_new_token_pair()
+            
+            await db.service_tokens.update_one(
+                {"_id": "nordigen"},
+                {"$set": {
+                    "access": self.access_token,
+                    "access_expiry": self.token_expiry,
+                    "refresh": self.refresh_token,
+                    "refresh_expiry": self.refresh_expiry
+                }},
+                upsert=True
+            )
+            return token
     
     async def _generate_new_token_pair(self) -> str:
         if not NORDIGEN_SECRET_ID or not NORDIGEN_SECRET_KEY:
             raise HTTPException(status_code=500, detail="Nordigen credentials not configured")
         
-        async with httpx.AsyncClient() as client:
+        async with nordigen_client() as client:
             response = await client.post(
                 f"{NORDIGEN_API_URL}/token/new/",
                 json={
@@ -871,14 +1757,16 @@ class NordigenTokenManager:
             response.raise_for_status()
             data = response.json()
             
+            # Renew a minute early so a token never expires mid-request
             self.access_token = data["access"]
             self.refresh_token = data["refresh"]
-            self.token_expiry = time.time() + 86400  # 24 hours
+            self.token_expiry = time.time() + data.get("access_expires", 86400) - 60
+            self.refresh_expiry = time.time() + data.get("refresh_expires", 2592000) - 60
             
             return self.access_token
     
     async def _refresh_access_token(self) -> str:
-        async with httpx.AsyncClient() as client:
+        async with nordigen_client() as client:
             response = await client.post(
                 f"{NORDIGEN_API_URL}/token/refresh/",
                 json={"refresh": self.refresh_token}
@@ -887,7 +1775,7 @@ class NordigenTokenManager:
             data = response.json()
             
             self.access_token = data["access"]
-            self.token_expiry = time.time() + 86400
+            self.token_expiry = time.time() + data.get("access_expires", 86400) - 60
             
             return self.access_token
 
@@ -933,7 +1821,7 @@ async def get_finnish_banks():
     try:
         access_token = await nordigen_token_manager.get_access_token()
         
-        async with httpx.AsyncClient() as http_client:
+        async with nordigen_client() as http_client:
             response = await http_client.get(
                 f"{NORDIGEN_API_URL}/institutions/?country=FI",
                 headers={"Authorization": f"Bearer {access_token}"}
@@ -973,7 +1861,7 @@ async def create_bank_connection(
         access_token = await nordigen_token_manager.get_access_token()
         reference = f"walleta_{user['id']}_{str(uuid.uuid4())[:8]}"
         
-        async with httpx.AsyncClient() as http_client:
+        async with nordigen_client() as http_client:
             # Create end user agreement
             agreement_response = await http_client.post(
                 f"{NORDIGEN_API_URL}/agreements/enduser/",
@@ -1005,7 +1893,7 @@ async def create_bank_connection(
             
             # Store requisition in database
             now = datetime.now(timezone.utc).isoformat()
-            await db.bank_connections.insert_one({
+            await user_data(user["id"]).bank_connections.insert_one({
                 "id": requisition["id"],
                 "user_id": user["id"],
                 "institution_id": request_data.institution_id,
@@ -1030,10 +1918,7 @@ async def create_bank_connection(
 @api_router.get("/banks/connections")
 async def get_bank_connections(user: dict = Depends(get_current_user)):
     """Get user's bank connections"""
-    connections = await db.bank_connections.find(
-        {"user_id": user["id"]},
-        {"_id": 0}
-    ).to_list(100)
+    connections = await user_data(user["id"]).bank_connections.find({}, {"_id": 0}).to_list(100)
     return connections
 
 
@@ -1042,16 +1927,14 @@ async def get_connection_accounts(requisition_id: str, user: dict = Depends(get_
     """Get accounts from a bank connection"""
     try:
         # Verify connection belongs to user
-        connection = await db.bank_connections.find_one({
-            "id": requisition_id,
-            "user_id": user["id"]
-        })
+        bank_connections = user_data(user["id"]).bank_connections
+        connection = await bank_connections.find_one({"id": requisition_id})
         if not connection:
             raise HTTPException(status_code=404, detail="Yhteyttä ei löydy")
         
         access_token = await nordigen_token_manager.get_access_token()
         
-        async with httpx.AsyncClient() as http_client:
+        async with nordigen_client() as http_client:
             # Get requisition details
             req_response = await http_client.get(
                 f"{NORDIGEN_API_URL}/requisitions/{requisition_id}/",
@@ -1061,7 +1944,7 @@ async def get_connection_accounts(requisition_id: str, user: dict = Depends(get_
             req_data = req_response.json()
             
             # Update status
-            await db.bank_connections.update_one(
+            await bank_connections.update_one(
                 {"id": requisition_id},
                 {"$set": {"status": req_data.get("status", ""), "accounts": req_data.get("accounts", [])}}
             )
@@ -1102,16 +1985,24 @@ async def get_connection_accounts(requisition_id: str, user: dict = Depends(get_
         raise HTTPException(status_code=500, detail="Tilien haku epäonnistui")
 
 
+async def require_account(user_id: str, account_id: str):
+    """404 unless account_id was listed on one of the user's bank connections"""
+    connection = await user_data(user_id).bank_connections.find_one({"accounts": account_id}, {"_id": 0, "id": 1})
+    if connection is None:
+        raise HTTPException(status_code=404, detail="Tiliä ei löydy")
+
+
 @api_router.get("/banks/account/{account_id}/transactions")
 async def get_account_transactions(
     account_id: str,
     user: dict = Depends(get_current_user)
 ):
     """Get transactions from a bank account"""
+    await require_account(user["id"], account_id)
     try:
         access_token = await nordigen_token_manager.get_access_token()
         
-        async with httpx.AsyncClient() as http_client:
+        async with nordigen_client() as http_client:
             response = await http_client.get(
                 f"{NORDIGEN_API_URL}/accounts/{account_id}/transactions/",
                 headers={"Authorization": f"Bearer {access_token}"}
@@ -1140,87 +2031,384 @@ async def get_account_transactions(
         raise HTTPException(status_code=500, detail="Tapahtumien haku epäonnistui")
 
 
-@api_router.post("/banks/import-transactions/{account_id}")
+async def store_bank_transactions(user_id: str, account_id: str, booked: List[dict]) -> tuple:
+    """Insert booked bank rows not imported before; returns (imported, duplicates)"""
+    now = datetime.now(timezone.utc).isoformat()
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    
+    # One query for all already-imported ids instead of one per row
+    transaction_ids = list({trans.get("transactionId", "") for trans in booked})
+    imported_transactions = user_data(user_id).imported_transactions
+    already_imported = await imported_transactions.find(
+        {"transaction_id": {"$in": transaction_ids}},
+        {"_id": 0, "transaction_id": 1}
+    ).to_list(None)
+    seen = {doc["transaction_id"] for doc in already_imported}
+    
+    new_transactions = []
+    for trans in booked:
+        transaction_id = trans.get("transactionId", "")
+        if transaction_id in seen:
+            continue
+        seen.add(transaction_id)
+        new_transactions.append(trans)
+    
+    args = (new_transactions, user_id, account_id, today, now)
+    if len(new_transactions) >= CPU_OFFLOAD_MIN_ROWS:
+        expenses, incomes, markers = await run_cpu(categorize_bank_transactions, *args)
+    else:
+        expenses, incomes, markers = categorize_bank_transactions(*args)
+    
+    # Markers go in before their rows, so a job re-claimed after a crash skips
+    # the rows already stored instead of inserting them a second time
+    for kind, docs in (("expenses", expenses), ("incomes", incomes)):
+        if not docs:
+            continue
+        kind_markers = [marker for marker in markers if marker["kind"] == kind]
+        await imported_transactions.insert_many(kind_markers)
+        try:
+            async with rollup_insert(db, user_id, kind, docs):
+                await transactions.insert(kind, docs)
+        except BaseException:
+            # The insert failed; let the next attempt import these rows again
+            await imported_transactions.delete_many({"_id": {"$in": [marker["_id"] for marker in kind_markers]}})
+            raise
+    # The rows are already stored; a failed duplicate review must not fail the import
+    try:
+        duplicate_count = (
+            await flag_duplicates(user_id, "expenses", expenses)
+            + await flag_duplicates(user_id, "incomes", incomes)
+        )
+    except Exception:
+        logger.exception(f"Duplicate review failed for user {user_id}")
+        duplicate_count = 0
+    return len(markers), duplicate_count
+
+
+async def fetch_booked_transactions(account_id: str) -> List[dict]:
+    access_token = await nordigen_token_manager.get_access_token()
+    async with nordigen_client() as http_client:
+        response = await http_client.get(
+            f"{NORDIGEN_API_URL}/accounts/{account_id}/transactions/",
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        response.raise_for_status()
+        return response.json().get("transactions", {}).get("booked", [])
+
+
+async def import_accounts(job: JobContext, account_ids: List[str]) -> dict:
+    """Import each account's booked transactions in batches, reporting rows as progress"""
+    imported_count = duplicate_count = fetched = stored = 0
+    for account_id in account_ids:
+        try:
+            booked = await fetch_booked_transactions(account_id)
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to import transactions: {str(e)}")
+            raise RuntimeError("Tapahtumien tuonti epäonnistui")
+        fetched += len(booked)
+        for start in range(0, len(booked), IMPORT_BATCH_ROWS):
+            await job.progress(stored, fetched)
+            batch = booked[start:start + IMPORT_BATCH_ROWS]
+            imported, duplicates = await store_bank_transactions(job.user_id, account_id, batch)
+            imported_count += imported
+            duplicate_count += duplicates
+            stored += len(batch)
+        await job.progress(stored, fetched)
+    
+    if imported_count and not change_watcher.covers("expenses"):
+        # Too many rows for deltas; open tabs refetch instead
+        event_broker.publish(job.user_id, RESYNC)
+    
+    return {
+        "message": f"Tuotiin {imported_count} tapahtumaa",
+        "imported_count": imported_count,
+        "duplicate_count": duplicate_count,
+        "account_count": len(account_ids)
+    }
+
+
+@jobs.handler("bank_import")
+async def run_bank_import(job: JobContext) -> dict:
+    return await import_accounts(job, [job.params["account_id"]])
+
+
+@jobs.handler("bank_resync")
+async def run_bank_resync(job: JobContext) -> dict:
+    connections = await user_data(job.user_id).bank_connections.find({}, {"_id": 0, "accounts": 1}).to_list(100)
+    account_ids = list(dict.fromkeys(
+        account_id for connection in connections for account_id in connection.get("accounts", [])
+    ))
+    return await import_accounts(job, account_ids)
+
+
+@api_router.post("/banks/import-transactions/{account_id}", status_code=202)
 async def import_transactions(
     account_id: str,
     user: dict = Depends(get_current_user)
 ):
-    """Import transactions from bank to Walleta expenses/incomes"""
+    """Queue an import from a bank account to expenses/incomes; poll GET /jobs/{id}"""
+    await require_account(user["id"], account_id)
+    return await jobs.enqueue(user["id"], "bank_import", {"account_id": account_id})
+
+
+@api_router.post("/banks/resync", status_code=202)
+async def resync_bank_accounts(user: dict = Depends(get_current_user)):
+    """Queue a re-import of every account of the user's bank connections"""
+    return await jobs.enqueue(user["id"], "bank_resync")
+
+
+# ============== CSV IMPORT ==============
+
+IMPORT_BUCKET = "imports"
+
+def import_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=IMPORT_BUCKET)
+
+@api_router.post("/import/csv", status_code=202)
+async def import_csv(
+    file: UploadFile = File(...),
+    bank: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Queue an import of an OP, Nordea or S-Pankki CSV statement; poll GET /jobs/{id}"""
     try:
-        access_token = await nordigen_token_manager.get_access_token()
-        
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(
-                f"{NORDIGEN_API_URL}/accounts/{account_id}/transactions/",
-                headers={"Authorization": f"Bearer {access_token}"}
+        StatementParser(bank)
+    except StatementError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Stored first, so a long statement is read by a job that survives a restart
+    stream = import_bucket().open_upload_stream(file.filename or "statement.csv", metadata={"user_id": user["id"]})
+    try:
+        while block := await file.read(CSV_READ_BYTES):
+            await stream.write(block)
+        await stream.close()
+    except BaseException:
+        await stream.abort()
+        raise
+    finally:
+        await file.close()
+    
+    job = await jobs.enqueue(user["id"], "csv_import", {"file_id": str(stream._id), "bank": bank})
+    await db[f"{IMPORT_BUCKET}.files"].update_one({"_id": stream._id}, {"$set": {"metadata.job_id": job["id"]}})
+    return job
+
+async def read_statement(job: JobContext, stream, parser: StatementParser) -> dict:
+    """Parse an uploaded statement a block at a time and store its rows in batches"""
+    imported_count = duplicate_count = row_count = read = 0
+    decoder = None
+    pending: List[dict] = []
+    while True:
+        await job.progress(read, stream.length)
+        block = await stream.read(CSV_READ_BYTES)
+        read += len(block)
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(detect_encoding(block))(errors="replace")
+        if block:
+            rows = parser.feed(decoder.decode(block))
+        else:
+            rows = parser.feed(decoder.decode(b"", final=True)) + parser.close()
+        pending.extend(rows)
+        row_count += len(rows)
+        if pending and (len(pending) >= IMPORT_BATCH_ROWS or not block):
+            # Row ids come from the statement, so a re-claimed job skips the batches already stored
+            imported, duplicates = await store_bank_transactions(job.user_id, f"csv:{parser.bank}", pending)
+            imported_count += imported
+            duplicate_count += duplicates
+            pending = []
+        if not block:
+            break
+    return {
+        "message": f"Tuotiin {imported_count} tapahtumaa",
+        "bank": parser.bank,
+        "imported_count": imported_count,
+        "skipped_count": row_count - imported_count,
+        "duplicate_count": duplicate_count,
+        "invalid_count": parser.invalid_count,
+        "errors": parser.errors
+    }
+
+@jobs.handler("csv_import")
+async def run_csv_import(job: JobContext) -> dict:
+    bucket = import_bucket()
+    file_id = ObjectId(job.params["file_id"])
+    stream = await bucket.open_download_stream(file_id)
+    try:
+        result = await read_statement(job, stream, StatementParser(job.params.get("bank")))
+    except Exception:
+        # Failed or cancelled for good; an interrupted worker leaves the file for the next one
+        await bucket.delete(file_id)
+        raise
+    await bucket.delete(file_id)
+    await delete_orphaned_files(IMPORT_BUCKET)
+    
+    if result["imported_count"] and not change_watcher.covers("expenses"):
+        event_broker.publish(job.user_id, RESYNC)
+    return result
+
+
+# ============== BACKGROUND JOBS ==============
+
+EXPORT_BUCKET = "exports"
+EXPORT_HEADER = ["Tyyppi", "Päivämäärä", "Summa", "Kuvaus", "Luokka"]
+EXPORT_FIELDS = ["date", "amount", "description", "category", "source"]
+
+def export_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=EXPORT_BUCKET)
+
+# A cell starting with one of these is a formula to spreadsheet programs
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def spreadsheet_text(value: str) -> str:
+    """Free text as a literal cell; descriptions come from bank counterparties and users"""
+    return f"'{value}" if value.startswith(FORMULA_PREFIXES) else value
+
+def export_month_csv(expenses: List[dict], incomes: List[dict]) -> str:
+    """One month of rows, oldest first, in Finnish spreadsheet format"""
+    rows = [
+        (row["date"], "Meno", -row["amount"], row.get("description") or "", row.get("category") or "Muut")
+        for row in expenses
+    ] + [
+        (row["date"], "Tulo", row["amount"], row.get("description") or "", INCOME_SOURCE_LABELS.get(row.get("source"), row.get("source") or ""))
+        for row in incomes
+    ]
+    rows.sort(key=lambda row: row[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";", lineterminator="\r\n")
+    for date, kind, amount, description, label in rows:
+        writer.writerow([
+            kind, spreadsheet_text(date), f"{amount:.2f}".replace(".", ","),
+            spreadsheet_text(description), spreadsheet_text(label)
+        ])
+    return buffer.getvalue()
+
+async def delete_orphaned_files(bucket_name: str):
+    """Remove job files (exports, uploaded statements) whose job record has expired.
+    
+    A TTL index on the files collection would leave the chunks behind, hence the sweep.
+    """
+    # A file cannot outlive its job before the job's retention has passed since the upload
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=JOB_RETENTION_HOURS)
+    files = await db[f"{bucket_name}.files"].find(
+        {"uploadDate": {"$lt": cutoff}}, {"_id": 1, "metadata.job_id": 1}
+    ).to_list(None)
+    if not files:
+        return
+    job_ids = [file.get("metadata", {}).get("job_id") for file in files]
+    live = set(await jobs.collection.distinct("id", {"id": {"$in": job_ids}}))
+    bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+    for file, job_id in zip(files, job_ids):
+        if job_id not in live:
+            await bucket.delete(file["_id"])
+
+@jobs.handler("export")
+async def run_export(job: JobContext) -> dict:
+    months = month_range(job.params["from"], job.params["to"])
+    bucket = export_bucket()
+    filename = f"walleta-{months[0]}-{months[-1]}.csv"
+    stream = bucket.open_upload_stream(filename, metadata={"user_id": job.user_id, "job_id": job.id})
+    row_count = 0
+    try:
+        header = io.StringIO()
+        csv.writer(header, delimiter=";", lineterminator="\r\n").writerow(EXPORT_HEADER)
+        # BOM so spreadsheet programs pick UTF-8
+        await stream.write(("\ufeff" + header.getvalue()).encode("utf-8"))
+        for n, month in enumerate(months):
+            await job.progress(n, len(months))
+            expenses, incomes = await asyncio.gather(
+                analytics_transactions.list("expenses", job.user_id, month, fields=EXPORT_FIELDS, limit=None),
+                analytics_transactions.list("incomes", job.user_id, month, fields=EXPORT_FIELDS, limit=None)
             )
-            response.raise_for_status()
-            data = response.json()
-            
-            imported_count = 0
-            now = datetime.now(timezone.utc).isoformat()
-            
-            for trans in data.get("transactions", {}).get("booked", []):
-                amount = float(trans.get("transactionAmount", {}).get("amount", 0))
-                description = trans.get("remittanceInformationUnstructured", "") or trans.get("creditorName", "") or trans.get("debtorName", "Pankkitapahtuma")
-                date = trans.get("bookingDate", datetime.now(timezone.utc).strftime("%Y-%m-%d"))
-                transaction_id = trans.get("transactionId", "")
-                
-                # Check if already imported
-                existing = await db.imported_transactions.find_one({
-                    "user_id": user["id"],
-                    "transaction_id": transaction_id
-                })
-                if existing:
-                    continue
-                
-                if amount < 0:
-                    # Expense
-                    expense_id = str(uuid.uuid4())
-                    await db.expenses.insert_one({
-                        "id": expense_id,
-                        "user_id": user["id"],
-                        "amount": abs(amount),
-                        "description": description,
-                        "category": "Muut",
-                        "date": date,
-                        "created_at": now,
-                        "imported": True
-                    })
-                else:
-                    # Income
-                    income_id = str(uuid.uuid4())
-                    await db.incomes.insert_one({
-                        "id": income_id,
-                        "user_id": user["id"],
-                        "amount": amount,
-                        "description": description,
-                        "source": "other",
-                        "date": date,
-                        "recurring": False,
-                        "created_at": now,
-                        "imported": True
-                    })
-                
-                # Mark as imported
-                await db.imported_transactions.insert_one({
-                    "user_id": user["id"],
-                    "transaction_id": transaction_id,
-                    "account_id": account_id,
-                    "imported_at": now
-                })
-                imported_count += 1
-            
-            return {"message": f"Tuotiin {imported_count} tapahtumaa", "imported_count": imported_count}
-            
-    except httpx.HTTPError as e:
-        logger.error(f"Failed to import transactions: {str(e)}")
-        raise HTTPException(status_code=500, detail="Tapahtumien tuonti epäonnistui")
+            row_count += len(expenses) + len(incomes)
+            await stream.write(export_month_csv(expenses, incomes).encode("utf-8"))
+        await stream.close()
+    except BaseException:
+        await stream.abort()
+        raise
+    
+    await delete_orphaned_files(EXPORT_BUCKET)
+    await job.progress(len(months), len(months))
+    return {"file_id": str(stream._id), "filename": filename, "row_count": row_count}
+
+@api_router.post("/export", status_code=202)
+async def export_transactions(
+    first: Optional[str] = Query(None, alias="from"),
+    last: Optional[str] = Query(None, alias="to"),
+    user: dict = Depends(get_current_user)
+):
+    """Queue a CSV export of expenses and incomes; download it from /jobs/{id}/download"""
+    months = parse_month_range(first, last, ANALYTICS_MAX_MONTHS)
+    return await jobs.enqueue(user["id"], "export", {"from": months[0], "to": months[-1]})
+
+@api_router.get("/jobs")
+async def list_jobs(user: dict = Depends(get_current_user)):
+    return await jobs.list(user["id"])
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: dict = Depends(get_current_user)):
+    job = await jobs.get(user["id"], job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Työtä ei löydy")
+    return job
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, user: dict = Depends(get_current_user)):
+    job = await jobs.cancel(user["id"], job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Työtä ei löydy")
+    return job
+
+@api_router.get("/jobs/{job_id}/download")
+async def download_job_file(job_id: str, user: dict = Depends(get_current_user)):
+    job = await jobs.get(user["id"], job_id)
+    if not job or job["status"] != "succeeded" or "file_id" not in job.get("result", {}):
+        raise HTTPException(status_code=404, detail="Tiedostoa ei löydy")
+    try:
+        stream = await export_bucket().open_download_stream(ObjectId(job["result"]["file_id"]))
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Tiedostoa ei löydy")
+    
+    async def chunks():
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            yield chunk
+    
+    return StreamingResponse(
+        chunks(),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{stream.filename}"'}
+    )
 
 
 # Include the router in the main app
 app.include_router(api_router)
 
+IDEMPOTENT_PATHS = ("/api/expenses", "/api/incomes", "/api/loans", "/api/savings", "/api/payments/checkout")
+
+async def idempotency_user(scope) -> Optional[str]:
+    auth_header = Headers(scope=scope).get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    try:
+        return (await user_from_token(auth_header.split(" ")[1]))["id"]
+    except HTTPException:
+        return None
+
+# Starlette runs the middleware added last outermost.
+if profiling_enabled():
+    # Innermost, so the profile covers the route and not the other middleware
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/debug/profiles", include_in_schema=False)
+    async def profile_summary(request: Request):
+        """Per-route summary of the profiles this worker has written"""
+        if not verify_token(request.headers.get(PROFILE_HEADER)):
+            raise HTTPException(status_code=403, detail="Ei oikeuksia")
+        return {"mode": PROFILE_MODE, "sample_rate": PROFILE_SAMPLE_RATE, "pid": os.getpid(), "routes": profile_log.summary()}
+
+# Inside CORS, so replayed and rejected responses carry the CORS headers too
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store, resolve_user=idempotency_user, paths=IDEMPOTENT_PATHS)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1229,6 +2417,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+app.add_middleware(DBAccountingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def ensure_indexes():
+    await db.refresh_tokens.create_index("token_hash", unique=True)
+    await db.refresh_tokens.create_index([("user_id", 1), ("family_id", 1)])
+    await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+    await db.stream_tickets.create_index("ticket_hash", unique=True)
+    await db.stream_tickets.create_index("expires_at", expireAfterSeconds=0)
+    await db.monthly_rollups.create_index([("user_id", 1), ("month", 1)], unique=True)
+    await db.monthly_rollups.create_index("expires_at", expireAfterSeconds=0)
+    await db.duplicate_candidates.create_index([("user_id", 1), ("status", 1), ("score", -1)])
+    await db.duplicate_candidates.create_index([("user_id", 1), ("id", 1)])
+    await db.imported_transactions.create_index([("user_id", 1), ("transaction_id", 1)])
+    await db[f"{EXPORT_BUCKET}.files"].create_index("uploadDate")
+    await db[f"{IMPORT_BUCKET}.files"].create_index("uploadDate")
+    await transactions.ensure_indexes()
+    await jobs.ensure_indexes()
+    await idempotency_store.ensure_indexes()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Shard plan for growing past one replica set.
+
+Everything a user owns is keyed on user_id, and every query for user data
+names it (routes go through user_scope.UserScope), so user_id is the shard
+key and each request is routed to the one shard holding that user. User ids
+are random uuid4 strings, so a range over them would balance as well;
+hashing additionally pre-splits an empty collection across all shards
+instead of starting it as one chunk on one shard.
+
+- hashed {user_id} (+ date/month where a single user can outgrow a chunk):
+  every per-user collection without a unique index
+- ranged {user_id, ...}: monthly_rollups, transaction_archive and
+  idempotency_keys, whose unique per-user indexes need a non-hashed shard key prefix. uuid4 ids are
+  uniformly distributed, so a range on them balances like a hash
+- unsharded: small global collections looked up by something other than a
+  user (email at login, token hash, rate-limit key, the job queue); they
+  stay on the primary shard
+
+Zones split the hashed user_id space into equal slices pinned to groups of
+shards, e.g. to move users onto new hardware one slice at a time. Locality
+zones (per country) would need a region prefix in the key, which the data
+does not carry.
+
+    cd backend
+    python sharding.py plan --zone tier-a=shard01,shard02 --zone tier-b=shard03
+    python sharding.py apply --mongo-url mongodb://mongos:27017
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).parent
+
+# collection -> shard key, in index order
+SHARD_PLAN: Dict[str, Dict[str, object]] = {
+    "expenses": {"user_id": "hashed", "date": 1},
+    "incomes": {"user_id": "hashed", "date": 1},
+    "expense_buckets": {"user_id": "hashed", "month": 1},
+    "income_buckets": {"user_id": "hashed", "month": 1},
+    "budgets": {"user_id": "hashed"},
+    "loans": {"user_id": "hashed"},
+    "savings_goals": {"user_id": "hashed"},
+    "bank_connections": {"user_id": "hashed"},
+    "imported_transactions": {"user_id": "hashed"},
+    "duplicate_candidates": {"user_id": "hashed"},
+    "payment_transactions": {"user_id": "hashed"},
+    # Unique (user_id, month), (user_id, kind, month) and (user_id, key) indexes
+    "monthly_rollups": {"user_id": 1, "month": 1},
+    "transaction_archive": {"user_id": 1, "kind": 1, "month": 1},
+    "idempotency_keys": {"user_id": 1, "key": 1},
+}
+
+UNSHARDED = {
+    "users": "unique email, looked up by email at login",
+    "refresh_tokens": "unique token_hash, looked up by hash on refresh",
+    "stream_tickets": "unique ticket_hash, looked up by hash when a stream opens",
+    "service_tokens": "one shared Nordigen token document",
+    "rate_limits": "keyed by client, not by user",
+    "jobs": "a queue claimed across users by every worker",
+    "exports.files": "GridFS; one small file per user",
+    "exports.chunks": "GridFS chunks of the export files",
+}
+
+USER_COLLECTIONS = frozenset(SHARD_PLAN)
+
+_HASH_MIN, _HASH_SPAN = -2 ** 63, 2 ** 64
+
+
+def is_hashed(key: Dict[str, object]) -> bool:
+    return next(iter(key.values())) == "hashed"
+
+
+def zone_ranges(zones: List[str]) -> List[Tuple[str, object, object]]:
+    """(zone, min, max) slices of equal size over the hashed user_id space"""
+    from bson import Int64, MaxKey, MinKey
+
+    bounds = [MinKey()] + [Int64(_HASH_MIN + _HASH_SPAN * n // len(zones)) for n in range(1, len(zones))] + [MaxKey()]
+    return [(zone, bounds[n], bounds[n + 1]) for n, zone in enumerate(zones)]
+
+
+def _bound(key: Dict[str, object], value) -> Dict[str, object]:
+    """A zone bound for a compound key: the hashed value, then MinKey (MaxKey for the last bound)"""
+    from bson import MaxKey, MinKey
+
+    rest = MaxKey() if isinstance(value, MaxKey) else MinKey()
+    return {field: value if n == 0 else rest for n, field in enumerate(key)}
+
+
+def plan_commands(db_name: str, zones: Dict[str, List[str]]) -> List[Tuple[str, Dict]]:
+    """Admin commands setting up the plan, in order"""
+    commands = [("enableSharding", {"enableSharding": db_name})]
+    for zone, shards in zones.items():
+        commands.extend(("addShardToZone", {"addShardToZone": shard, "zone": zone}) for shard in shards)
+    for collection, key in SHARD_PLAN.items():
+        namespace = f"{db_name}.{collection}"
+        if zones and is_hashed(key):
+            for zone, low, high in zone_ranges(list(zones)):
+                commands.append(("updateZoneKeyRange", {
+                    "updateZoneKeyRange": namespace, "min": _bound(key, low), "max": _bound(key, high), "zone": zone,
+                }))
+        commands.append(("shardCollection", {"shardCollection": namespace, "key": key}))
+    return commands
+
+
+def parse_zones(values: List[str]) -> Dict[str, List[str]]:
+    zones = {}
+    for value in values:
+        name, _, shards = value.partition("=")
+        if not name or not shards:
+            raise SystemExit(f"Invalid --zone {value!r}, expected name=shard1,shard2")
+        zones[name] = [shard for shard in shards.split(",") if shard]
+    return zones
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv(ROOT_DIR / '.env')
+    parser = argparse.ArgumentParser(description="Shard the Walleta database on user_id")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME", "walleta"))
+    parser.add_argument("--zone", action="append", default=[], help="name=shard1,shard2; repeat per zone")
+    parser.add_argument("command", choices=["plan", "apply"])
+    args = parser.parse_args()
+
+    commands = plan_commands(args.db_name, parse_zones(args.zone))
+    if args.command == "plan":
+        for _, command in commands:
+            print(json.dumps(command, default=repr))
+        for collection, reason in UNSHARDED.items():
+            print(f"# {collection}: unsharded ({reason})")
+        return 0
+
+    from pymongo import MongoClient
+
+    client = MongoClient(args.mongo_url)
+    try:
+        db = client[args.db_name]
+        for collection, key in SHARD_PLAN.items():
+            # shardCollection needs the shard key index on a non-empty collection
+            db[collection].create_index(list(key.items()))
+        for name, command in commands:
+            client.admin.command(command)
+            print(f"{name}: {command[name]}")
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""
+Storage engines for expenses and incomes.
+
+DocumentStore keeps one document per transaction (the original layout).
+BucketStore groups a user's transactions into per-month bucket documents
+(expense_buckets / income_buckets) holding the rows in an `items` array plus
+pre-summed count, total and per-category/source totals. Bank-synced users
+then cost a handful of documents and index keys per month instead of
+hundreds.
+
+Routes talk to whichever store TRANSACTION_STORAGE selects; both return
+rows in the same shape, so the API contract does not change.
+"""
+
+import os
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from search import text_score, text_terms
+
+TRANSACTION_KINDS = ("expenses", "incomes")
+
+# Field holding the breakdown key for each kind, and its default
+BREAKDOWN_FIELDS = {"expenses": ("category", "Muut"), "incomes": ("source", "other")}
+
+BUCKET_COLLECTIONS = {"expenses": "expense_buckets", "incomes": "income_buckets"}
+BUCKET_MAX_ITEMS = int(os.environ.get("BUCKET_MAX_ITEMS", "1000"))
+# Rows pushed per update when filling buckets in bulk
+BUCKET_INSERT_CHUNK = max(1, BUCKET_MAX_ITEMS // 4)
+
+AUTOCOMPLETE_SCAN_LIMIT = 2000
+
+
+def encode_key(key: str) -> str:
+    """Make a category or source usable as a Mongo field name"""
+    key = key.replace(".", "․")
+    return "＄" + key[1:] if key.startswith("$") else key
+
+
+def decode_key(key: str) -> str:
+    key = key.replace("․", ".")
+    return "$" + key[1:] if key.startswith("＄") else key
+
+
+def pick_fields(doc: Dict, fields: Optional[List[str]]) -> Dict:
+    if fields is None:
+        return {key: value for key, value in doc.items() if key != "_id"}
+    return {key: doc[key] for key in fields if key in doc}
+
+
+def decode_keys(mapping: Dict) -> Dict:
+    return {decode_key(key): value for key, value in mapping.items()}
+
+
+def empty_totals(months: List[str]) -> Dict[str, Dict]:
+    """Per-month accumulators as totals_by_month returns them: total and count,
+    plus amount (`by`) and row count (`counts`) per category or source"""
+    return {month: {"total": 0, "count": 0, "by": {}, "counts": {}} for month in months}
+
+
+def add_totals(totals: Dict, total: float, count: int, by: Dict[str, float], counts: Dict[str, int]):
+    totals["total"] += total
+    totals["count"] += count
+    for key, amount in by.items():
+        totals["by"][key] = totals["by"].get(key, 0) + amount
+    for key, number in counts.items():
+        totals["counts"][key] = totals["counts"].get(key, 0) + number
+
+
+class DocumentStore:
+    """One document per transaction in the expenses and incomes collections"""
+
+    name = "documents"
+    streams_changes = True
+
+    def __init__(self, get_db: Callable):
+        self._get_db = get_db
+
+    def _collection(self, kind: str):
+        return self._get_db()[kind]
+
+    async def ensure_indexes(self):
+        for kind in TRANSACTION_KINDS:
+            collection = self._collection(kind)
+            await collection.create_index([("user_id", 1), ("date", -1)])
+            await collection.create_index([("user_id", 1), ("id", 1)])
+            # user_id first: every text query is confined to one user's entries
+            await collection.create_index(
+                [("user_id", 1), ("description", "text"), ("counterparty", "text")],
+                name="user_description_text",
+                default_language="finnish",
+                weights={"description": 2, "counterparty": 1},
+            )
+            await collection.create_index([("user_id", 1), ("search_tokens", 1)])
+
+    async def insert(self, kind: str, docs: List[Dict]):
+        if docs:
+            await self._collection(kind).insert_many(docs)
+
+    async def list(self, kind: str, user_id: str, month: Optional[str] = None,
+                   fields: Optional[List[str]] = None, limit: Optional[int] = 1000) -> List[Dict]:
+        query = {"user_id": user_id}
+        if month:
+            query["date"] = {"$regex": f"^{month}"}
+        projection = {field: 1 for field in fields} if fields is not None else {}
+        projection["_id"] = 0
+        return await self._collection(kind).find(query, projection).sort("date", -1).to_list(limit)
+
+    async def delete(self, kind: str, user_id: str, item_id: str) -> Optional[Dict]:
+        return await self._collection(kind).find_one_and_delete(
+            {"id": item_id, "user_id": user_id},
+            projection={"_id": 0},
+        )
+
+    async def totals_by_month(self, kind: str, user_id: str, months: List[str]) -> Dict[str, Dict]:
+        field, default = BREAKDOWN_FIELDS[kind]
+        groups = await self._collection(kind).aggregate([
+            # "~" sorts after every day, so this covers the whole last month
+            {"$match": {"user_id": user_id, "date": {"$gte": min(months), "$lt": max(months) + "~"}}},
+            {"$group": {
+                "_id": {"month": {"$substr": ["$date", 0, 7]}, "key": {"$ifNull": [f"${field}", default]}},
+                "amount": {"$sum": "$amount"},
+                "count": {"$sum": 1},
+            }},
+        ]).to_list(None)
+        totals = empty_totals(months)
+        for group in groups:
+            month, key = group["_id"]["month"], group["_id"]["key"] or default
+            if month in totals:
+                add_totals(totals[month], group["amount"], group["count"], {key: group["amount"]}, {key: group["count"]})
+        return totals
+
+    async def search(self, kind: str, user_id: str, q: str, fields: List[str], limit: int) -> List[Dict]:
+        projection = {field: 1 for field in fields}
+        projection.update({"_id": 0, "score": {"$meta": "textScore"}})
+        return await self._collection(kind).find(
+            {"user_id": user_id, "$text": {"$search": q}},
+            projection,
+        ).sort([("score", {"$meta": "textScore"}), ("date", -1)]).limit(limit).to_list(None)
+
+    async def months_before(self, kind: str, user_id: str, month: str) -> List[str]:
+        """The user's months older than month that still hold rows"""
+        groups = await self._collection(kind).aggregate([
+            {"$match": {"user_id": user_id, "date": {"$lt": month}}},
+            {"$group": {"_id": {"$substr": ["$date", 0, 7]}}},
+        ]).to_list(None)
+        return sorted(group["_id"] for group in groups)
+
+    async def delete_items(self, kind: str, user_id: str, month: str, item_ids: List[str]):
+        """Remove the given rows of one month, e.g. once they are archived"""
+        await self._collection(kind).delete_many({"user_id": user_id, "id": {"$in": item_ids}})
+
+    async def autocomplete(self, kind: str, user_id: str, pattern: str, limit: int) -> List[Dict]:
+        return await self._collection(kind).aggregate([
+            {"$match": {"user_id": user_id, "search_tokens": {"$regex": pattern}}},
+            # Bounds the work on huge ledgers; popular merchants still surface
+            {"$limit": AUTOCOMPLETE_SCAN_LIMIT},
+            {"$group": {"_id": "$description", "count": {"$sum": 1}, "last_date": {"$max": "$date"}}},
+            {"$sort": {"count": -1, "last_date": -1}},
+            {"$limit": limit},
+        ]).to_list(None)
+
+
+class BucketStore:
+    """Per-user, per-month buckets of at most BUCKET_MAX_ITEMS transactions.
+
+    A month that outgrows one bucket spills into another bucket for the same
+    month. Buckets carry count, total and `by` (per-category or per-source
+    totals), updated with $inc in the same write as the rows.
+
+    Bucket writes do not map onto per-row change stream events, so live
+    updates for these collections are published in-process only.
+    """
+
+    name = "buckets"
+    streams_changes = False
+
+    def __init__(self, get_db: Callable):
+        self._get_db = get_db
+
+    def _collection(self, kind: str):
+        return self._get_db()[BUCKET_COLLECTIONS[kind]]
+
+    async def ensure_indexes(self):
+        for kind in TRANSACTION_KINDS:
+            collection = self._collection(kind)
+            await collection.create_index([("user_id", 1), ("month", -1)])
+            await collection.create_index([("user_id", 1), ("items.id", 1)])
+            await collection.create_index(
+                [("user_id", 1), ("items.description", "text"), ("items.counterparty", "text")],
+                name="user_items_description_text",
+                default_language="finnish",
+                weights={"items.description": 2, "items.counterparty": 1},
+            )
+            await collection.create_index([("user_id", 1), ("items.search_tokens", 1)])
+
+    @staticmethod
+    def bucket_updates(kind: str, docs: List[Dict]):
+        """(filter, update) pairs that push docs into buckets, chunked to fit"""
+        field, default = BREAKDOWN_FIELDS[kind]
+        groups: Dict[tuple, List[Dict]] = defaultdict(list)
+        for doc in docs:
+            groups[(doc["user_id"], doc["date"][:7])].append(
+                {key: value for key, value in doc.items() if key not in ("_id", "user_id")}
+            )
+        for (user_id, month), items in groups.items():
+            for start in range(0, len(items), BUCKET_INSERT_CHUNK):
+                chunk = items[start:start + BUCKET_INSERT_CHUNK]
+                inc: Dict[str, float] = defaultdict(int)
+                inc["count"] = len(chunk)
+                for item in chunk:
+                    inc["total"] += item["amount"]
+                    key = encode_key(item.get(field) or default)
+                    inc[f"by.{key}"] += item["amount"]
+                    inc[f"counts.{key}"] += 1
+                # Upserts a new bucket for the month once the open one is full
+                yield (
+                    {"user_id": user_id, "month": month, "count": {"$lte": BUCKET_MAX_ITEMS - len(chunk)}},
+                    {"$push": {"items": {"$each": chunk}}, "$inc": dict(inc)},
+                )
+
+    async def insert(self, kind: str, docs: List[Dict]):
+        collection = self._collection(kind)
+        for query, update in self.bucket_updates(kind, docs):
+            await collection.update_one(query, update, upsert=True)
+
+    async def list(self, kind: str, user_id: str, month: Optional[str] = None,
+                   fields: Optional[List[str]] = None, limit: Optional[int] = 1000) -> List[Dict]:
+        query = {"user_id": user_id}
+        if month:
+            query["month"] = {"$regex": f"^{month}"}
+        items: List[Dict] = []
+        last_month = None
+        async for bucket in self._collection(kind).find(query, {"_id": 0, "month": 1, "items": 1}).sort("month", -1):
+            # Whole months only, so the date sort below sees every row of the last month
+            if limit is not None and len(items) >= limit and bucket["month"] != last_month:
+                break
+            items.extend(bucket["items"])
+            last_month = bucket["month"]
+        items.sort(key=lambda item: item["date"], reverse=True)
+        return [pick_fields({"user_id": user_id, **item}, fields) for item in items[:limit]]
+
+    async def delete(self, kind: str, user_id: str, item_id: str) -> Optional[Dict]:
+        field, default = BREAKDOWN_FIELDS[kind]
+        collection = self._collection(kind)
+        bucket = await collection.find_one(
+            {"user_id": user_id, "items.id": item_id},
+            {"items": {"$elemMatch": {"id": item_id}}},
+        )
+        if bucket is None:
+            return None
+        item = bucket["items"][0]
+        key = encode_key(item.get(field) or default)
+        result = await collection.update_one(
+            # Still present: a concurrent delete must not subtract twice
+            {"_id": bucket["_id"], "user_id": user_id, "items.id": item_id},
+            {
+                "$pull": {"items": {"id": item_id}},
+                "$inc": {
+                    "count": -1,
+                    "total": -item["amount"],
+                    f"by.{key}": -item["amount"],
+                    f"counts.{key}": -1,
+                },
+            },
+        )
+        if result.modified_count == 0:
+            return None
+        await collection.delete_one({"_id": bucket["_id"], "user_id": user_id, "count": {"$lte": 0}})
+        return {"user_id": user_id, **item}
+
+    async def totals_by_month(self, kind: str, user_id: str, months: List[str]) -> Dict[str, Dict]:
+        totals = empty_totals(months)
+        async for bucket in self._collection(kind).find(
+            {"user_id": user_id, "month": {"$in": months}},
+            {"_id": 0, "month": 1, "total": 1, "count": 1, "by": 1, "counts": 1},
+        ):
+            add_totals(totals[bucket["month"]], bucket.get("total", 0), bucket.get("count", 0),
+                       decode_keys(bucket.get("by", {})), decode_keys(bucket.get("counts", {})))
+        return totals
+
+    async def search(self, kind: str, user_id: str, q: str, fields: List[str], limit: int) -> List[Dict]:
+        # The text index finds the buckets; each row is then scored on its own, with the index's stemming
+        terms = text_terms(q)
+        scored = []
+        async for bucket in self._collection(kind).find(
+            {"user_id": user_id, "$text": {"$search": q}}, {"_id": 0, "items": 1}
+        ):
+            for item in bucket["items"]:
+                score = text_score(terms, item)
+                if score:
+                    scored.append((score, item))
+        scored.sort(key=lambda pair: (pair[0], pair[1]["date"]), reverse=True)
+        return [
+            {**pick_fields({"user_id": user_id, **item}, fields), "score": score}
+            for score, item in scored[:limit]
+        ]
+
+    async def months_before(self, kind: str, user_id: str, month: str) -> List[str]:
+        groups = await self._collection(kind).aggregate([
+            {"$match": {"user_id": user_id, "month": {"$lt": month}}},
+            {"$group": {"_id": "$month"}},
+        ]).to_list(None)
+        return sorted(group["_id"] for group in groups)
+
+    async def delete_items(self, kind: str, user_id: str, month: str, item_ids: List[str]):
+        item_ids = set(item_ids)
+        async for bucket in self._collection(kind).find(
+            {"user_id": user_id, "month": month},
+            {"count": 1, "items.id": 1},
+        ):
+            ids = {item["id"] for item in bucket["items"]}
+            # Drop the whole bucket unless rows were added since it was read
+            if ids <= item_ids:
+                result = await self._collection(kind).delete_one(
+                    {"_id": bucket["_id"], "user_id": user_id, "count": bucket["count"]}
+                )
+                if result.deleted_count:
+                    continue
+            for item_id in ids & item_ids:
+                await self.delete(kind, user_id, item_id)
+
+    async def autocomplete(self, kind: str, user_id: str, pattern: str, limit: int) -> List[Dict]:
+        return await self._collection(kind).aggregate([
+            {"$match": {"user_id": user_id, "items.search_tokens": {"$regex": pattern}}},
+            {"$unwind": "$items"},
+            {"$match": {"items.search_tokens": {"$regex": pattern}}},
+            {"$limit": AUTOCOMPLETE_SCAN_LIMIT},
+            {"$group": {"_id": "$items.description", "count": {"$sum": 1}, "last_date": {"$max": "$items.date"}}},
+            {"$sort": {"count": -1, "last_date": -1}},
+            {"$limit": limit},
+        ]).to_list(None)
+
+
+STORES = {"documents": DocumentStore, "buckets": BucketStore}
+
+
+def create_store(name: str, get_db: Callable):
+    if name not in STORES:
+        raise ValueError(f"Unknown TRANSACTION_STORAGE {name!r}, expected one of {', '.join(STORES)}")
+    return STORES[name](get_db)
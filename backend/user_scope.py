@@ -0,0 +1,101 @@
+"""
+Data access confined to one user.
+
+Per-user collections are sharded on user_id (sharding.SHARD_PLAN), and a
+query that does not name the user is sent to every shard. UserScope hands
+out those collections with user_id added to every filter, every inserted
+document and the front of every pipeline, so a route cannot issue such a
+query by accident:
+
+    data = UserScope(db, user["id"])
+    loan = await data.loans.find_one({"id": loan_id}, {"_id": 0})
+
+Methods return what Motor returns (cursors or awaitables), so call sites
+read the same as with a bare collection.
+"""
+
+from typing import Dict, List, Optional
+
+from sharding import USER_COLLECTIONS
+
+
+class ScopeError(ValueError):
+    """A filter or document names a different user than the scope"""
+
+
+class UserCollection:
+    def __init__(self, collection, user_id: str):
+        self.collection = collection
+        self.user_id = user_id
+
+    @property
+    def name(self) -> str:
+        return self.collection.name
+
+    def _filter(self, query: Optional[Dict]) -> Dict:
+        query = dict(query or {})
+        if query.setdefault("user_id", self.user_id) != self.user_id:
+            raise ScopeError(f"Query on {self.name} names another user")
+        return query
+
+    def _document(self, doc: Dict) -> Dict:
+        if doc.setdefault("user_id", self.user_id) != self.user_id:
+            raise ScopeError(f"Document for {self.name} belongs to another user")
+        return doc
+
+    def find(self, query: Optional[Dict] = None, *args, **kwargs):
+        return self.collection.find(self._filter(query), *args, **kwargs)
+
+    def find_one(self, query: Optional[Dict] = None, *args, **kwargs):
+        return self.collection.find_one(self._filter(query), *args, **kwargs)
+
+    def find_one_and_update(self, query: Dict, update, *args, **kwargs):
+        return self.collection.find_one_and_update(self._filter(query), update, *args, **kwargs)
+
+    def find_one_and_delete(self, query: Dict, *args, **kwargs):
+        return self.collection.find_one_and_delete(self._filter(query), *args, **kwargs)
+
+    def count_documents(self, query: Optional[Dict] = None, *args, **kwargs):
+        return self.collection.count_documents(self._filter(query), *args, **kwargs)
+
+    def update_one(self, query: Dict, update, *args, **kwargs):
+        return self.collection.update_one(self._filter(query), update, *args, **kwargs)
+
+    def update_many(self, query: Dict, update, *args, **kwargs):
+        return self.collection.update_many(self._filter(query), update, *args, **kwargs)
+
+    def replace_one(self, query: Dict, replacement: Dict, *args, **kwargs):
+        return self.collection.replace_one(self._filter(query), self._document(replacement), *args, **kwargs)
+
+    def delete_one(self, query: Dict, *args, **kwargs):
+        return self.collection.delete_one(self._filter(query), *args, **kwargs)
+
+    def delete_many(self, query: Dict, *args, **kwargs):
+        return self.collection.delete_many(self._filter(query), *args, **kwargs)
+
+    def insert_one(self, doc: Dict, *args, **kwargs):
+        return self.collection.insert_one(self._document(doc), *args, **kwargs)
+
+    def insert_many(self, docs: List[Dict], *args, **kwargs):
+        return self.collection.insert_many([self._document(doc) for doc in docs], *args, **kwargs)
+
+    def aggregate(self, pipeline: List[Dict], *args, **kwargs):
+        return self.collection.aggregate([{"$match": {"user_id": self.user_id}}, *pipeline], *args, **kwargs)
+
+
+class UserScope:
+    """The per-user collections of db, seen by one user"""
+
+    def __init__(self, db, user_id: str):
+        if not user_id:
+            raise ScopeError("UserScope needs a user_id")
+        self.db = db
+        self.user_id = user_id
+
+    def __getattr__(self, name: str) -> UserCollection:
+        if name not in USER_COLLECTIONS:
+            raise AttributeError(f"{name} is not a per-user collection")
+        return UserCollection(self.db[name], self.user_id)
+
+    def __getitem__(self, name: str) -> UserCollection:
+        return self.__getattr__(name)
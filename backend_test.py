@@ -7,6 +7,7 @@ Tests all backend endpoints for the Finnish personal finance management app
 import requests
 import sys
 import json
+import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
@@ -15,6 +16,7 @@ class WalletaAPITester:
         self.base_url = base_url
         self.token = None
         self.user_id = None
+        self.refresh_token = None
         self.tests_run = 0
         self.tests_passed = 0
         self.test_results = []
@@ -87,6 +89,11 @@ class WalletaAPITester:
         success, data = self.make_request('GET', 'health')
         self.log_result("Health check", success,
                        "" if success else f"Status: {data.get('status_code', 'unknown')}")
+        
+        # Test readiness endpoint (pings MongoDB)
+        success, data = self.make_request('GET', 'health/ready')
+        self.log_result("Readiness check", success and data.get('checks', {}).get('mongo') == 'ok',
+                       "" if success else f"Status: {data.get('status_code', 'unknown')}")
 
     def test_user_registration(self):
         """Test user registration"""
@@ -122,8 +129,32 @@ class WalletaAPITester:
             self.log_result("User login", False, f"Login failed: {data}")
             return False
         
+        self.refresh_token = data.get('refresh_token')
         return True
 
+    def test_token_refresh(self):
+        """Test refresh token rotation"""
+        print("\n🔍 Testing Token Refresh...")
+        
+        if not self.refresh_token:
+            self.log_result("Token refresh", False, "No refresh token from login")
+            return
+        
+        old_refresh = self.refresh_token
+        success, data = self.make_request('POST', 'auth/refresh', {"refresh_token": old_refresh})
+        if success and 'token' in data and data.get('refresh_token') != old_refresh:
+            self.token = data['token']
+            self.refresh_token = data['refresh_token']
+            self.log_result("Token refresh", True)
+        else:
+            self.log_result("Token refresh", False, f"Refresh failed: {data}")
+            return
+        
+        # A rotated refresh token must not work twice
+        success, data = self.make_request('POST', 'auth/refresh', {"refresh_token": old_refresh}, expected_status=401)
+        self.log_result("Rotated refresh token rejected", success,
+                       "" if success else f"Unexpected response: {data}")
+
     def test_get_current_user(self):
         """Test get current user info"""
         print("\n🔍 Testing Get Current User...")
@@ -171,10 +202,19 @@ class WalletaAPITester:
         else:
             self.log_result("Get expenses", False, f"No expenses found: {expenses}")
         
-        # Delete expense
-        success, result = self.make_request('DELETE', f'expenses/{expense_id}')
+        # Delete expense, asking for the updated month totals
+        success, result = self.make_request('DELETE', f'expenses/{expense_id}?include=summary')
         self.log_result("Delete expense", success, 
                        "" if success else f"Delete failed: {result}")
+        if success:
+            summary = result.get('summary', {})
+            self.log_result("Delete expense with summary", summary.get('month') == current_month and 'budget' in summary,
+                           f"Month total: {summary.get('expenses', {}).get('total')}")
+
+        # Duplicate review queue
+        success, candidates = self.make_request('GET', 'duplicates')
+        self.log_result("Get duplicate candidates", success and isinstance(candidates, list),
+                       f"Pending: {len(candidates) if isinstance(candidates, list) else candidates}")
 
     def test_income_operations(self):
         """Test income CRUD operations"""
@@ -240,6 +280,14 @@ class WalletaAPITester:
         else:
             self.log_result("Get all budgets", False, f"Failed: {budgets}")
 
+        # Budget vs. spending for the last months, current month last
+        success, history = self.make_request('GET', 'budgets/history?months=6')
+        if (success and isinstance(history, list) and len(history) == 6
+                and history[-1]['month'] == budget_data['month'] and history[-1]['amount'] == budget_data['amount']):
+            self.log_result("Get budget history", True, f"Spent this month: {history[-1]['spent']}")
+        else:
+            self.log_result("Get budget history", False, f"Failed: {history}")
+
     def test_loan_operations(self):
         """Test loan CRUD operations"""
         print("\n🔍 Testing Loan Operations...")
@@ -346,6 +394,131 @@ class WalletaAPITester:
         else:
             self.log_result("Dashboard summary", False, f"Invalid response: {summary}")
 
+        success, pivot = self.make_request('GET', 'analytics/pivot?rows=category,source&cols=quarter')
+        if success and isinstance(pivot, dict) and all(len(row['sums']) == len(pivot['periods']) for row in pivot['matrix']):
+            self.log_result("Analytics pivot", True, f"{len(pivot['matrix'])} rows x {len(pivot['periods'])} periods")
+        else:
+            self.log_result("Analytics pivot", False, f"Invalid response: {pivot}")
+
+    def test_bootstrap(self):
+        """Test combined page bootstrap endpoint"""
+        print("\n🔍 Testing Page Bootstrap...")
+        
+        month = datetime.now().strftime('%Y-%m')
+        success, data = self.make_request('GET', f'bootstrap?views=budget,expenses,categories&month={month}')
+        
+        if success and isinstance(data, dict) and set(data) == {'budget', 'expenses', 'categories'}:
+            self.log_result("Bootstrap views", True, f"{len(data['expenses'])} expenses, {len(data['categories'])} categories")
+        else:
+            self.log_result("Bootstrap views", False, f"Invalid response: {data}")
+        
+        success, data = self.make_request('GET', 'bootstrap?views=unknown', expected_status=400)
+        self.log_result("Bootstrap rejects unknown view", success,
+                       "" if success else f"Unexpected response: {data}")
+
+    def test_transaction_search(self):
+        """Test transaction search and autocomplete"""
+        print("\n🔍 Testing Transaction Search...")
+        
+        expense_data = {
+            "amount": 9.90,
+            "description": "Hakutesti Kahvila",
+            "category": "Ruoka",
+            "date": datetime.now().strftime("%Y-%m-%d")
+        }
+        success, expense = self.make_request('POST', 'expenses', expense_data)
+        if not success:
+            self.log_result("Create searchable expense", False, f"Failed to create: {expense}")
+            return
+        
+        success, data = self.make_request('GET', 'transactions/search?q=hakutesti')
+        found = success and any(r.get('id') == expense['id'] for r in data.get('results', []))
+        self.log_result("Full-text search", found, "" if found else f"Not found: {data}")
+        
+        success, data = self.make_request('GET', 'transactions/autocomplete?prefix=hakut')
+        found = success and any(s.get('description') == expense_data['description'] for s in data)
+        self.log_result("Autocomplete", found, "" if found else f"Not suggested: {data}")
+        
+        self.make_request('DELETE', f"expenses/{expense['id']}")
+
+    def test_idempotency_keys(self):
+        """Test that a retried create with the same Idempotency-Key is replayed"""
+        print("\n🔍 Testing Idempotency Keys...")
+        
+        headers = {'Authorization': f'Bearer {self.token}', 'Idempotency-Key': f"test-{datetime.now().timestamp()}"}
+        expense_data = {
+            "amount": 3.30,
+            "description": "Idempotenssitesti",
+            "category": "Ruoka",
+            "date": datetime.now().strftime("%Y-%m-%d")
+        }
+        url = f"{self.base_url}/api/expenses"
+        first = requests.post(url, json=expense_data, headers=headers, timeout=10)
+        retry = requests.post(url, json=expense_data, headers=headers, timeout=10)
+        replayed = (first.status_code == 200 and retry.status_code == 200
+                    and retry.headers.get('Idempotent-Replayed') == 'true'
+                    and retry.json().get('id') == first.json().get('id'))
+        self.log_result("Replay retried create", replayed, f"Status: {first.status_code}/{retry.status_code}")
+        
+        changed = requests.post(url, json={**expense_data, "amount": 4.40}, headers=headers, timeout=10)
+        self.log_result("Reject reused key with other body", changed.status_code == 422, f"Status: {changed.status_code}")
+        
+        if first.status_code == 200:
+            self.make_request('DELETE', f"expenses/{first.json()['id']}")
+
+    def test_csv_import(self):
+        """Test CSV bank statement import"""
+        print("\n🔍 Testing CSV Import...")
+        
+        today = datetime.now().strftime("%d.%m.%Y")
+        statement = (
+            "Kirjauspäivä;Maksupäivä;Summa;Tapahtumalaji;Maksaja;Saajan nimi;Saajan tilinumero;"
+            "Saajan BIC-tunnus;Viitenumero;Viesti;Arkistointitunnus\n"
+            f"{today};{today};-3,20;KORTTIOSTO;Testi;CSV-testi Kioski;;;;;CSVTEST-{datetime.now().strftime('%Y%m%d%H%M%S%f')}\n"
+        ).encode('utf-8')
+        url = f"{self.base_url}/api/import/csv"
+        headers = {'Authorization': f'Bearer {self.token}'}
+        
+        results = []
+        for _ in range(2):
+            try:
+                response = requests.post(url, headers=headers, files={'file': ('tiliote.csv', statement, 'text/csv')}, timeout=30)
+                results.append(response.json() if response.status_code == 200 else {"status_code": response.status_code})
+            except requests.exceptions.RequestException as e:
+                results.append({"error": str(e)})
+        
+        first, second = results
+        self.log_result("Import S-Pankki CSV", first.get('bank') == 's-pankki' and first.get('imported_count') == 1,
+                       f"Result: {first}")
+        self.log_result("Re-import skips rows", second.get('imported_count') == 0 and second.get('skipped_count') == 1,
+                       f"Result: {second}")
+
+    def test_background_jobs(self):
+        """Test export job with status polling"""
+        print("\n🔍 Testing Background Jobs...")
+        
+        success, _ = self.make_request('POST', 'banks/import-transactions/not-my-account', expected_status=404)
+        self.log_result("Reject import from unknown account", success)
+        
+        success, job = self.make_request('POST', 'export', expected_status=202)
+        self.log_result("Queue export job", success and job.get('status') == 'queued', f"Job: {job}")
+        if not success:
+            return
+        
+        for _ in range(30):
+            success, job = self.make_request('GET', f"jobs/{job['id']}")
+            if not success or job.get('status') not in ('queued', 'running'):
+                break
+            time.sleep(1)
+        self.log_result("Export job finished", success and job.get('status') == 'succeeded',
+                       f"Status: {job.get('status')}, rows: {job.get('result', {}).get('row_count')}")
+        
+        if job.get('status') == 'succeeded':
+            response = requests.get(f"{self.base_url}/api/jobs/{job['id']}/download",
+                                    headers={'Authorization': f'Bearer {self.token}'}, timeout=30)
+            self.log_result("Download export", response.status_code == 200 and response.text.lstrip('\ufeff').startswith('Tyyppi;'),
+                           f"Status: {response.status_code}")
+
     def test_stripe_payment_flow(self):
         """Test Stripe payment integration"""
         print("\n🔍 Testing Stripe Payment Flow...")
@@ -389,6 +562,7 @@ class WalletaAPITester:
             return False
         
         self.test_get_current_user()
+        self.test_token_refresh()
         
         # Core functionality tests
         self.test_expense_operations()
@@ -397,6 +571,11 @@ class WalletaAPITester:
         self.test_loan_operations()
         self.test_savings_operations()
         self.test_dashboard_summary()
+        self.test_bootstrap()
+        self.test_transaction_search()
+        self.test_idempotency_keys()
+        self.test_csv_import()
+        self.test_background_jobs()
         
         # Payment integration
         self.test_stripe_payment_flow()
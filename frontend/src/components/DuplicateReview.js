@@ -0,0 +1,69 @@
+import { useState, useEffect } from "react";
+import { api, formatCurrency, formatDate } from "../lib/api";
+import { Button } from "./ui/button";
+import { toast } from "sonner";
+import { Copy } from "lucide-react";
+
+// Imported bank rows that look like something the user already entered by hand.
+// onDeleted(id) lets the page drop the row a resolution removed from its own list.
+const DuplicateReview = ({ kind = "expenses", onDeleted }) => {
+  const [candidates, setCandidates] = useState([]);
+
+  useEffect(() => {
+    api.get("/duplicates")
+      .then((response) => setCandidates(response.data.filter((candidate) => candidate.kind === kind)))
+      .catch((error) => console.error("Error fetching duplicates:", error));
+  }, [kind]);
+
+  const resolve = async (candidate, action) => {
+    try {
+      await api.post(`/duplicates/${candidate.id}/resolve`, { action });
+      setCandidates((current) => current.filter((other) => other.id !== candidate.id));
+      if (action === "delete_imported") onDeleted?.(candidate.imported.id);
+      if (action === "delete_existing") onDeleted?.(candidate.existing.id);
+    } catch (error) {
+      toast.error("Käsittely epäonnistui");
+    }
+  };
+
+  if (candidates.length === 0) return null;
+
+  return (
+    <div className="bg-amber-50 rounded-2xl p-6 border border-amber-100" data-testid="duplicate-review">
+      <div className="flex items-center gap-3 mb-4">
+        <Copy className="w-5 h-5 text-amber-600" />
+        <h2 className="text-lg font-semibold text-slate-900" style={{ fontFamily: 'Manrope, sans-serif' }}>
+          Mahdolliset kaksoiskirjaukset ({candidates.length})
+        </h2>
+      </div>
+      <div className="space-y-3">
+        {candidates.map((candidate) => (
+          <div key={candidate.id} className="bg-white rounded-xl p-4 flex flex-col sm:flex-row sm:items-center justify-between gap-3">
+            <div className="text-sm">
+              <p className="font-medium text-slate-900">
+                {formatCurrency(candidate.imported.amount)} · {candidate.imported.description}
+                <span className="text-slate-500"> (pankki, {formatDate(candidate.imported.date)})</span>
+              </p>
+              <p className="text-slate-500">
+                Sama kuin: {candidate.existing.description} ({formatDate(candidate.existing.date)})
+              </p>
+            </div>
+            <div className="flex gap-2 shrink-0">
+              <Button variant="outline" className="rounded-full" onClick={() => resolve(candidate, "keep_both")}>
+                Pidä molemmat
+              </Button>
+              <Button variant="outline" className="rounded-full" onClick={() => resolve(candidate, "delete_existing")}>
+                Poista oma
+              </Button>
+              <Button className="bg-slate-900 text-white hover:bg-slate-800 rounded-full" onClick={() => resolve(candidate, "delete_imported")}>
+                Poista tuotu
+              </Button>
+            </div>
+          </div>
+        ))}
+      </div>
+    </div>
+  );
+};
+
+export default DuplicateReview;
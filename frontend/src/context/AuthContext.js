@@ -1,5 +1,5 @@
 import { createContext, useContext, useState, useEffect } from "react";
-import { api } from "../lib/api";
+import { api, storeTokens, clearTokens } from "../lib/api";
 
 const AuthContext = createContext(null);
 
@@ -31,7 +31,7 @@ export const AuthProvider = ({ children }) => {
       setUser(response.data);
     } catch (error) {
       console.error("Auth check failed:", error);
-      localStorage.removeItem("walleta_token");
+      clearTokens();
     } finally {
       setLoading(false);
     }
@@ -39,22 +39,26 @@ export const AuthProvider = ({ children }) => {
 
   const login = async (email, password) => {
     const response = await api.post("/auth/login", { email, password });
-    const { token, user: userData } = response.data;
-    localStorage.setItem("walleta_token", token);
+    const { user: userData } = response.data;
+    storeTokens(response.data);
     setUser(userData);
     return userData;
   };
 
   const register = async (name, email, password) => {
     const response = await api.post("/auth/register", { name, email, password });
-    const { token, user: userData } = response.data;
-    localStorage.setItem("walleta_token", token);
+    const { user: userData } = response.data;
+    storeTokens(response.data);
     setUser(userData);
     return userData;
   };
 
   const logout = () => {
-    localStorage.removeItem("walleta_token");
+    const refreshToken = localStorage.getItem("walleta_refresh_token");
+    if (refreshToken) {
+      api.post("/auth/logout", { refresh_token: refreshToken }).catch(() => {});
+    }
+    clearTokens();
     setUser(null);
   };
 
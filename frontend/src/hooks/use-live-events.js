@@ -0,0 +1,84 @@
+import { useEffect, useRef, useState } from "react";
+import { api } from "../lib/api";
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+// Apply a change event ({ op, doc } or { op: "delete", id }) to a list of items
+export const applyChange = (items, { op, doc, id }, sortKey = null) => {
+  if (op === "delete") {
+    return items.filter((item) => item.id !== id);
+  }
+  const next = items.some((item) => item.id === doc.id)
+    ? items.map((item) => (item.id === doc.id ? doc : item))
+    : [...items, doc];
+  if (sortKey) {
+    next.sort((a, b) => (a[sortKey] < b[sortKey] ? 1 : a[sortKey] > b[sortKey] ? -1 : 0));
+  }
+  return next;
+};
+
+// Subscribe to /events/stream. Handlers: onChange(event), onSummary(summary),
+// onResync() when events may have been missed. Returns whether the stream is
+// open; while it isn't, pages should refetch after their own writes.
+export const useLiveEvents = (handlers) => {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+  const [connected, setConnected] = useState(false);
+
+  useEffect(() => {
+    if (typeof EventSource === "undefined") return undefined;
+    let source = null;
+    let retryTimer = null;
+    let attempt = 0;
+    let opened = false;
+    let closed = false;
+
+    const retry = () => {
+      attempt += 1;
+      retryTimer = setTimeout(connect, Math.min(30000, 1000 * 2 ** attempt));
+    };
+
+    const connect = async () => {
+      if (!localStorage.getItem("walleta_token") || closed) return;
+      let ticket;
+      try {
+        // Goes through the refresh interceptor, so an expired access token is renewed first
+        ({ data: { ticket } } = await api.post("/events/ticket"));
+      } catch (error) {
+        // Logged out (the interceptor already redirected) or the server is unreachable
+        if (error.response?.status !== 401) retry();
+        return;
+      }
+      if (closed) return;
+      source = new EventSource(`${BACKEND_URL}/api/events/stream?ticket=${encodeURIComponent(ticket)}`);
+
+      source.onopen = () => {
+        // Anything written while we were disconnected was missed
+        if (opened) handlersRef.current.onResync?.();
+        opened = true;
+        attempt = 0;
+        setConnected(true);
+      };
+      source.addEventListener("change", (e) => handlersRef.current.onChange?.(JSON.parse(e.data)));
+      source.addEventListener("summary", (e) => handlersRef.current.onSummary?.(JSON.parse(e.data)));
+      source.addEventListener("resync", () => handlersRef.current.onResync?.());
+
+      source.onerror = () => {
+        setConnected(false);
+        // Tickets are single-use, so the browser's own reconnect would be refused;
+        // reconnect with a new ticket instead
+        source.close();
+        retry();
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      source?.close();
+    };
+  }, []);
+
+  return connected;
+};
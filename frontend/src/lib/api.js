@@ -15,15 +15,62 @@ api.interceptors.request.use((config) => {
   if (token) {
     config.headers.Authorization = `Bearer ${token}`;
   }
+  // A retry of the same config reuses the key, so the server answers it from the first response
+  if (config.method === "post" && !config.headers["Idempotency-Key"] && window.crypto?.randomUUID) {
+    config.headers["Idempotency-Key"] = window.crypto.randomUUID();
+  }
   return config;
 });
 
+// Store tokens from login, register and refresh responses
+export const storeTokens = ({ token, refresh_token }) => {
+  localStorage.setItem("walleta_token", token);
+  if (refresh_token) {
+    localStorage.setItem("walleta_refresh_token", refresh_token);
+  }
+};
+
+export const clearTokens = () => {
+  localStorage.removeItem("walleta_token");
+  localStorage.removeItem("walleta_refresh_token");
+};
+
+// Concurrent 401s share a single refresh call
+let refreshPromise = null;
+
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem("walleta_refresh_token");
+    refreshPromise = axios
+      .post(`${BACKEND_URL}/api/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        storeTokens(response.data);
+        return response.data.token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 // Handle auth errors
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const original = error.config;
+    if (error.response?.status === 401 && original && !original._retried && localStorage.getItem("walleta_refresh_token")) {
+      original._retried = true;
+      try {
+        const token = await refreshAccessToken();
+        original.headers.Authorization = `Bearer ${token}`;
+        return api(original);
+      } catch (refreshError) {
+        // Fall through to the logout below
+      }
+    }
     if (error.response?.status === 401) {
-      localStorage.removeItem("walleta_token");
+      clearTokens();
       if (window.location.pathname !== "/login" && window.location.pathname !== "/") {
         window.location.href = "/login";
       }
@@ -73,3 +120,13 @@ export const getCurrentMonth = () => {
 export const getToday = () => {
   return new Date().toISOString().slice(0, 10);
 };
+
+// Long operations answer 202 with a job; poll it until it has finished
+export const waitForJob = async (jobId, onProgress, interval = 1000) => {
+  for (;;) {
+    const { data: job } = await api.get(`/jobs/${jobId}`);
+    onProgress?.(job);
+    if (job.status !== "queued" && job.status !== "running") return job;
+    await new Promise((resolve) => setTimeout(resolve, interval));
+  }
+};
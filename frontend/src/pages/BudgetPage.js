@@ -1,5 +1,6 @@
 import { useState, useEffect } from "react";
 import { api, formatCurrency, getCurrentMonth } from "../lib/api";
+import { applyChange, useLiveEvents } from "../hooks/use-live-events";
 import { Button } from "../components/ui/button";
 import { Input } from "../components/ui/input";
 import { Label } from "../components/ui/label";
@@ -17,6 +18,7 @@ import { TrendingUp, Edit2, Save } from "lucide-react";
 const BudgetPage = () => {
   const [budget, setBudget] = useState(null);
   const [expenses, setExpenses] = useState([]);
+  const [history, setHistory] = useState([]);
   const [loading, setLoading] = useState(true);
   const [dialogOpen, setDialogOpen] = useState(false);
   const [amount, setAmount] = useState("");
@@ -25,16 +27,27 @@ const BudgetPage = () => {
     fetchData();
   }, []);
 
+  const live = useLiveEvents({
+    onChange: (event) => {
+      if (event.collection === "budgets" && event.doc?.month === getCurrentMonth()) {
+        setBudget(event.doc);
+        setAmount(event.doc.amount.toString());
+      } else if (event.collection === "expenses" && (!event.doc || event.doc.date.startsWith(getCurrentMonth()))) {
+        setExpenses((current) => applyChange(current, event, "date"));
+      }
+    },
+    onResync: () => fetchData(),
+  });
+
   const fetchData = async () => {
     try {
-      const [budgetRes, expensesRes] = await Promise.all([
-        api.get("/budgets/current"),
-        api.get(`/expenses?month=${getCurrentMonth()}`)
-      ]);
-      setBudget(budgetRes.data);
-      setExpenses(expensesRes.data || []);
-      if (budgetRes.data) {
-        setAmount(budgetRes.data.amount.toString());
+      const response = await api.get(`/bootstrap?views=budget,expenses,budget_history&month=${getCurrentMonth()}`);
+      const { budget: budgetData, expenses: expensesData, budget_history: historyData } = response.data;
+      setBudget(budgetData);
+      setExpenses(expensesData || []);
+      setHistory(historyData || []);
+      if (budgetData) {
+        setAmount(budgetData.amount.toString());
       }
     } catch (error) {
       console.error("Error fetching data:", error);
@@ -56,7 +69,7 @@ const BudgetPage = () => {
       });
       toast.success("Budjetti tallennettu!");
       setDialogOpen(false);
-      fetchData();
+      if (!live) fetchData();
     } catch (error) {
       toast.error("Budjetin tallennus epäonnistui");
     }
@@ -81,6 +94,11 @@ const BudgetPage = () => {
     }))
     .sort((a, b) => b.total - a.total);
 
+  // Earlier months, newest first; the current month is shown above
+  const pastMonths = history
+    .filter((month) => month.month !== getCurrentMonth() && (month.amount > 0 || month.spent > 0))
+    .reverse();
+
   if (loading) {
     return (
       <div className="flex items-center justify-center h-64">
@@ -209,6 +227,33 @@ const BudgetPage = () => {
         </div>
       )}
 
+      {/* Budget History */}
+      {pastMonths.length > 0 && (
+        <div className="bg-white rounded-2xl p-6 border border-slate-100" data-testid="budget-history">
+          <h2 className="text-lg font-semibold text-slate-900 mb-4" style={{ fontFamily: 'Manrope, sans-serif' }}>
+            Aiemmat kuukaudet
+          </h2>
+          <div className="space-y-4">
+            {pastMonths.map((month) => (
+              <div key={month.month} className="space-y-2">
+                <div className="flex items-center justify-between">
+                  <span className="font-medium text-slate-900">{month.month}</span>
+                  <div className="text-right">
+                    <span className="font-semibold text-slate-900 tabular-nums">{formatCurrency(month.spent)}</span>
+                    {month.amount > 0 && (
+                      <span className={`text-sm ml-2 ${month.remaining >= 0 ? 'text-emerald-600' : 'text-red-500'}`}>
+                        / {formatCurrency(month.amount)} ({month.percentage.toFixed(1)}%)
+                      </span>
+                    )}
+                  </div>
+                </div>
+                {month.amount > 0 && <Progress value={Math.min(month.percentage, 100)} className="h-2" />}
+              </div>
+            ))}
+          </div>
+        </div>
+      )}
+
       {/* Empty State */}
       {!budget && (
         <div className="bg-white rounded-2xl p-12 border border-slate-100 text-center">
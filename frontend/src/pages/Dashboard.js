@@ -2,6 +2,7 @@ import { useState, useEffect } from "react";
 import { Link } from "react-router-dom";
 import { api, formatCurrency, formatPercentage } from "../lib/api";
 import { useLanguage } from "../context/LanguageContext";
+import { useLiveEvents } from "../hooks/use-live-events";
 import { Button } from "../components/ui/button";
 import { Progress } from "../components/ui/progress";
 import { toast } from "sonner";
@@ -45,6 +46,11 @@ const Dashboard = () => {
     fetchSummary();
   }, []);
 
+  useLiveEvents({
+    onSummary: setSummary,
+    onResync: () => fetchSummary(),
+  });
+
   const fetchSummary = async () => {
     try {
       const response = await api.get("/dashboard/summary");
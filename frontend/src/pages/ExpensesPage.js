@@ -1,5 +1,7 @@
-import { useState, useEffect } from "react";
-import { api, formatCurrency, formatDate, getCurrentMonth, getToday } from "../lib/api";
+import { useState, useEffect, useRef } from "react";
+import { api, formatCurrency, formatDate, getCurrentMonth, getToday, waitForJob } from "../lib/api";
+import { applyChange, useLiveEvents } from "../hooks/use-live-events";
+import DuplicateReview from "../components/DuplicateReview";
 import { Button } from "../components/ui/button";
 import { Input } from "../components/ui/input";
 import { Label } from "../components/ui/label";
@@ -18,7 +20,7 @@ import {
   DialogTrigger,
 } from "../components/ui/dialog";
 import { toast } from "sonner";
-import { Plus, CreditCard, Trash2, Home, Utensils, Car, Gamepad2, Heart, Shirt, BookOpen, Receipt } from "lucide-react";
+import { Plus, Upload, CreditCard, Trash2, Home, Utensils, Car, Gamepad2, Heart, Shirt, BookOpen, Receipt } from "lucide-react";
 
 const categoryIcons = {
   "Asuminen": Home,
@@ -36,6 +38,9 @@ const ExpensesPage = () => {
   const [categories, setCategories] = useState([]);
   const [loading, setLoading] = useState(true);
   const [dialogOpen, setDialogOpen] = useState(false);
+  const [importing, setImporting] = useState(false);
+  const [reviewKey, setReviewKey] = useState(0);
+  const fileInput = useRef(null);
   const [formData, setFormData] = useState({
     amount: "",
     description: "",
@@ -47,14 +52,20 @@ const ExpensesPage = () => {
     fetchData();
   }, []);
 
+  useLiveEvents({
+    onChange: (event) => {
+      if (event.collection !== "expenses") return;
+      if (event.doc && !event.doc.date.startsWith(getCurrentMonth())) return;
+      setExpenses((current) => applyChange(current, event, "date"));
+    },
+    onResync: () => fetchData(),
+  });
+
   const fetchData = async () => {
     try {
-      const [expensesRes, categoriesRes] = await Promise.all([
-        api.get(`/expenses?month=${getCurrentMonth()}`),
-        api.get("/categories")
-      ]);
-      setExpenses(expensesRes.data || []);
-      setCategories(categoriesRes.data || []);
+      const response = await api.get(`/bootstrap?views=expenses,categories&month=${getCurrentMonth()}`);
+      setExpenses(response.data.expenses || []);
+      setCategories(response.data.categories || []);
     } catch (error) {
       console.error("Error fetching data:", error);
     } finally {
@@ -69,7 +80,7 @@ const ExpensesPage = () => {
     }
 
     try {
-      await api.post("/expenses", {
+      const response = await api.post("/expenses", {
         amount: parseFloat(formData.amount),
         description: formData.description,
         category: formData.category,
@@ -78,7 +89,10 @@ const ExpensesPage = () => {
       toast.success("Kulu lisätty!");
       setDialogOpen(false);
       setFormData({ amount: "", description: "", category: "", date: getToday() });
-      fetchData();
+      // The response carries the saved row; no need to reload the month
+      if (response.data.date.startsWith(getCurrentMonth())) {
+        setExpenses((current) => applyChange(current, { op: "insert", doc: response.data }, "date"));
+      }
     } catch (error) {
       toast.error("Kulun lisäys epäonnistui");
     }
@@ -90,12 +104,39 @@ const ExpensesPage = () => {
     try {
       await api.delete(`/expenses/${id}`);
       toast.success("Kulu poistettu");
-      fetchData();
+      setExpenses((current) => applyChange(current, { op: "delete", id }));
     } catch (error) {
       toast.error("Poisto epäonnistui");
     }
   };
 
+  const handleImport = async (event) => {
+    const file = event.target.files[0];
+    event.target.value = "";
+    if (!file) return;
+
+    const body = new FormData();
+    body.append("file", file);
+    setImporting(true);
+    try {
+      const response = await api.post("/import/csv", body, {
+        headers: { "Content-Type": "multipart/form-data" },
+      });
+      const job = await waitForJob(response.data.id);
+      if (job.status !== "succeeded") throw new Error(job.error);
+      const { imported_count, invalid_count } = job.result;
+      toast.success(invalid_count
+        ? `Tuotiin ${imported_count} tapahtumaa, ${invalid_count} riviä ohitettiin`
+        : `Tuotiin ${imported_count} tapahtumaa`);
+      fetchData();
+      setReviewKey((key) => key + 1);
+    } catch (error) {
+      toast.error(error.response?.data?.detail || error.message || "Tiliotteen tuonti epäonnistui");
+    } finally {
+      setImporting(false);
+    }
+  };
+
   const totalExpenses = expenses.reduce((sum, e) => sum + e.amount, 0);
 
   // Group by date
@@ -124,76 +165,89 @@ const ExpensesPage = () => {
           </h1>
           <p className="text-slate-500 mt-1">Kuukauden kulut</p>
         </div>
-        <Dialog open={dialogOpen} onOpenChange={setDialogOpen}>
-          <DialogTrigger asChild>
-            <Button className="bg-slate-900 text-white hover:bg-slate-800 rounded-full" data-testid="add-expense-btn">
-              <Plus className="w-4 h-4 mr-2" />
-              Lisää kulu
-            </Button>
-          </DialogTrigger>
-          <DialogContent>
-            <DialogHeader>
-              <DialogTitle>Lisää uusi kulu</DialogTitle>
-            </DialogHeader>
-            <div className="space-y-4 pt-4">
-              <div className="space-y-2">
-                <Label htmlFor="amount">Summa (€)</Label>
-                <Input
-                  id="amount"
-                  type="number"
-                  step="0.01"
-                  placeholder="0.00"
-                  value={formData.amount}
-                  onChange={(e) => setFormData({ ...formData, amount: e.target.value })}
-                  className="h-12"
-                  data-testid="expense-amount-input"
-                />
-              </div>
-              <div className="space-y-2">
-                <Label htmlFor="description">Kuvaus</Label>
-                <Input
-                  id="description"
-                  placeholder="Esim. Ruokaostokset"
-                  value={formData.description}
-                  onChange={(e) => setFormData({ ...formData, description: e.target.value })}
-                  className="h-12"
-                  data-testid="expense-description-input"
-                />
-              </div>
-              <div className="space-y-2">
-                <Label>Kategoria</Label>
-                <Select value={formData.category} onValueChange={(value) => setFormData({ ...formData, category: value })}>
-                  <SelectTrigger className="h-12" data-testid="expense-category-select">
-                    <SelectValue placeholder="Valitse kategoria" />
-                  </SelectTrigger>
-                  <SelectContent>
-                    {categories.map((cat) => (
-                      <SelectItem key={cat.name} value={cat.name}>{cat.name}</SelectItem>
-                    ))}
-                  </SelectContent>
-                </Select>
-              </div>
-              <div className="space-y-2">
-                <Label htmlFor="date">Päivämäärä</Label>
-                <Input
-                  id="date"
-                  type="date"
-                  value={formData.date}
-                  onChange={(e) => setFormData({ ...formData, date: e.target.value })}
-                  className="h-12"
-                  data-testid="expense-date-input"
-                />
-              </div>
-              <Button 
-                onClick={handleSubmit}
-                className="w-full bg-slate-900 text-white hover:bg-slate-800 rounded-full h-12"
-                data-testid="save-expense-btn"
-              >
-                Tallenna
+        <div className="flex gap-2">
+          <input type="file" accept=".csv,text/csv" ref={fileInput} onChange={handleImport} className="hidden" />
+          <Button
+            variant="outline"
+            className="rounded-full"
+            onClick={() => fileInput.current.click()}
+            disabled={importing}
+            data-testid="import-csv-btn"
+          >
+            <Upload className="w-4 h-4 mr-2" />
+            {importing ? "Tuodaan..." : "Tuo CSV"}
+          </Button>
+          <Dialog open={dialogOpen} onOpenChange={setDialogOpen}>
+            <DialogTrigger asChild>
+              <Button className="bg-slate-900 text-white hover:bg-slate-800 rounded-full" data-testid="add-expense-btn">
+                <Plus className="w-4 h-4 mr-2" />
+                Lisää kulu
               </Button>
-            </div>
-          </DialogContent>
-        </Dialog>
+            </DialogTrigger>
+            <DialogContent>
+              <DialogHeader>
+                <DialogTitle>Lisää uusi kulu</DialogTitle>
+              </DialogHeader>
+              <div className="space-y-4 pt-4">
+                <div className="space-y-2">
+                  <Label htmlFor="amount">Summa (€)</Label>
+                  <Input
+                    id="amount"
+                    type="number"
+                    step="0.01"
+                    placeholder="0.00"
+                    value={formData.amount}
+                    onChange={(e) => setFormData({ ...formData, amount: e.target.value })}
+                    className="h-12"
+                    data-testid="expense-amount-input"
+                  />
+                </div>
+                <div className="space-y-2">
+                  <Label htmlFor="description">Kuvaus</Label>
+                  <Input
+                    id="description"
+                    placeholder="Esim. Ruokaostokset"
+                    value={formData.description}
+                    onChange={(e) => setFormData({ ...formData, description: e.target.value })}
+                    className="h-12"
+                    data-testid="expense-description-input"
+                  />
+                </div>
+                <div className="space-y-2">
+                  <Label>Kategoria</Label>
+                  <Select value={formData.category} onValueChange={(value) => setFormData({ ...formData, category: value })}>
+                    <SelectTrigger className="h-12" data-testid="expense-category-select">
+                      <SelectValue placeholder="Valitse kategoria" />
+                    </SelectTrigger>
+                    <SelectContent>
+                      {categories.map((cat) => (
+                        <SelectItem key={cat.name} value={cat.name}>{cat.name}</SelectItem>
+                      ))}
+                    </SelectContent>
+                  </Select>
+                </div>
+                <div className="space-y-2">
+                  <Label htmlFor="date">Päivämäärä</Label>
+                  <Input
+                    id="date"
+                    type="date"
+                    value={formData.date}
+                    onChange={(e) => setFormData({ ...formData, date: e.target.value })}
+                    className="h-12"
+                    data-testid="expense-date-input"
+                  />
+                </div>
+                <Button 
+                  onClick={handleSubmit}
+                  className="w-full bg-slate-900 text-white hover:bg-slate-800 rounded-full h-12"
+                  data-testid="save-expense-btn"
+                >
+                  Tallenna
+                </Button>
+              </div>
+            </DialogContent>
+          </Dialog>
+        </div>
       </div>
 
       {/* Total Summary */}
@@ -210,6 +264,12 @@ const ExpensesPage = () => {
         <p className="text-slate-500 text-sm mt-2">{expenses.length} tapahtumaa</p>
       </div>
 
+      <DuplicateReview
+        key={reviewKey}
+        kind="expenses"
+        onDeleted={(id) => setExpenses((current) => applyChange(current, { op: "delete", id }))}
+      />
+
       {/* Expenses List */}
       {Object.keys(groupedExpenses).length > 0 ? (
         <div className="space-y-6">
@@ -1,5 +1,7 @@
 import { useState, useEffect } from "react";
 import { api, formatCurrency, formatDate, getCurrentMonth, getToday } from "../lib/api";
+import { applyChange, useLiveEvents } from "../hooks/use-live-events";
+import DuplicateReview from "../components/DuplicateReview";
 import { Button } from "../components/ui/button";
 import { Input } from "../components/ui/input";
 import { Label } from "../components/ui/label";
@@ -51,6 +53,15 @@ const IncomesPage = () => {
     fetchData();
   }, []);
 
+  useLiveEvents({
+    onChange: (event) => {
+      if (event.collection !== "incomes") return;
+      if (event.doc && !event.doc.date.startsWith(getCurrentMonth())) return;
+      setIncomes((current) => applyChange(current, event, "date"));
+    },
+    onResync: () => fetchData(),
+  });
+
   const fetchData = async () => {
     try {
       const response = await api.get(`/incomes?month=${getCurrentMonth()}`);
@@ -69,7 +80,7 @@ const IncomesPage = () => {
     }
 
     try {
-      await api.post("/incomes", {
+      const response = await api.post("/incomes", {
         amount: parseFloat(formData.amount),
         description: formData.description,
         source: formData.source,
@@ -79,7 +90,10 @@ const IncomesPage = () => {
       toast.success("Tulo lisätty!");
       setDialogOpen(false);
       setFormData({ amount: "", description: "", source: "", date: getToday(), recurring: false });
-      fetchData();
+      // The response carries the saved row; no need to reload the month
+      if (response.data.date.startsWith(getCurrentMonth())) {
+        setIncomes((current) => applyChange(current, { op: "insert", doc: response.data }, "date"));
+      }
     } catch (error) {
       toast.error("Tulon lisäys epäonnistui");
     }
@@ -91,7 +105,7 @@ const IncomesPage = () => {
     try {
       await api.delete(`/incomes/${id}`);
       toast.success("Tulo poistettu");
-      fetchData();
+      setIncomes((current) => applyChange(current, { op: "delete", id }));
     } catch (error) {
       toast.error("Poisto epäonnistui");
     }
@@ -213,6 +227,11 @@ const IncomesPage = () => {
         <p className="text-emerald-200 text-sm mt-2">{incomes.length} tapahtumaa</p>
       </div>
 
+      <DuplicateReview
+        kind="incomes"
+        onDeleted={(id) => setIncomes((current) => applyChange(current, { op: "delete", id }))}
+      />
+
       {/* Incomes List */}
       {incomes.length > 0 ? (
         <div className="bg-white rounded-2xl border border-slate-100 overflow-hidden">
@@ -1,5 +1,6 @@
 import { useState, useEffect } from "react";
 import { api, formatCurrency, getToday } from "../lib/api";
+import { applyChange, useLiveEvents } from "../hooks/use-live-events";
 import { Button } from "../components/ui/button";
 import { Input } from "../components/ui/input";
 import { Label } from "../components/ui/label";
@@ -54,6 +55,14 @@ const LoansPage = () => {
     fetchData();
   }, []);
 
+  const live = useLiveEvents({
+    onChange: (event) => {
+      if (event.collection !== "loans") return;
+      setLoans((current) => applyChange(current, event));
+    },
+    onResync: () => fetchData(),
+  });
+
   const fetchData = async () => {
     try {
       const response = await api.get("/loans");
@@ -88,7 +97,7 @@ const LoansPage = () => {
         name: "", loan_type: "", original_amount: "", remaining_amount: "",
         interest_rate: "", monthly_payment: "", start_date: getToday(), end_date: ""
       });
-      fetchData();
+      if (!live) fetchData();
     } catch (error) {
       toast.error("Lainan lisäys epäonnistui");
     }
@@ -100,7 +109,7 @@ const LoansPage = () => {
     try {
       await api.delete(`/loans/${id}`);
       toast.success("Laina poistettu");
-      fetchData();
+      if (!live) fetchData();
     } catch (error) {
       toast.error("Poisto epäonnistui");
     }
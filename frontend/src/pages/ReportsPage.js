@@ -33,21 +33,27 @@ const ReportsPage = () => {
   const [incomes, setIncomes] = useState([]);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState("overview");
+  const [pivot, setPivot] = useState(null);
 
   useEffect(() => {
     fetchData();
   }, []);
 
+  useEffect(() => {
+    if (activeTab === "categories" && !pivot) {
+      // Category x month sums for the last 12 months
+      api.get("/analytics/pivot?rows=category&cols=month")
+        .then((response) => setPivot(response.data))
+        .catch((error) => console.error("Error fetching pivot:", error));
+    }
+  }, [activeTab, pivot]);
+
   const fetchData = async () => {
     try {
-      const [summaryRes, expensesRes, incomesRes] = await Promise.all([
-        api.get("/dashboard/summary"),
-        api.get(`/expenses?month=${getCurrentMonth()}`),
-        api.get(`/incomes?month=${getCurrentMonth()}`)
-      ]);
-      setSummary(summaryRes.data);
-      setExpenses(expensesRes.data || []);
-      setIncomes(incomesRes.data || []);
+      const response = await api.get(`/bootstrap?views=summary,expenses,incomes&month=${getCurrentMonth()}`);
+      setSummary(response.data.summary);
+      setExpenses(response.data.expenses || []);
+      setIncomes(response.data.incomes || []);
     } catch (error) {
       console.error("Error fetching data:", error);
       toast.error("Tietojen lataus epäonnistui");
@@ -115,6 +121,8 @@ const ReportsPage = () => {
   const savingsRate = totalIncome > 0 ? ((totalIncome - totalExpenses) / totalIncome * 100) : 0;
   const avgDailyExpense = expenses.length > 0 ? totalExpenses / new Date().getDate() : 0;
 
+  const pivotMax = Math.max(0, ...(pivot?.matrix || []).flatMap((row) => row.sums));
+
   const CustomTooltip = ({ active, payload, label }) => {
     if (active && payload && payload.length) {
       return (
@@ -324,6 +332,46 @@ const ReportsPage = () => {
                   ))}
                 </div>
               </div>
+
+              {/* Category x Month Heatmap */}
+              {pivot?.matrix?.length > 0 && (
+                <div className="bg-white rounded-2xl p-4 sm:p-6 border border-slate-100" data-testid="category-heatmap">
+                  <h3 className="text-lg font-semibold text-slate-900 mb-4" style={{ fontFamily: 'Manrope, sans-serif' }}>
+                    Kategoriat kuukausittain
+                  </h3>
+                  <div className="overflow-x-auto">
+                    <table className="w-full text-xs sm:text-sm tabular-nums">
+                      <thead>
+                        <tr>
+                          <th className="text-left font-medium text-slate-500 pr-3 pb-2">Kategoria</th>
+                          {pivot.periods.map((period) => (
+                            <th key={period} className="font-medium text-slate-500 px-1 pb-2 whitespace-nowrap">
+                              {period.slice(5)}/{period.slice(2, 4)}
+                            </th>
+                          ))}
+                        </tr>
+                      </thead>
+                      <tbody>
+                        {pivot.matrix.map((row) => (
+                          <tr key={row.key}>
+                            <td className="font-medium text-slate-900 pr-3 py-1 whitespace-nowrap">{row.label}</td>
+                            {row.sums.map((amount, index) => (
+                              <td
+                                key={pivot.periods[index]}
+                                className="px-1 py-1 text-center rounded"
+                                style={{ backgroundColor: amount > 0 ? `rgba(245, 158, 11, ${0.1 + 0.9 * amount / pivotMax})` : undefined }}
+                                title={`${formatCurrency(amount)} (${row.counts[index]} kpl)`}
+                              >
+                                {amount > 0 ? Math.round(amount) : ""}
+                              </td>
+                            ))}
+                          </tr>
+                        ))}
+                      </tbody>
+                    </table>
+                  </div>
+                </div>
+              )}
             </>
           ) : (
             <div className="bg-white rounded-2xl p-12 border border-slate-100 text-center">
@@ -1,5 +1,6 @@
 import { useState, useEffect } from "react";
 import { api, formatCurrency } from "../lib/api";
+import { applyChange, useLiveEvents } from "../hooks/use-live-events";
 import { Button } from "../components/ui/button";
 import { Input } from "../components/ui/input";
 import { Label } from "../components/ui/label";
@@ -40,6 +41,14 @@ const SavingsPage = () => {
     fetchData();
   }, []);
 
+  const live = useLiveEvents({
+    onChange: (event) => {
+      if (event.collection !== "savings_goals") return;
+      setGoals((current) => applyChange(current, event));
+    },
+    onResync: () => fetchData(),
+  });
+
   const fetchData = async () => {
     try {
       const response = await api.get("/savings");
@@ -83,7 +92,7 @@ const SavingsPage = () => {
       
       setDialogOpen(false);
       resetForm();
-      fetchData();
+      if (!live) fetchData();
     } catch (error) {
       toast.error("Toiminto epäonnistui");
     }
@@ -107,7 +116,7 @@ const SavingsPage = () => {
     try {
       await api.delete(`/savings/${id}`);
       toast.success("Säästötavoite poistettu");
-      fetchData();
+      if (!live) fetchData();
     } catch (error) {
       toast.error("Poisto epäonnistui");
     }
@@ -1,6 +1,6 @@
 import { useState } from "react";
 import { useAuth } from "../context/AuthContext";
-import { api } from "../lib/api";
+import { api, waitForJob } from "../lib/api";
 import { Button } from "../components/ui/button";
 import {
   Dialog,
@@ -17,12 +17,14 @@ import {
   LogOut,
   ChevronRight,
   Loader2,
-  CheckCircle
+  CheckCircle,
+  Download
 } from "lucide-react";
 
 const SettingsPage = () => {
   const { user, logout, refreshUser } = useAuth();
   const [paymentLoading, setPaymentLoading] = useState(false);
+  const [exportProgress, setExportProgress] = useState(null);
 
   const handlePayment = async () => {
     setPaymentLoading(true);
@@ -42,6 +44,30 @@ const SettingsPage = () => {
     }
   };
 
+  const handleExport = async () => {
+    setExportProgress(0);
+    try {
+      const response = await api.post("/export");
+      const job = await waitForJob(response.data.id, ({ progress }) => {
+        if (progress.total) setExportProgress(Math.round((progress.done / progress.total) * 100));
+      });
+      if (job.status !== "succeeded") throw new Error(job.error);
+
+      const file = await api.get(`/jobs/${job.id}/download`, { responseType: "blob" });
+      const url = URL.createObjectURL(file.data);
+      const link = document.createElement("a");
+      link.href = url;
+      link.download = job.result.filename;
+      link.click();
+      URL.revokeObjectURL(url);
+      toast.success(`Vietiin ${job.result.row_count} tapahtumaa`);
+    } catch (error) {
+      toast.error("Vienti epäonnistui");
+    } finally {
+      setExportProgress(null);
+    }
+  };
+
   const handleLogout = () => {
     logout();
     window.location.href = "/";
@@ -180,6 +206,37 @@ const SettingsPage = () => {
         </div>
       </div>
 
+      {/* Data Export */}
+      <div className="bg-white rounded-2xl p-6 border border-slate-100">
+        <div className="flex items-center justify-between gap-4">
+          <div className="flex items-center gap-3">
+            <div className="w-10 h-10 bg-emerald-100 rounded-lg flex items-center justify-center">
+              <Download className="w-5 h-5 text-emerald-600" />
+            </div>
+            <div>
+              <h2 className="text-lg font-semibold text-slate-900">Tietojen vienti</h2>
+              <p className="text-sm text-slate-500">Lataa menot ja tulot CSV-tiedostona</p>
+            </div>
+          </div>
+          <Button
+            onClick={handleExport}
+            variant="outline"
+            className="rounded-full"
+            disabled={exportProgress !== null}
+            data-testid="export-btn"
+          >
+            {exportProgress !== null ? (
+              <>
+                <Loader2 className="w-4 h-4 mr-2 animate-spin" />
+                {exportProgress}%
+              </>
+            ) : (
+              "Vie CSV"
+            )}
+          </Button>
+        </div>
+      </div>
+
       {/* Logout Button */}
       <Button
         onClick={handleLogout}
@@ -0,0 +1,129 @@
+"""
+StatementParser on sample statements of the banks it reads.
+
+Each sample is fed both whole and in small blocks, since uploads arrive a
+block at a time and a row, or a quoted field, may be cut anywhere.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from bank_csv import StatementError, StatementParser, parse_amount, parse_date  # noqa: E402
+
+OP_STATEMENT = (
+    "Kirjauspäivä;Arvopäivä;Määrä EUROA;Laji;Selitys;Saaja/Maksaja;Saajan tilinumero;"
+    "Saajan pankin BIC;Viite;Viesti;Arkistointitunnus\n"
+    "2026-01-05;2026-01-05;-12,50;162;KORTTIOSTO;K-Market Kamppi;;;;'4029 OSTOPVM';20260105/XYZ1\n"
+    "2026-01-06;2026-01-06;+2 500,00;710;PALKKA;Työnantaja Oy;;;;;20260106/XYZ2\n"
+)
+
+NORDEA_STATEMENT = (
+    "﻿Kirjauspäivä;Määrä;Maksaja;Maksunsaaja;Nimi;Otsikko;Viitenumero;Valuutta\r\n"
+    "2026/01/05;-4,20;;;Alepa;Alepa;;EUR\r\n"
+    "2026/01/05;-4,20;;;Alepa;Alepa;;EUR\r\n"
+    "2026/01/06;-4,20;;;Alepa;Alepa;;EUR\r\n"
+)
+
+S_PANKKI_STATEMENT = (
+    "Tilin nimi;Käyttötili\n"
+    "\n"
+    "Kirjauspäivä;Maksupäivä;Summa;Tapahtumalaji;Maksaja;Saajan nimi;Saajan tilinumero;"
+    "Saajan BIC-tunnus;Viitenumero;Viesti;Arkistointitunnus\n"
+    '05.01.2026;05.01.2026;-7,90;KORTTIOSTO;Matti;Prisma;;;;"Lasku\nosa 2";S1\n'
+    "06.01.2026;06.01.2026;15,00;TILISIIRTO;Maija;;;;;Kiitos;S2\n"
+)
+
+
+def parse(text: str, block: int = 0, bank=None):
+    """Booked rows and the parser, feeding text whole or `block` characters at a time"""
+    parser = StatementParser(bank)
+    rows = []
+    for start in range(0, len(text), block or len(text)):
+        rows += parser.feed(text[start:start + (block or len(text))])
+    return rows + parser.close(), parser
+
+
+@pytest.mark.parametrize("block", [0, 1, 7])
+def test_op_statement(block):
+    rows, parser = parse(OP_STATEMENT, block)
+    assert parser.bank == "op"
+    assert [row["transactionId"] for row in rows] == ["op:20260105/XYZ1", "op:20260106/XYZ2"]
+    expense, income = rows
+    assert expense["bookingDate"] == "2026-01-05"
+    assert expense["transactionAmount"] == {"amount": "-12.50", "currency": "EUR"}
+    assert expense["creditorName"] == "K-Market Kamppi"
+    assert income["transactionAmount"]["amount"] == "2500.00"
+    assert income["debtorName"] == "Työnantaja Oy"
+
+
+@pytest.mark.parametrize("block", [0, 5])
+def test_nordea_statement_numbers_identical_rows(block):
+    rows, parser = parse(NORDEA_STATEMENT, block)
+    assert parser.bank == "nordea"
+    assert [row["bookingDate"] for row in rows] == ["2026-01-05", "2026-01-05", "2026-01-06"]
+    ids = [row["transactionId"] for row in rows]
+    # Two real payments on one day keep apart; the occurrence restarts on the next day
+    assert ids[0].endswith(":0") and ids[1].endswith(":1") and ids[2].endswith(":0")
+    assert ids[0][:-2] == ids[1][:-2] != ids[2][:-2]
+
+
+def test_identical_rows_map_to_the_same_ids_on_reupload():
+    first, _ = parse(NORDEA_STATEMENT)
+    second, _ = parse(NORDEA_STATEMENT, 3)
+    assert [row["transactionId"] for row in first] == [row["transactionId"] for row in second]
+
+
+@pytest.mark.parametrize("block", [0, 1, 4])
+def test_s_pankki_statement_with_preamble_and_quoted_newline(block):
+    rows, parser = parse(S_PANKKI_STATEMENT, block)
+    assert parser.bank == "s-pankki"
+    assert parser.invalid_count == 0
+    assert [row["transactionId"] for row in rows] == ["s-pankki:S1", "s-pankki:S2"]
+    assert rows[0]["creditorName"] == "Prisma"
+    # No counterparty: the message describes the row
+    assert rows[1]["remittanceInformationUnstructured"] == "Kiitos"
+
+
+def test_quoted_newline_keeps_the_row_together():
+    text = OP_STATEMENT + '2026-01-07;2026-01-07;-3,00;162;KORTTIOSTO;;;;;"rivi 1\nrivi 2";XYZ3\n'
+    rows, parser = parse(text, 2)
+    assert parser.invalid_count == 0
+    assert rows[-1]["remittanceInformationUnstructured"] == "rivi 1\nrivi 2"
+
+
+def test_invalid_rows_are_counted_with_their_line():
+    text = OP_STATEMENT + "bad;row;x\n2026-01-07;2026-01-07;abc;1;X;Y;;;;;Z\n"
+    rows, parser = parse(text)
+    assert len(rows) == 2
+    assert parser.invalid_count == 2
+    assert [error["line"] for error in parser.errors] == [4, 5]
+
+
+def test_unclosed_quote_rejects_only_its_line():
+    text = OP_STATEMENT + '2026-01-07;2026-01-07;-3,00;162;"KORTTIOSTO;;;;;;XYZ3\n' \
+        "2026-01-08;2026-01-08;-4,00;162;KORTTIOSTO;Alepa;;;;;XYZ4\n"
+    rows, parser = parse(text)
+    assert parser.invalid_count == 1
+    assert parser.errors[0]["line"] == 4
+    assert rows[-1]["transactionId"] == "op:XYZ4"
+
+
+def test_unknown_format_and_bank():
+    with pytest.raises(StatementError):
+        parse("foo;bar\n1;2\n")
+    with pytest.raises(StatementError):
+        StatementParser("x")
+
+
+def test_dates_and_amounts():
+    assert parse_date("5.1.26") == "2026-01-05"
+    assert parse_date("2026/1/5") == "2026-01-05"
+    with pytest.raises(ValueError):
+        parse_date("31.02.2026")
+    assert parse_amount("1.234,56") == 1234.56
+    assert parse_amount("−7,90") == -7.9
@@ -0,0 +1,69 @@
+"""
+find_duplicates() pairing of imported rows with hand-entered ones.
+"""
+
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from duplicates import description_words, find_duplicates  # noqa: E402
+
+
+def row(id, amount, date, description=""):
+    return {"id": id, "amount": amount, "date": date, "description": description}
+
+
+def pairs(matches):
+    return [(match["imported"]["id"], match["existing"]["id"]) for match in matches]
+
+
+def test_amounts_are_compared_in_cents():
+    # 0.1 + 0.2 is not 0.3 in floats, but it is 30 cents
+    imported = [row("i1", 0.1 + 0.2, "2026-01-05"), row("i2", 12.51, "2026-01-05")]
+    existing = [row("e1", 0.3, "2026-01-05"), row("e2", 12.5, "2026-01-05")]
+    assert pairs(find_duplicates(imported, existing)) == [("i1", "e1")]
+
+
+def test_only_rows_within_the_window_are_candidates():
+    imported = [row("i1", 10, "2026-01-10")]
+    existing = [
+        row("early", 10, "2026-01-06"),
+        row("edge", 10, "2026-01-07"),
+        row("late", 10, "2026-01-14"),
+    ]
+    matches = find_duplicates(imported, existing, window_days=3, min_score=0)
+    assert pairs(matches) == [("i1", "edge")]
+    assert matches[0]["score"] == 0.15
+
+
+def test_window_crosses_month_and_year_ends():
+    imported = [row("i1", 10, "2026-01-01", "Prisma")]
+    existing = [row("e1", 10, "2025-12-31", "prisma")]
+    assert pairs(find_duplicates(imported, existing)) == [("i1", "e1")]
+
+
+def test_matching_is_one_to_one_and_best_first():
+    imported = [row("i1", 4.2, "2026-01-05", "Alepa Kamppi"), row("i2", 4.2, "2026-01-05", "Alepa Itäkeskus")]
+    existing = [row("e1", 4.2, "2026-01-05", "Alepa Kamppi"), row("e2", 4.2, "2026-01-05", "kahvi")]
+    matches = find_duplicates(imported, existing)
+    # i2 is closer to e1 than to e2, but i1 matches e1 better still
+    assert pairs(matches) == [("i1", "e1"), ("i2", "e2")]
+    assert [match["score"] for match in matches] == [1.0, 0.6]
+
+
+def test_a_manual_row_matches_at_most_one_imported_row():
+    imported = [row("i1", 20, "2026-01-05"), row("i2", 20, "2026-01-05")]
+    existing = [row("e1", 20, "2026-01-05")]
+    assert len(find_duplicates(imported, existing)) == 1
+
+
+def test_rows_with_unreadable_dates_are_skipped():
+    imported = [row("i1", 5, "eilen"), row("i2", 5, None), row("i3", 5, "2026-01-05")]
+    existing = [row("e1", 5, "5.1.2026"), row("e2", 5, "2026-01-05")]
+    assert pairs(find_duplicates(imported, existing)) == [("i3", "e2")]
+
+
+def test_description_words_drop_numbers_and_codes():
+    assert description_words("K-Market 4029 *1234 Kamppi") == {"market", "kamppi"}
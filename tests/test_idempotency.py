@@ -0,0 +1,162 @@
+"""
+Idempotency-Key replay through IdempotencyMiddleware and IdempotencyStore,
+on mongomock-motor.
+"""
+
+import asyncio
+import json
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+import idempotency  # noqa: E402
+from idempotency import IdempotencyMiddleware, IdempotencyStore, ResponseCache  # noqa: E402
+
+
+class CreateApp:
+    """Counts the requests that reach the route; answers with `status`"""
+
+    def __init__(self, status: int = 201):
+        self.status = status
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = (await receive())["body"]
+        payload = json.dumps({"call": self.calls, "echo": body.decode()}).encode()
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(b"content-type", b"application/json"), (b"x-request", b"1")]})
+        await send({"type": "http.response.body", "body": payload})
+
+
+async def post(app, key, body=b"{}", path="/api/expenses"):
+    """(status, headers, body) of one POST through app"""
+    headers = [(b"content-type", b"application/json")]
+    if key is not None:
+        headers.append((b"idempotency-key", key.encode()))
+    scope = {"type": "http", "method": "POST", "path": path, "query_string": b"", "headers": headers}
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+@pytest.fixture
+def store():
+    db = AsyncMongoMockClient()["idempotency_test"]
+    store = IdempotencyStore(lambda: db)
+    asyncio.run(store.ensure_indexes())
+    return store
+
+
+def middleware(store, route, cache_size=0):
+    async def resolve_user(scope):
+        return "u1"
+
+    # No LRU by default, so every retry goes to the store
+    return IdempotencyMiddleware(route, store=store, resolve_user=resolve_user, paths={"/api/expenses"},
+                                 cache=ResponseCache(max_entries=cache_size))
+
+
+@pytest.mark.parametrize("cache_size", [0, 10])
+def test_a_retry_gets_the_first_response(store, cache_size):
+    route = CreateApp()
+    app = middleware(store, route, cache_size)
+
+    async def scenario():
+        first = await post(app, "k1", b'{"amount": 5}')
+        retry = await post(app, "k1", b'{"amount": 5}')
+        return first, retry
+
+    (status, headers, body), (retry_status, retry_headers, retry_body) = asyncio.run(scenario())
+    assert route.calls == 1
+    assert status == retry_status == 201 and retry_body == body
+    assert retry_headers[b"idempotent-replayed"] == b"true"
+    assert retry_headers[b"content-type"] == b"application/json"
+    # Only the stored headers come back
+    assert b"x-request" not in retry_headers
+
+
+def test_keys_are_independent(store):
+    route = CreateApp()
+    app = middleware(store, route)
+
+    async def scenario():
+        await post(app, "k1")
+        await post(app, "k2")
+        await post(app, None)
+
+    asyncio.run(scenario())
+    assert route.calls == 3
+
+
+def test_a_key_reused_for_another_body_is_rejected(store):
+    route = CreateApp()
+    app = middleware(store, route)
+
+    async def scenario():
+        await post(app, "k1", b'{"amount": 5}')
+        return await post(app, "k1", b'{"amount": 6}')
+
+    status, _, _ = asyncio.run(scenario())
+    assert status == 422 and route.calls == 1
+
+
+def test_a_server_error_releases_the_key(store):
+    route = CreateApp(status=503)
+    app = middleware(store, route)
+
+    async def scenario():
+        await post(app, "k1")
+        route.status = 201
+        return await post(app, "k1")
+
+    status, headers, _ = asyncio.run(scenario())
+    assert status == 201 and route.calls == 2
+    assert b"idempotent-replayed" not in headers
+
+
+def test_a_running_key_is_pending_until_its_lock_goes_stale(store):
+    async def scenario():
+        assert await store.begin("u1", "k1", "f") == ("new", None)
+        assert await store.begin("u1", "k1", "f") == ("pending", None)
+        # Another user's key of the same name is separate
+        assert await store.begin("u2", "k1", "f") == ("new", None)
+        expired = (idempotency._now() - timedelta(seconds=1)).isoformat()
+        await store.collection.update_one({"user_id": "u1", "key": "k1"}, {"$set": {"locked_until": expired}})
+        assert await store.begin("u1", "k1", "f") == ("new", None)
+        await store.complete("u1", "k1", {"status": 201, "headers": [], "body": b"{}"})
+        assert await store.begin("u1", "k1", "f") == ("done", {"status": 201, "headers": [], "body": b"{}"})
+
+    asyncio.run(scenario())
+
+
+def test_a_pending_retry_gets_409(store):
+    app = middleware(store, CreateApp())
+
+    async def scenario():
+        await store.begin("u1", "k1", idempotency.request_fingerprint(
+            {"method": "POST", "path": "/api/expenses", "query_string": b""}, b"{}"))
+        return await post(app, "k1")
+
+    status, headers, _ = asyncio.run(scenario())
+    assert status == 409 and headers[b"retry-after"] == b"1"
@@ -0,0 +1,135 @@
+"""
+JobQueue claiming, heartbeats and re-claiming of stale jobs, on mongomock-motor.
+"""
+
+import asyncio
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+import jobs  # noqa: E402
+from jobs import JobCancelled, JobContext, JobQueue  # noqa: E402
+
+
+@pytest.fixture
+def queue():
+    db = AsyncMongoMockClient()["jobs_test"]
+    queue = JobQueue(lambda: db)
+
+    @queue.handler("noop")
+    async def noop(job):
+        return {"done": True}
+
+    return queue
+
+
+async def make_stale(queue, job_id):
+    stale = jobs._now() - timedelta(seconds=jobs.JOB_STALE_SECONDS + 1)
+    await queue.collection.update_one({"id": job_id}, {"$set": {"heartbeat_at": stale.isoformat()}})
+
+
+def test_a_queued_job_is_claimed_once(queue):
+    async def scenario():
+        job = await queue.enqueue("u1", "noop", {"a": 1})
+        claimed = await queue._claim("w1")
+        assert claimed["id"] == job["id"]
+        assert (claimed["status"], claimed["worker"], claimed["attempts"]) == ("running", "w1", 1)
+        assert await queue._claim("w2") is None
+        stored = await queue.collection.find_one({"id": job["id"]})
+        assert "started_at" in stored
+
+    asyncio.run(scenario())
+
+
+def test_jobs_are_claimed_oldest_first(queue):
+    async def scenario():
+        first = await queue.enqueue("u1", "noop")
+        await queue.enqueue("u2", "noop")
+        assert (await queue._claim("w1"))["id"] == first["id"]
+
+    asyncio.run(scenario())
+
+
+def test_progress_is_the_heartbeat(queue):
+    async def scenario():
+        job = await queue.enqueue("u1", "noop")
+        claimed = await queue._claim("w1")
+        await make_stale(queue, job["id"])
+        await JobContext(queue, claimed, "w1").progress(3, 10, "Tuodaan")
+        stored = await queue.get("u1", job["id"])
+        assert stored["progress"] == {"done": 3, "total": 10, "message": "Tuodaan"}
+        # Fresh again, so no other worker takes it
+        assert await queue._claim("w2") is None
+
+    asyncio.run(scenario())
+
+
+def test_a_stale_job_is_reclaimed_and_the_old_worker_stops(queue):
+    async def scenario():
+        job = await queue.enqueue("u1", "noop")
+        claimed = await queue._claim("w1")
+        await make_stale(queue, job["id"])
+        reclaimed = await queue._claim("w2")
+        assert (reclaimed["worker"], reclaimed["attempts"]) == ("w2", 2)
+        assert reclaimed["started_at"] == (await queue.collection.find_one({"id": job["id"]}))["started_at"]
+        with pytest.raises(JobCancelled):
+            await JobContext(queue, claimed, "w1").progress(1)
+        # The old worker's finish no longer counts
+        await queue._finish(claimed, "w1", "failed", error="x")
+        assert (await queue.get("u1", job["id"]))["status"] == "running"
+        await queue._run(reclaimed, "w2")
+        finished = await queue.get("u1", job["id"])
+        assert (finished["status"], finished["result"]) == ("succeeded", {"done": True})
+
+    asyncio.run(scenario())
+
+
+def test_a_job_reclaimed_too_often_fails(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 1)
+
+    async def scenario():
+        job = await queue.enqueue("u1", "noop")
+        await queue._claim("w1")
+        await make_stale(queue, job["id"])
+        await queue._run(await queue._claim("w2"), "w2")
+        assert (await queue.get("u1", job["id"]))["status"] == "failed"
+
+    asyncio.run(scenario())
+
+
+def test_cancel_stops_a_running_job_at_its_next_progress(queue):
+    async def scenario():
+        job = await queue.enqueue("u1", "noop")
+        claimed = await queue._claim("w1")
+        assert (await queue.cancel("u1", job["id"]))["status"] == "running"
+        with pytest.raises(JobCancelled):
+            await JobContext(queue, claimed, "w1").progress(1)
+        # Another user cannot see or cancel it
+        assert await queue.cancel("u2", job["id"]) is None
+
+    asyncio.run(scenario())
+
+
+def test_stop_hands_running_jobs_back(queue):
+    async def scenario():
+        started = asyncio.Event()
+
+        @queue.handler("wait")
+        async def wait(job):
+            started.set()
+            await asyncio.sleep(60)
+
+        job = await queue.enqueue("u1", "wait")
+        queue.start(1)
+        await asyncio.wait_for(started.wait(), 5)
+        await queue.stop()
+        stored = await queue.collection.find_one({"id": job["id"]})
+        assert stored["status"] == "queued" and "worker" not in stored
+
+    asyncio.run(scenario())
@@ -0,0 +1,237 @@
+"""
+Every query on a per-user collection must name the user.
+
+Collections in sharding.SHARD_PLAN are sharded on user_id, and a query
+without it is broadcast to every shard. server.py reaches them through
+user_scope.UserScope; the storage modules that get a raw database build
+their filters by hand. Both are checked here, statically, so a new
+unscoped query fails the suite before it reaches a sharded cluster.
+"""
+
+import ast
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from sharding import SHARD_PLAN, UNSHARDED, USER_COLLECTIONS, is_hashed, plan_commands  # noqa: E402
+from user_scope import ScopeError, UserScope  # noqa: E402
+
+QUERY_METHODS = {
+    "find", "find_one", "find_one_and_update", "find_one_and_delete", "find_one_and_replace",
+    "count_documents", "update_one", "update_many", "replace_one", "delete_one", "delete_many",
+    "aggregate",
+}
+BULK_OPERATIONS = {"UpdateOne", "UpdateMany", "ReplaceOne", "DeleteOne", "DeleteMany"}
+
+# Modules that query per-user collections with filters they build themselves
+STORAGE_MODULES = ("rollups.py", "archive.py", "transaction_store.py", "idempotency.py", "migrate.py")
+
+# Deliberate scans across all users, by (module, function)
+CROSS_USER_QUERIES = {
+    ("archive.py", "user_ids"): "archival visits every user",
+    ("migrate.py", "scan"): "migrations walk whole collections in _id order",
+    ("migrate.py", "count_all"): "--dry-run counts what a migration would touch",
+}
+
+# server.py functions that may touch per-user collections directly
+UNSCOPED_FUNCTIONS = {"ensure_indexes"}
+
+
+def parse(module: str) -> ast.Module:
+    return ast.parse((BACKEND_DIR / module).read_text(), filename=module)
+
+
+def functions(tree: ast.Module):
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            yield node
+
+
+def is_raw_database(node: ast.expr, aliases=frozenset({"db"})) -> bool:
+    """`db`, analytics_db() or a name bound to either"""
+    if isinstance(node, ast.Name):
+        return node.id in aliases
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "analytics_db"
+
+
+def database_aliases(tree: ast.Module) -> set:
+    aliases = {"db"}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and is_raw_database(node.value, aliases):
+            aliases.update(target.id for target in node.targets if isinstance(target, ast.Name))
+    return aliases
+
+
+def collection_name(node: ast.expr):
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant):
+        return node.slice.value
+    return None
+
+
+def has_user_id(node: ast.expr) -> bool:
+    return isinstance(node, ast.Dict) and any(
+        isinstance(key, ast.Constant) and key.value == "user_id" for key in node.keys
+    )
+
+
+def resolve(name: str, function) -> list:
+    """Dict literals assigned to name inside function"""
+    return [
+        node.value for node in ast.walk(function)
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict)
+        and any(isinstance(target, ast.Name) and target.id == name for target in node.targets)
+    ]
+
+
+def query_filter(call: ast.Call):
+    """The filter a query call applies, or None when it cannot be read statically"""
+    if not call.args:
+        return None
+    first = call.args[0]
+    if isinstance(call.func, ast.Attribute) and call.func.attr == "aggregate":
+        if not isinstance(first, ast.List) or not first.elts:
+            return None
+        stage = first.elts[0]
+        if not isinstance(stage, ast.Dict):
+            return None
+        match = dict(zip((key.value for key in stage.keys if isinstance(key, ast.Constant)), stage.values))
+        return match.get("$match", ast.Dict(keys=[], values=[]))
+    return first
+
+
+def unscoped_queries(module: str) -> list:
+    problems = []
+    for function in functions(parse(module)):
+        if (module, function.name) in CROSS_USER_QUERIES:
+            continue
+        for call in ast.walk(function):
+            if not isinstance(call, ast.Call):
+                continue
+            is_query = isinstance(call.func, ast.Attribute) and call.func.attr in QUERY_METHODS
+            is_bulk = isinstance(call.func, ast.Name) and call.func.id in BULK_OPERATIONS
+            if not (is_query or is_bulk):
+                continue
+            found = query_filter(call)
+            if isinstance(found, ast.Name):
+                candidates = resolve(found.id, function)
+                if candidates and not all(has_user_id(candidate) for candidate in candidates):
+                    problems.append(f"{module}:{call.lineno} {function.name}")
+            elif isinstance(found, ast.Dict) and not has_user_id(found):
+                problems.append(f"{module}:{call.lineno} {function.name}")
+    return problems
+
+
+def test_server_reaches_user_collections_through_user_scope():
+    tree = parse("server.py")
+    aliases = database_aliases(tree)
+    allowed = {
+        id(node)
+        for function in functions(tree) if function.name in UNSCOPED_FUNCTIONS
+        for node in ast.walk(function)
+    }
+    direct = [
+        f"server.py:{node.lineno} {collection_name(node)}"
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.Attribute, ast.Subscript))
+        and collection_name(node) in USER_COLLECTIONS
+        and is_raw_database(node.value, aliases)
+        and id(node) not in allowed
+    ]
+    assert direct == [], "use user_data(user_id) for per-user collections"
+
+
+@pytest.mark.parametrize("module", STORAGE_MODULES)
+def test_storage_filters_name_user_id(module):
+    assert unscoped_queries(module) == []
+
+
+def test_check_catches_a_missing_user_id(tmp_path, monkeypatch):
+    (tmp_path / "example.py").write_text(
+        "async def update(db, loan_id):\n"
+        "    await db.loans.update_one({'id': loan_id}, {'$set': {}})\n"
+        "async def total(db, user_id):\n"
+        "    query = {'month': '2024-01'}\n"
+        "    return await db.budgets.find(query).to_list(None)\n"
+        "async def scan(db):\n"
+        "    return await db.loans.aggregate([{'$group': {'_id': '$user_id'}}]).to_list(None)\n"
+    )
+    monkeypatch.setattr(sys.modules[__name__], "BACKEND_DIR", tmp_path)
+    assert [problem.split()[1] for problem in unscoped_queries("example.py")] == ["update", "total", "scan"]
+
+
+class RecordingCollection:
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            self.calls.append((method, args, kwargs))
+        return call
+
+
+class RecordingDB(dict):
+    def __missing__(self, name):
+        self[name] = RecordingCollection(name)
+        return self[name]
+
+
+def test_user_scope_adds_user_id_to_filters():
+    db = RecordingDB()
+    data = UserScope(db, "u1")
+    data.loans.find_one({"id": "l1"}, {"_id": 0})
+    data.budgets.find()
+    data.loans.update_one({"id": "l1"}, {"$set": {"name": "Auto"}})
+    assert [call[1][0] for call in db["loans"].calls] == [{"id": "l1", "user_id": "u1"}] * 2
+    assert db["budgets"].calls[0][1][0] == {"user_id": "u1"}
+
+
+def test_user_scope_rejects_another_user():
+    data = UserScope(RecordingDB(), "u1")
+    with pytest.raises(ScopeError):
+        data.loans.find({"user_id": "u2"})
+    with pytest.raises(ScopeError):
+        data.loans.insert_many([{"id": "a"}, {"id": "b", "user_id": "u2"}])
+    with pytest.raises(ScopeError):
+        UserScope(RecordingDB(), "")
+
+
+def test_user_scope_stamps_documents_and_pipelines():
+    db = RecordingDB()
+    data = UserScope(db, "u1")
+    doc = {"id": "b1", "amount": 100}
+    data.budgets.insert_one(doc)
+    data.budgets.aggregate([{"$group": {"_id": None}}])
+    assert doc["user_id"] == "u1"
+    assert db["budgets"].calls[1][1][0][0] == {"$match": {"user_id": "u1"}}
+
+
+def test_user_scope_only_serves_per_user_collections():
+    data = UserScope(RecordingDB(), "u1")
+    for name in UNSHARDED:
+        with pytest.raises(AttributeError):
+            data[name]
+
+
+def test_shard_plan_keys_lead_with_user_id():
+    assert not USER_COLLECTIONS & set(UNSHARDED)
+    for collection, key in SHARD_PLAN.items():
+        assert next(iter(key)) == "user_id", collection
+
+
+def test_zones_cover_the_hashed_space():
+    from bson import MaxKey, MinKey
+
+    commands = plan_commands("walleta", {"a": ["shard01"], "b": ["shard02", "shard03"]})
+    ranges = [command for name, command in commands if name == "updateZoneKeyRange"]
+    hashed = [collection for collection, key in SHARD_PLAN.items() if is_hashed(key)]
+    assert len(ranges) == 2 * len(hashed)
+    first, second = ranges[0], ranges[1]
+    assert first["min"]["user_id"] == MinKey() and second["max"]["user_id"] == MaxKey()
+    assert first["max"] == second["min"]